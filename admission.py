@@ -0,0 +1,174 @@
+"""
+Admission control and wait-time estimates for POST /analyze/async.
+
+Before an upload is read, the API checks how far behind the pipeline is: the
+messages waiting in the pipeline's broker queues (ADMISSION_QUEUES) and the
+jobs admitted but not finished (pending or processing rows). Above
+ADMISSION_MAX_QUEUE_DEPTH or ADMISSION_MAX_IN_FLIGHT the request is refused
+with 503 and a Retry-After, instead of storing a blob and a row for a job that
+would wait in the queue for hours.
+
+Accepted jobs get their queue position and an estimated start and finish,
+from the p50/p95 `duration_seconds` of recently completed jobs and the number
+of jobs running now (a stand-in for the workers' free slots). The snapshot is
+cached for ADMISSION_CACHE_SECONDS, so a burst of submissions costs one broker
+and one database round trip.
+"""
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import func, select
+
+from config import settings
+from database import AnalysisJob, JobStatus
+
+logger = logging.getLogger(__name__)
+
+# Completed jobs the duration percentiles are taken from, and how long they are reused
+DURATION_SAMPLE_SIZE = 200
+DURATION_CACHE_SECONDS = 60
+MAX_RETRY_AFTER_SECONDS = 3600
+
+
+@dataclass
+class QueueSnapshot:
+    queue_depth: Optional[int]  # None when the broker could not be asked
+    pending: int
+    processing: int
+    p50_seconds: Optional[float]  # None until some job has completed
+    p95_seconds: Optional[float]
+
+    @property
+    def in_flight(self) -> int:
+        return self.pending + self.processing
+
+    def wait_seconds(self, jobs_ahead: int) -> Optional[float]:
+        """Time for ``jobs_ahead`` jobs to clear, at the running jobs' parallelism."""
+        if self.p50_seconds is None:
+            return None
+        return jobs_ahead * self.p50_seconds / max(self.processing, 1)
+
+
+_snapshot_cache: Tuple[float, Optional[QueueSnapshot]] = (0.0, None)
+_duration_cache: Tuple[float, Tuple[Optional[float], Optional[float]]] = (0.0, (None, None))
+
+
+def broker_queue_depth(celery_app, queues) -> Optional[int]:
+    """Messages waiting (not yet reserved by a worker) across ``queues``."""
+    try:
+        with celery_app.connection_for_read(connect_timeout=2) as connection:
+            channel = connection.default_channel
+            return sum(channel.queue_declare(queue=queue, passive=True).message_count for queue in queues)
+    except Exception as e:
+        # Fail open: an unreachable broker fails the submission on its own
+        logger.warning(f"Could not read broker queue depth: {e}")
+        return None
+
+
+def _percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def _recent_durations(db) -> Tuple[Optional[float], Optional[float]]:
+    """(p50, p95) seconds of the most recently submitted completed jobs."""
+    global _duration_cache
+    cached_at, durations = _duration_cache
+    if time.monotonic() - cached_at < DURATION_CACHE_SECONDS:
+        return durations
+    # Newest by created_at, so the (status, created_at, id) index serves it
+    rows = (
+        await db.execute(
+            select(AnalysisJob.duration_seconds)
+            .where(AnalysisJob.status == JobStatus.COMPLETED, AnalysisJob.duration_seconds.is_not(None))
+            .order_by(AnalysisJob.created_at.desc())
+            .limit(DURATION_SAMPLE_SIZE)
+        )
+    ).scalars().all()
+    ordered = sorted(rows)
+    durations = (float(_percentile(ordered, 0.5)), float(_percentile(ordered, 0.95))) if ordered else (None, None)
+    _duration_cache = (time.monotonic(), durations)
+    return durations
+
+
+async def queue_snapshot(db, celery_app) -> QueueSnapshot:
+    """Queue depth, in-flight jobs and recent durations, at most ADMISSION_CACHE_SECONDS stale."""
+    global _snapshot_cache
+    cached_at, snapshot = _snapshot_cache
+    if snapshot and time.monotonic() - cached_at < settings.admission_cache_seconds:
+        return snapshot
+
+    queue_depth = None
+    queues = [queue.strip() for queue in settings.admission_queues.split(",") if queue.strip()]
+    if settings.admission_max_queue_depth and queues:
+        queue_depth = await asyncio.to_thread(broker_queue_depth, celery_app, queues)
+    counts = dict(
+        (
+            await db.execute(
+                select(AnalysisJob.status, func.count())
+                .where(AnalysisJob.status.in_([JobStatus.PENDING, JobStatus.PROCESSING]))
+                .group_by(AnalysisJob.status)
+            )
+        ).all()
+    )
+    p50, p95 = await _recent_durations(db)
+    snapshot = QueueSnapshot(
+        queue_depth=queue_depth,
+        pending=counts.get(JobStatus.PENDING, 0),
+        processing=counts.get(JobStatus.PROCESSING, 0),
+        p50_seconds=p50,
+        p95_seconds=p95,
+    )
+    _snapshot_cache = (time.monotonic(), snapshot)
+    return snapshot
+
+
+def admission_rejection(snapshot: QueueSnapshot) -> Optional[Tuple[str, int]]:
+    """(reason, Retry-After seconds) if a new job should be refused, else None."""
+    checks = [
+        ("queue_depth", snapshot.queue_depth, settings.admission_max_queue_depth),
+        ("in_flight", snapshot.in_flight, settings.admission_max_in_flight),
+    ]
+    for reason, value, limit in checks:
+        if limit and value is not None and value >= limit:
+            # Roughly when enough jobs will have finished to get back under the limit
+            wait = snapshot.wait_seconds(value - limit + 1)
+            if wait is None:
+                wait = settings.admission_retry_after_seconds
+            return reason, max(1, min(MAX_RETRY_AFTER_SECONDS, math.ceil(wait)))
+    return None
+
+
+def record_admitted() -> None:
+    """Count a just-admitted job in the cached snapshot until it is next refreshed."""
+    snapshot = _snapshot_cache[1]
+    if snapshot:
+        snapshot.pending += 1
+
+
+async def queue_position(db, job: AnalysisJob) -> int:
+    """1-based position of a just-added pending job among the jobs waiting to start."""
+    await db.flush()
+    ahead = await db.scalar(
+        select(func.count())
+        .select_from(AnalysisJob)
+        .where(AnalysisJob.status == JobStatus.PENDING, AnalysisJob.id < job.id)
+    )
+    return ahead + 1
+
+
+def submit_estimates(snapshot: QueueSnapshot, position: int, now: datetime) -> dict:
+    """Estimated start and finish (p50, and p95 as the latest) for a job at ``position``."""
+    start = snapshot.wait_seconds(position - 1)
+    if start is None:
+        return {"estimated_start_at": None, "estimated_finish_at": None, "estimated_finish_latest_at": None}
+    started_at = now + timedelta(seconds=start)
+    return {
+        "estimated_start_at": started_at.isoformat(),
+        "estimated_finish_at": (started_at + timedelta(seconds=snapshot.p50_seconds)).isoformat(),
+        "estimated_finish_latest_at": (started_at + timedelta(seconds=snapshot.p95_seconds)).isoformat(),
+    }
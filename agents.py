@@ -39,11 +39,32 @@ from tools import FinancialDocumentTool, read_financial_document, analyze_invest
 ## ─────────────────────────────────────────────────────
 from crewai import LLM
 
+from config import settings
+from llm_client import call_timeout, llm_call_slot
+
+
+class PipelineLLM(LLM):
+    """LLM whose calls share the per-process concurrency cap in llm_client."""
+
+    def call(self, *args, **kwargs):
+        with llm_call_slot():
+            return super().call(*args, **kwargs)
+
+    def _prepare_completion_params(self, *args, **kwargs):
+        # A request gets no more time than is left of the stage's time budget
+        params = super()._prepare_completion_params(*args, **kwargs)
+        timeout = call_timeout()
+        if timeout is not None:
+            params["timeout"] = min(timeout, params.get("timeout") or timeout)
+        return params
+
+
 def _get_llm():
     """Lazy LLM instantiation using NVIDIA NIM via LiteLLM."""
-    return LLM(
+    return PipelineLLM(
         model="nvidia_nim/meta/llama-3.3-70b-instruct",
         api_key=os.getenv("NVIDIA_API_KEY"),
+        base_url=settings.llm_base_url,
     )
 
 ## ─────────────────────────────────────────────────────
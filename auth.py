@@ -0,0 +1,175 @@
+"""
+API-key authentication against the users table.
+
+Keys are stored as SHA-256 hashes (`users.api_key_hash`) and resolved through
+an in-process TTL cache keyed by that hash, so a client polling
+/jobs/{job_id} costs one lookup per AUTH_CACHE_SECONDS rather than one per
+request. Unknown keys are cached too. A deactivated user or a rotated key
+stops working within AUTH_CACHE_SECONDS.
+
+`users.last_active_at` is written behind: requests only note the time in
+memory, and the notes are written in one batched UPDATE every
+AUTH_ACTIVITY_FLUSH_SECONDS (and on shutdown), instead of an UPDATE per
+request.
+
+Issue or rotate a user's key (printed once; only its hash is stored):
+
+    python -m auth create-key alice@example.com --name "Alice"
+"""
+import argparse
+import asyncio
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, update
+
+from config import settings
+from database import User, get_async_db_session, get_db_session, hash_api_key, init_db
+
+logger = logging.getLogger(__name__)
+
+KEY_CACHE_MAX_ENTRIES = 10_000
+RATE_LIMIT_COLUMNS = (
+    "rate_limit_per_minute",
+    "rate_limit_analyze_per_minute",
+    "rate_limit_analyze_async_per_minute",
+)
+
+
+@dataclass
+class ApiUser:
+    id: int
+    rate_limits: Dict[str, int] = field(default_factory=dict)  # users.rate_limit_* columns that are set
+
+
+# ---------------------------------------------------------------------------
+# Key cache
+# ---------------------------------------------------------------------------
+_key_cache: "OrderedDict[str, Tuple[float, Optional[ApiUser]]]" = OrderedDict()
+
+
+async def _load_user(key_hash: str) -> Optional[ApiUser]:
+    async with get_async_db_session() as db:
+        user = (
+            await db.execute(select(User).where(User.api_key_hash == key_hash, User.is_active == 1))
+        ).scalars().first()
+    if user is None:
+        return None
+    return ApiUser(
+        user.id,
+        {column: getattr(user, column) for column in RATE_LIMIT_COLUMNS if getattr(user, column) is not None},
+    )
+
+
+def cached_user(api_key: str) -> Tuple[bool, Optional[ApiUser]]:
+    """Whether ``api_key``'s lookup is cached and fresh, and its user if so (no query)."""
+    cached = _key_cache.get(hash_api_key(api_key))
+    if cached and time.monotonic() < cached[0]:
+        return True, cached[1]
+    return False, None
+
+
+async def lookup_user(api_key: str) -> Optional[ApiUser]:
+    """The active user owning ``api_key``, at most AUTH_CACHE_SECONDS stale."""
+    key_hash = hash_api_key(api_key)
+    cached = _key_cache.get(key_hash)
+    if cached and time.monotonic() < cached[0]:
+        return cached[1]
+    user = await _load_user(key_hash)
+    _key_cache[key_hash] = (time.monotonic() + settings.auth_cache_seconds, user)
+    _key_cache.move_to_end(key_hash)
+    while len(_key_cache) > KEY_CACHE_MAX_ENTRIES:
+        _key_cache.popitem(last=False)
+    return user
+
+
+# ---------------------------------------------------------------------------
+# Write-behind last_active_at
+# ---------------------------------------------------------------------------
+class ActivityRecorder:
+    """Collects users' last request times and writes them in batches."""
+
+    def __init__(self):
+        self._pending: Dict[int, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def touch(self, user_id: int) -> None:
+        self._pending[user_id] = datetime.utcnow()
+
+    async def flush(self) -> int:
+        """Write the pending times in one UPDATE; returns the number of users written."""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        try:
+            async with get_async_db_session() as db:
+                # Bulk UPDATE by primary key: one executemany for the whole batch
+                await db.execute(
+                    update(User),
+                    [{"id": user_id, "last_active_at": seen} for user_id, seen in pending.items()],
+                )
+        except Exception as e:
+            # Keep them for the next flush, unless a newer request replaced them
+            for user_id, seen in pending.items():
+                self._pending.setdefault(user_id, seen)
+            logger.warning(f"Could not write last_active_at for {len(pending)} users: {e}")
+            return 0
+        return len(pending)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.auth_activity_flush_seconds)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+
+activity = ActivityRecorder()
+
+
+# ---------------------------------------------------------------------------
+# Key management
+# ---------------------------------------------------------------------------
+def create_api_key(email: str, name: Optional[str] = None) -> str:
+    """Create the user (or reactivate it) with a new API key; returns the key."""
+    api_key = secrets.token_urlsafe(32)
+    with get_db_session() as db:
+        user = db.query(User).filter(User.email == email).first()
+        if user is None:
+            user = User(email=email)
+            db.add(user)
+        user.name = name or user.name
+        user.api_key = None
+        user.api_key_hash = hash_api_key(api_key)
+        user.is_active = 1
+    return api_key
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage API users")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create-key", help="create a user, or rotate its key")
+    create.add_argument("email")
+    create.add_argument("--name")
+    args = parser.parse_args()
+
+    init_db()
+    if args.command == "create-key":
+        print(create_api_key(args.email, args.name))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+API database concurrency benchmark — GET /jobs/{job_id} under load.
+
+Compares the async session layer the API now uses against the previous pattern
+(a synchronous session inside an `async def` endpoint). Both run against the
+same seeded SQLite file with an artificial per-query round-trip latency, which
+is injected at the sqlite3 cursor so it behaves like a network database: the
+sync driver blocks the event loop for the round trip, aiosqlite waits in its
+own thread.
+
+Usage:
+    python -m benchmarks.api_db_concurrency --requests 500 --concurrency 50 --db-latency-ms 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+
+import httpx
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import database
+from database import AnalysisJob, Base, JobStatus
+from main import app, job_status_response
+
+DB_LATENCY_SECONDS = 0.0
+
+
+class _SlowCursor(sqlite3.Cursor):
+    """Cursor that adds a fixed round-trip delay to every statement."""
+
+    def execute(self, *args, **kwargs):
+        time.sleep(DB_LATENCY_SECONDS)
+        return super().execute(*args, **kwargs)
+
+
+class _SlowConnection(sqlite3.Connection):
+    def cursor(self, factory=_SlowCursor):
+        return super().cursor(factory)
+
+
+def _setup_database(path: str, jobs: int) -> list:
+    """Create engines on ``path``, point the API at them and seed ``jobs`` rows."""
+    sync_engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False, "factory": _SlowConnection},
+    )
+    Base.metadata.create_all(sync_engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args={"factory": _SlowConnection})
+
+    database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+    database.AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    job_ids = [str(uuid.uuid4()) for _ in range(jobs)]
+    with database.get_db_session() as db:
+        for job_id in job_ids:
+            db.add(AnalysisJob(
+                job_id=job_id,
+                query="Analyze this financial document for investment insights",
+                original_filename="sample.pdf",
+                status=JobStatus.COMPLETED,
+                result="## Final Analysis Report\n" + "Lorem ipsum. " * 200,
+                duration_seconds=42,
+            ))
+    return job_ids
+
+
+@app.get("/_bench/sync-session/jobs/{job_id}", include_in_schema=False)
+async def legacy_get_job_status(job_id: str):
+    """The previous /jobs/{job_id}: a blocking session on the event loop."""
+    with database.get_db_session() as db:
+        job = db.query(AnalysisJob).filter(AnalysisJob.job_id == job_id).first()
+        if not job:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        return job_status_response(job)
+
+
+async def _run_load(path_template: str, job_ids: list, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i: int) -> None:
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path_template.format(job_ids[i % len(job_ids)]))
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main() -> None:
+    global DB_LATENCY_SECONDS
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--db-latency-ms", type=float, default=20.0, help="simulated DB round trip per query")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        job_ids = _setup_database(os.path.join(tmp, "bench.db"), jobs=100)
+        DB_LATENCY_SECONDS = args.db_latency_ms / 1000
+
+        print(f"{args.requests} requests, concurrency {args.concurrency}, {args.db_latency_ms}ms per query\n")
+        print(f"{'session layer':<22} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for label, path in [
+            ("sync (previous)", "/_bench/sync-session/jobs/{}"),
+            ("async (current)", "/jobs/{}"),
+        ]:
+            stats = asyncio.run(_run_load(path, job_ids, args.requests, args.concurrency))
+            print(f"{label:<22} {stats['rps']:>8.1f} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+API-key auth overhead benchmark — GET /jobs/{job_id} polling with user keys.
+
+Compares what authenticating a request costs:
+
+  anonymous        no key (auth off): the baseline
+  cached           a user's key, resolved through the hashed-key cache, with
+                   last_active_at written behind (what the API does now)
+  per request      the same key looked up with a query and last_active_at
+                   updated on every request (the straightforward version)
+
+Each request is a poll of one of the user's jobs, against a seeded SQLite
+file with an artificial per-statement round-trip latency (as in
+benchmarks.api_db_concurrency), so database work shows up the way it would
+against a network database. Reports throughput, latency and database
+statements per request.
+
+Usage:
+    python -m benchmarks.auth_overhead --requests 500 --concurrency 20 --db-latency-ms 5
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from typing import Optional
+
+import httpx
+from fastapi import HTTPException, Request, Security
+from sqlalchemy import create_engine, event, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import database
+from auth import ApiUser, activity, create_api_key
+from benchmarks import api_db_concurrency
+from benchmarks.api_db_concurrency import _SlowConnection
+from config import settings
+from database import AnalysisJob, Base, JobStatus, User, hash_api_key
+from main import api_key_header, app, ensure_job_access, fetch_job
+
+STATEMENTS = 0
+
+
+def _count_statement(*args) -> None:
+    global STATEMENTS
+    STATEMENTS += 1
+
+
+def _setup_database(path: str, jobs: int) -> tuple:
+    """Point the API at ``path`` and seed one user owning ``jobs`` jobs; returns (api_key, job_ids)."""
+    sync_engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False, "factory": _SlowConnection},
+    )
+    Base.metadata.create_all(sync_engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args={"factory": _SlowConnection})
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _count_statement)
+
+    database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+    database.AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    api_key = create_api_key("bench@example.com")
+    job_ids = [str(uuid.uuid4()) for _ in range(jobs)]
+    with database.get_db_session() as db:
+        user_id = db.query(User.id).filter(User.email == "bench@example.com").scalar()
+        for job_id in job_ids:
+            db.add(AnalysisJob(
+                job_id=job_id,
+                user_id=user_id,
+                query="Analyze this financial document for investment insights",
+                original_filename="sample.pdf",
+                status=JobStatus.PROCESSING,
+            ))
+    return api_key, job_ids
+
+
+async def per_request_api_key(key: Optional[str] = Security(api_key_header)) -> ApiUser:
+    """Authentication without the cache: a lookup and an UPDATE on every request."""
+    async with database.get_async_db_session() as db:
+        user_id = await db.scalar(
+            select(User.id).where(User.api_key_hash == hash_api_key(key or ""), User.is_active == 1)
+        )
+        if user_id is None:
+            raise HTTPException(status_code=403, detail="Invalid or missing API key")
+        await db.execute(update(User).where(User.id == user_id).values(last_active_at=datetime.utcnow()))
+    return ApiUser(user_id)
+
+
+@app.get("/_bench/per-request-auth/jobs/{job_id}", include_in_schema=False)
+async def per_request_job_status(job_id: str, request: Request, user: ApiUser = Security(per_request_api_key)):
+    await ensure_job_access(user, job_id)
+    return await fetch_job(job_id)
+
+
+async def _run_load(path_template: str, job_ids: list, requests: int, concurrency: int, headers: dict) -> dict:
+    global STATEMENTS
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        async def one(i: int) -> None:
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path_template.format(job_ids[i % len(job_ids)]))
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        # Warm up: fills the key and job-owner caches, as a polling client would
+        await asyncio.gather(*(one(i) for i in range(len(job_ids))))
+        latencies.clear()
+        STATEMENTS = 0
+        activity.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+        await activity.close()  # the batched write counts against this run
+
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "statements": STATEMENTS / requests,
+    }
+
+
+async def _run_all(args, api_key: str, job_ids: list) -> None:
+    # One event loop for every run: the async engine's pool is bound to it
+    print(f"{'auth':<14} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'stmts/req':>10}")
+    for label, path, headers in [
+        ("anonymous", "/jobs/{}", {}),
+        ("cached", "/jobs/{}", {"X-API-Key": api_key}),
+        ("per request", "/_bench/per-request-auth/jobs/{}", {"X-API-Key": api_key}),
+    ]:
+        stats = await _run_load(path, job_ids, args.requests, args.concurrency, headers)
+        print(
+            f"{label:<14} {stats['rps']:>8.1f} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} "
+            f"{stats['statements']:>10.2f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--db-latency-ms", type=float, default=5.0, help="simulated DB round trip per statement")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    settings.rate_limit_enabled = False  # measured on its own in benchmarks.rate_limiter
+
+    with tempfile.TemporaryDirectory() as tmp:
+        api_key, job_ids = _setup_database(os.path.join(tmp, "bench.db"), jobs=20)
+        api_db_concurrency.DB_LATENCY_SECONDS = args.db_latency_ms / 1000
+
+        print(f"{args.requests} requests, concurrency {args.concurrency}, {args.db_latency_ms}ms per statement\n")
+        asyncio.run(_run_all(args, api_key, job_ids))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Database contention benchmark — job status transitions while the API reads.
+
+Worker threads drive jobs through pending → processing → completed while
+reader threads run the API's lookups (one job, then a page of jobs) against
+the same SQLite file:
+
+  previous  default rollback journal, transitions as ORM SELECT-then-UPDATE
+  current   WAL + tuned pragmas, transitions as one `UPDATE ... WHERE job_id`
+
+Reports transitions/s, statements per transition, transition and read
+latency, and "database is locked" errors.
+
+Usage:
+    python -m benchmarks.db_status_updates --jobs 2000 --writers 4 --readers 8
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import create_engine, event, exc, select
+from sqlalchemy.orm import sessionmaker
+
+import database
+from database import AnalysisJob, Base, JobStatus, job_update
+
+
+def _engine(path: str, tuned: bool):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    if tuned:
+        event.listen(engine, "connect", database._set_sqlite_pragmas)
+    return engine
+
+
+def _seed(path: str, jobs: int) -> list:
+    job_ids = [str(uuid.uuid4()) for _ in range(jobs)]
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.executemany(
+        "INSERT INTO analysis_jobs (job_id, query, original_filename, status, created_at) VALUES (?, ?, ?, ?, ?)",
+        [(job_id, "Analyze", "report.pdf", JobStatus.PENDING, datetime.utcnow().isoformat(sep=" ")) for job_id in job_ids],
+    )
+    conn.commit()
+    conn.close()
+    return job_ids
+
+
+def _previous_transition(Session, job_id: str, status: str) -> None:
+    with Session() as db:
+        job = db.query(AnalysisJob).filter(AnalysisJob.job_id == job_id).first()
+        job.status = status
+        if status == JobStatus.PROCESSING and not job.started_at:
+            job.started_at = datetime.utcnow()
+        else:
+            job.completed_at = datetime.utcnow()
+        db.commit()
+
+
+def _current_transition(Session, job_id: str, status: str) -> None:
+    values = {"started_at": datetime.utcnow()} if status == JobStatus.PROCESSING else {"completed_at": datetime.utcnow()}
+    with Session() as db:
+        db.execute(job_update(job_id, status=status, **values))
+        db.commit()
+
+
+def _run(path: str, job_ids: list, mode: str, writers: int, readers: int) -> dict:
+    engine = _engine(path, tuned=mode == "current")
+    Session = sessionmaker(bind=engine, autoflush=False)
+    transition = _current_transition if mode == "current" else _previous_transition
+
+    transition_ms, read_ms, errors = [], [], [0]
+    done = threading.Event()
+    chunks = [job_ids[i::writers] for i in range(writers)]
+
+    def write(chunk):
+        for job_id in chunk:
+            for status in (JobStatus.PROCESSING, JobStatus.COMPLETED):
+                started = time.perf_counter()
+                try:
+                    transition(Session, job_id, status)
+                    transition_ms.append((time.perf_counter() - started) * 1000)
+                except exc.OperationalError:
+                    errors[0] += 1
+
+    def read(offset):
+        i = offset
+        while not done.is_set():
+            started = time.perf_counter()
+            try:
+                with Session() as db:
+                    db.execute(select(AnalysisJob.status).where(AnalysisJob.job_id == job_ids[i % len(job_ids)])).first()
+                    db.execute(select(AnalysisJob.job_id, AnalysisJob.status).order_by(AnalysisJob.created_at.desc()).limit(20)).all()
+                read_ms.append((time.perf_counter() - started) * 1000)
+            except exc.OperationalError:
+                errors[0] += 1
+            i += 7
+
+    reader_threads = [threading.Thread(target=read, args=(n,)) for n in range(readers)]
+    writer_threads = [threading.Thread(target=write, args=(chunk,)) for chunk in chunks]
+    for thread in reader_threads:
+        thread.start()
+    started = time.perf_counter()
+    for thread in writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    for thread in reader_threads:
+        thread.join()
+    engine.dispose()
+
+    # Statements per transition, counted on a separate engine without readers
+    solo_engine = _engine(path, tuned=mode == "current")
+    statements = [0]
+    event.listen(solo_engine, "before_cursor_execute", lambda *args: statements.__setitem__(0, statements[0] + 1))
+    transition(sessionmaker(bind=solo_engine), job_ids[0], JobStatus.COMPLETED)
+    solo_engine.dispose()
+
+    return {
+        "per_second": len(transition_ms) / elapsed,
+        "statements": statements[0],
+        "p50": statistics.median(transition_ms),
+        "p95": statistics.quantiles(transition_ms, n=20)[18],
+        "read_p95": statistics.quantiles(read_ms, n=20)[18] if len(read_ms) > 1 else float("nan"),
+        "reads": len(read_ms),
+        "errors": errors[0],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=2000, help="jobs each mode drives to completion")
+    parser.add_argument("--writers", type=int, default=4, help="worker threads updating job status")
+    parser.add_argument("--readers", type=int, default=8, help="API threads reading jobs")
+    args = parser.parse_args()
+
+    rows = []
+    for mode in ("previous", "current"):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            Base.metadata.create_all(create_engine(f"sqlite:///{path}"))
+            job_ids = _seed(path, args.jobs)
+            rows.append((mode, _run(path, job_ids, mode, args.writers, args.readers)))
+
+    print(f"{args.jobs} jobs x 2 transitions, {args.writers} writers, {args.readers} readers (SQLite)\n")
+    print(f"{'mode':<10} {'trans/s':>8} {'stmts':>6} {'p50 ms':>8} {'p95 ms':>8} {'reads':>7} {'read p95':>9} {'locked':>7}")
+    for mode, stats in rows:
+        print(
+            f"{mode:<10} {stats['per_second']:>8.0f} {stats['statements']:>6} {stats['p50']:>8.2f} {stats['p95']:>8.2f} "
+            f"{stats['reads']:>7} {stats['read_p95']:>8.2f}ms {stats['errors']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
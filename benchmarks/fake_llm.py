@@ -0,0 +1,323 @@
+"""
+Fake OpenAI-compatible (NVIDIA NIM style) LLM server for offline benchmarks.
+
+Answers POST .../chat/completions the way the pipeline's callers expect,
+after a configurable delay, with a `usage` block so token accounting works:
+
+- CrewAI agents with the document reader tool get one ReAct tool call
+  (`Action: Financial_Document_Reader` on the path in their task), then a
+  `Final Answer:` once the tool's observation is in the conversation
+- other agents get a `Final Answer:` straight away
+- synthesis (a plain prompt) gets a markdown report
+
+Latency per request is drawn from ``latency_dist`` around a median of
+``latency`` seconds (fixed, lognormal with ``latency_sigma``, or exponential),
+plus ``completion_tokens / tokens_per_second`` when set. To reproduce NIM
+throttling it can also answer 429 (with Retry-After, NIM's error body) when
+more than ``rpm_limit`` requests arrive per minute, for every request in a
+``burst_seconds`` window each ``burst_every`` seconds, or at random
+(``rate_limit_rate``); and a ``timeout_rate`` fraction of requests hang for
+``hang_seconds`` and end in a 504, like a gateway timeout. GET /stats returns
+the counts by outcome.
+
+Point the app at it with LLM_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Usage:
+    python -m benchmarks.fake_llm --port 8900 --latency 0.5 --completion-tokens 400
+    python -m benchmarks.fake_llm --latency 2 --latency-dist lognormal --rpm-limit 40 --burst-every 60 --burst-seconds 10
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.reports import report_markdown
+
+READER_TOOL = "Financial_Document_Reader"
+CHARS_PER_TOKEN = 4
+LATENCY_DISTRIBUTIONS = ("fixed", "lognormal", "exponential")
+
+# Task descriptions quote the document as '<blob://key>' or '<path>.pdf'
+_DOCUMENT_PATH = re.compile(r"'((?:blob://[^']+)|(?:[^']+\.pdf))'")
+
+
+@dataclass
+class FakeLLMConfig:
+    latency: float = 0.5  # median seconds to first token
+    latency_dist: str = "fixed"
+    latency_sigma: float = 0.5  # lognormal shape; p95 is about latency * e^(1.645 sigma)
+    completion_tokens: int = 400
+    tokens_per_second: float = 0.0  # 0 = completion length adds no delay
+    tool_calls: bool = True
+    # Throttling and failures (all off by default)
+    rpm_limit: int = 0  # 429 above this many requests in any 60s window
+    burst_every: float = 0.0  # seconds between 429 bursts
+    burst_seconds: float = 0.0  # length of each burst
+    rate_limit_rate: float = 0.0  # fraction of other requests answered 429
+    retry_after: int = 1  # Retry-After seconds sent with each 429
+    timeout_rate: float = 0.0  # fraction of requests that hang, then 504
+    hang_seconds: float = 30.0
+
+
+class FakeLLMServer:
+    """Threaded fake LLM endpoint; ``start()`` serves it from a background thread."""
+
+    def __init__(self, config: FakeLLMConfig, host: str = "127.0.0.1", port: int = 0, seed: int = 0):
+        self.config = config
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tool_requests = 0
+        self.rate_limited = 0
+        self.timed_out = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._started = time.monotonic()
+        self._recent = deque()  # arrival times of the last minute's accepted requests
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "tool_requests": self.tool_requests,
+                "rate_limited": self.rate_limited,
+                "timed_out": self.timed_out,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            }
+
+    # -----------------------------------------------------------------------
+    # Responses
+    # -----------------------------------------------------------------------
+    def _markdown(self, tokens: int) -> str:
+        with self._lock:
+            seed = self._rng.random()
+        return report_markdown(random.Random(seed), tokens * CHARS_PER_TOKEN)
+
+    def _latency(self) -> float:
+        config = self.config
+        with self._lock:
+            if config.latency_dist == "lognormal":
+                return self._rng.lognormvariate(math.log(max(config.latency, 1e-6)), config.latency_sigma)
+            if config.latency_dist == "exponential":
+                return self._rng.expovariate(math.log(2) / max(config.latency, 1e-6))
+            return config.latency
+
+    def _outcome(self) -> str:
+        """Outcome for a request arriving now: "ok", "rate_limited" or "timeout"."""
+        config = self.config
+        now = time.monotonic()
+        with self._lock:
+            if config.burst_every > 0 and (now - self._started) % config.burst_every < config.burst_seconds:
+                return "rate_limited"
+            if config.rpm_limit > 0:
+                while self._recent and now - self._recent[0] >= 60:
+                    self._recent.popleft()
+                if len(self._recent) >= config.rpm_limit:
+                    return "rate_limited"
+                self._recent.append(now)
+            if self._rng.random() < config.rate_limit_rate:
+                return "rate_limited"
+            if self._rng.random() < config.timeout_rate:
+                return "timeout"
+        return "ok"
+
+    def reply(self, messages: list) -> tuple:
+        """(content, prompt_tokens, completion_tokens, is_tool_call) for one request."""
+        prompt = "\n".join(str(message.get("content") or "") for message in messages)
+        prompt_tokens = max(1, len(prompt) // CHARS_PER_TOKEN)
+        completion_tokens = self.config.completion_tokens
+
+        if "Final Answer:" not in prompt:
+            # Synthesis: a plain prompt, plain markdown back
+            return self._markdown(completion_tokens), prompt_tokens, completion_tokens, False
+
+        # CrewAI appends the tool result to the agent's own turn as "Observation: ..."
+        observed = any(
+            message.get("role") == "assistant" and "Observation:" in str(message.get("content") or "")
+            for message in messages
+        )
+        path = _DOCUMENT_PATH.search(prompt)
+        if self.config.tool_calls and f"[{READER_TOOL}" in prompt and path and not observed:
+            content = (
+                "Thought: I should read the document first\n"
+                f"Action: {READER_TOOL}\n"
+                f"Action Input: {json.dumps({'path': path.group(1)})}"
+            )
+            return content, prompt_tokens, len(content) // CHARS_PER_TOKEN, True
+
+        content = "Thought: I now know the final answer\nFinal Answer: " + self._markdown(completion_tokens)
+        return content, prompt_tokens, completion_tokens, False
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body: dict, headers: dict = None) -> None:
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up (its own timeout)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/stats":
+                    self._send_json(200, server.stats())
+                elif self.path.rstrip("/").endswith("/models"):
+                    self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model"}]})
+                else:
+                    self._send_json(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send_json(400, {"error": {"message": "invalid JSON"}})
+                    return
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                server.handle_completion(self, body)
+
+        return Handler
+
+    def handle_completion(self, handler, body: dict) -> None:
+        started = time.perf_counter()
+        outcome = self._outcome()
+        with self._lock:
+            self.requests += 1
+        if outcome == "rate_limited":
+            with self._lock:
+                self.rate_limited += 1
+            handler._send_json(
+                429,
+                {"status": 429, "title": "Too Many Requests", "detail": "Rate limit exceeded, retry later"},
+                {"Retry-After": str(self.config.retry_after)},
+            )
+            return
+        if outcome == "timeout":
+            time.sleep(self.config.hang_seconds)
+            with self._lock:
+                self.timed_out += 1
+            handler._send_json(504, {"status": 504, "title": "Gateway Timeout", "detail": "Upstream inference timed out"})
+            return
+
+        content, prompt_tokens, completion_tokens, is_tool_call = self.reply(body.get("messages") or [])
+        with self._lock:
+            self.tool_requests += is_tool_call
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+        delay = self._latency()
+        if self.config.tokens_per_second > 0:
+            delay += completion_tokens / self.config.tokens_per_second
+        time.sleep(max(0.0, delay - (time.perf_counter() - started)))
+
+        handler._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", type=float, default=0.5, help="median seconds per LLM request (time to first token)")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal shape (0.5: p95 ~2.3x the median)")
+    parser.add_argument("--completion-tokens", type=int, default=400, help="tokens per answer")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="decode speed added to latency (0 = off)")
+    parser.add_argument("--no-tool-calls", action="store_true", help="agents answer without calling the reader tool")
+    parser.add_argument("--rpm-limit", type=int, default=0, help="429 above this many LLM requests per minute (0 = off)")
+    parser.add_argument("--burst-every", type=float, default=0.0, help="seconds between 429 bursts (0 = off)")
+    parser.add_argument("--burst-seconds", type=float, default=0.0, help="length of each 429 burst")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered 429 at random")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on 429s")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="fraction of requests that hang, then 504")
+    parser.add_argument("--hang-seconds", type=float, default=30.0, help="how long a timed-out request hangs")
+
+
+def config_from_args(args: argparse.Namespace) -> FakeLLMConfig:
+    return FakeLLMConfig(
+        latency=args.latency,
+        latency_dist=args.latency_dist,
+        latency_sigma=args.latency_sigma,
+        completion_tokens=args.completion_tokens,
+        tokens_per_second=args.tokens_per_second,
+        tool_calls=not args.no_tool_calls,
+        rpm_limit=args.rpm_limit,
+        burst_every=args.burst_every,
+        burst_seconds=args.burst_seconds,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        timeout_rate=args.timeout_rate,
+        hang_seconds=args.hang_seconds,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeLLMServer(config_from_args(args), host=args.host, port=args.port)
+    print(f"Fake LLM listening on {server.base_url} (set LLM_BASE_URL to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
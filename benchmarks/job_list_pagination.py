@@ -0,0 +1,205 @@
+"""
+Job listing benchmark — GET /jobs page latency on a large analysis_jobs table.
+
+Seeds a SQLite file with a million jobs (by default) and times fetching a page
+at increasing depths, with and without a status filter:
+
+  previous  OFFSET pagination + exact COUNT(*) per request, single-column
+            indexes on status and created_at
+  current   keyset (cursor) pagination on (created_at, id), composite
+            (status, created_at, id) index, cached total count
+
+Both go through the real API (httpx ASGI transport) with the job-card field
+projection the dashboard requests.
+
+Usage:
+    python -m benchmarks.job_list_pagination --rows 1000000 --depths 1,100,1000,10000,40000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+import httpx
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import database
+from database import AnalysisJob, Base, JobStatus
+from main import JOB_FIELD_COLUMNS, JobListResponse, app, encode_job_cursor, job_row_response, parse_job_fields
+
+PAGE_FIELDS = "job_id,status,query,original_filename,created_at,duration_seconds"
+STATUS_WEIGHTS = {
+    JobStatus.COMPLETED: 0.90,
+    JobStatus.FAILED: 0.05,
+    JobStatus.PROCESSING: 0.03,
+    JobStatus.PENDING: 0.02,
+}
+SQLITE_DATETIME = "%Y-%m-%d %H:%M:%S.%f"  # how SQLAlchemy stores DateTime on SQLite
+PREVIOUS_INDEXES = {
+    "ix_analysis_jobs_status": "status",
+    "ix_analysis_jobs_created_at": "created_at",
+}
+CURRENT_INDEXES = {
+    "ix_analysis_jobs_created_at_id": "created_at, id",
+    "ix_analysis_jobs_status_created_at_id": "status, created_at, id",
+}
+
+
+@app.get("/_bench/offset/jobs", response_model=JobListResponse, response_model_exclude_unset=True,
+         include_in_schema=False)
+async def legacy_list_jobs(status: Optional[str] = None, limit: int = 20, offset: int = 0,
+                           fields: Optional[str] = None):
+    """The previous /jobs: exact count and OFFSET on every request."""
+    selected = parse_job_fields(fields)
+    async with database.get_async_db_session() as db:
+        count_query = select(func.count()).select_from(AnalysisJob)
+        query = select(*(JOB_FIELD_COLUMNS[name].label(name) for name in selected))
+        if status:
+            count_query = count_query.where(AnalysisJob.status == status)
+            query = query.where(AnalysisJob.status == status)
+        total = await db.scalar(count_query)
+        rows = await db.execute(query.order_by(AnalysisJob.created_at.desc()).offset(offset).limit(limit))
+        return JobListResponse(jobs=[job_row_response(dict(row._mapping)) for row in rows], total=total)
+
+
+def _seed(path: str, rows: int) -> None:
+    """Create the schema and bulk-insert ``rows`` jobs (indexes added later)."""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    conn = sqlite3.connect(path)
+    for name in CURRENT_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    rng = random.Random(42)
+    statuses, weights = list(STATUS_WEIGHTS), list(STATUS_WEIGHTS.values())
+    start = datetime(2024, 1, 1)
+    batch = 50_000
+    for offset in range(0, rows, batch):
+        values = []
+        for i in range(offset, min(offset + batch, rows)):
+            # Two jobs per second so created_at ties are broken by id
+            created_at = (start + timedelta(seconds=i // 2)).strftime(SQLITE_DATETIME)
+            values.append((
+                str(uuid.UUID(int=rng.getrandbits(128))),
+                "Analyze this financial document for investment insights",
+                "sample.pdf",
+                rng.choices(statuses, weights)[0],
+                42,
+                created_at,
+            ))
+        conn.executemany(
+            "INSERT INTO analysis_jobs (job_id, query, original_filename, status, duration_seconds, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            values,
+        )
+        conn.commit()
+    conn.close()
+
+
+def _use_indexes(path: str, indexes: dict, drop: dict) -> None:
+    conn = sqlite3.connect(path)
+    for name in drop:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    for name, columns in indexes.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON analysis_jobs ({columns})")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+def _cursor_before_page(path: str, page: int, limit: int, status: Optional[str]) -> Optional[str]:
+    """The cursor a client would hold after walking ``page - 1`` pages."""
+    if page <= 1:
+        return None
+    conn = sqlite3.connect(path)
+    where, params = ("WHERE status = ?", [status]) if status else ("", [])
+    created_at, row_id = conn.execute(
+        f"SELECT created_at, id FROM analysis_jobs {where} ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET ?",
+        params + [(page - 1) * limit - 1],
+    ).fetchone()
+    conn.close()
+    return encode_job_cursor(datetime.strptime(created_at, SQLITE_DATETIME), row_id)
+
+
+async def _time_requests(client: httpx.AsyncClient, url: str, params: dict, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+async def _run(path: str, depths: list, limit: int, repeat: int) -> dict:
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for label, indexes, drop in [
+            ("previous", PREVIOUS_INDEXES, CURRENT_INDEXES),
+            ("current", CURRENT_INDEXES, PREVIOUS_INDEXES),
+        ]:
+            _use_indexes(path, indexes, drop)
+            for status in (None, JobStatus.FAILED):
+                for page in depths:
+                    params = {"limit": limit, "fields": PAGE_FIELDS}
+                    if status:
+                        params["status"] = status
+                    try:
+                        if label == "previous":
+                            url = "/_bench/offset/jobs"
+                            params["offset"] = (page - 1) * limit
+                        else:
+                            url = "/jobs"
+                            cursor = _cursor_before_page(path, page, limit, status)
+                            if cursor:
+                                params["cursor"] = cursor
+                        results[(label, status, page)] = await _time_requests(client, url, params, repeat)
+                    except (httpx.HTTPStatusError, TypeError):
+                        results[(label, status, page)] = None  # page beyond the filtered rows
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--depths", default="1,100,1000,10000,40000", help="page numbers to fetch")
+    parser.add_argument("--limit", type=int, default=20, help="page size")
+    parser.add_argument("--repeat", type=int, default=5, help="requests per measurement (median reported)")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    depths = [int(page) for page in args.depths.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        started = time.perf_counter()
+        _seed(path, args.rows)
+        print(f"seeded {args.rows:,} jobs in {time.perf_counter() - started:.1f}s\n")
+
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        database.AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+        results = asyncio.run(_run(path, depths, args.limit, args.repeat))
+
+    print(f"GET /jobs, {args.limit} per page, median of {args.repeat} requests (ms)\n")
+    print(f"{'filter':<16} {'page':>7} {'previous':>10} {'current':>10} {'speedup':>8}")
+    for status in (None, JobStatus.FAILED):
+        for page in depths:
+            previous = results[("previous", status, page)]
+            current = results[("current", status, page)]
+            if previous is None or current is None:
+                continue
+            print(f"{status or '-':<16} {page:>7} {previous:>10.1f} {current:>10.1f} {previous / current:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Load generator — drive the API at a target request rate under LLM throttling.
+
+Open-loop: requests arrive at ``--rate`` per second (Poisson or evenly
+spaced) for ``--duration`` seconds whether or not earlier ones have finished,
+so queueing and tail latency show up the way they do in production. Each
+arrival uploads a PDF to POST /analyze (sync) or POST /analyze/async and, for
+async, polls GET /jobs/{job_id} until the job finishes.
+
+By default everything runs in-process (see benchmarks.pipeline_e2e) against
+the mock NIM server from benchmarks.fake_llm, whose latency distribution, 429
+bursts and timeouts are set with the same flags. With ``--url`` it drives a
+running deployment instead; start the mock with `python -m benchmarks.fake_llm`
+and point the API and workers at it with LLM_BASE_URL.
+
+Reports outcomes (completed, failed, HTTP rejections, client timeouts),
+p50/p95/p99 latency, throughput, and the synthesis fallback rate: jobs whose
+final answer is the concatenated agent outputs because the synthesis call
+failed (from `stage_metrics` for async jobs, `synthesis_fallbacks_total` on
+/metrics for sync requests). In-process runs also report the mock's 429s and
+timeouts and the LLM calls that failed after client retries.
+
+Usage:
+    python -m benchmarks.load_test --mode async --rate 0.5 --duration 60 --latency 1 --latency-dist lognormal --rpm-limit 60
+    python -m benchmarks.load_test --mode sync --rate 0.2 --duration 120 --burst-every 30 --burst-seconds 5
+    python -m benchmarks.load_test --url http://localhost:8000 --llm-stats-url http://127.0.0.1:8900/stats --rate 1
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMServer, add_arguments, config_from_args
+from benchmarks.pipeline_e2e import (
+    POLL_INTERVAL_SECONDS,
+    TERMINAL,
+    add_app_arguments,
+    load_documents,
+    offline_app,
+    running_worker,
+)
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def _metric_sum(text: str, name: str, label: str = "") -> float:
+    """Sum a metric family in Prometheus text over the label sets containing ``label``."""
+    total = 0.0
+    for line in text.splitlines():
+        sample, _, value = line.rpartition(" ")
+        if (sample == name or sample.startswith(name + "{")) and label in sample:
+            total += float(value)
+    return total
+
+
+async def _scrape(client: httpx.AsyncClient) -> dict:
+    """Fallback and LLM error counts from the API's /metrics (empty if unavailable)."""
+    try:
+        response = await client.get("/metrics")
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return {}
+    return {
+        "fallbacks": _metric_sum(response.text, "synthesis_fallbacks_total"),
+        "llm_calls": _metric_sum(response.text, "llm_call_duration_seconds_count"),
+        "llm_errors": _metric_sum(response.text, "llm_call_duration_seconds_count", 'outcome="error"'),
+    }
+
+
+class LoadRun:
+    """Outcomes of one open-loop run."""
+
+    def __init__(self):
+        self.outcomes = Counter()
+        self.latencies = []
+        self.fallbacks = 0
+
+    def record(self, outcome: str, latency: float = None) -> None:
+        self.outcomes[outcome] += 1
+        if latency is not None:
+            self.latencies.append(latency)
+
+
+async def _one_request(client: httpx.AsyncClient, run: LoadRun, args, document: tuple, headers: dict) -> None:
+    filename, content = document
+    started = time.perf_counter()
+    deadline = started + args.timeout
+    files = {"file": (filename, content, "application/pdf")}
+    path = "/analyze" if args.mode == "sync" else "/analyze/async"
+    try:
+        response = await client.post(path, files=files, data={"query": args.query}, headers=headers, timeout=args.timeout)
+    except httpx.TimeoutException:
+        run.record("client_timeout")
+        return
+    except httpx.HTTPError:
+        run.record("connection_error")
+        return
+    if response.status_code != 200:
+        run.record(f"http_{response.status_code}")
+        return
+    if args.mode == "sync":
+        run.record("completed", time.perf_counter() - started)
+        return
+
+    job_id = response.json()["job_id"]
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        try:
+            job = (await client.get(f"/jobs/{job_id}", headers=headers)).json()
+        except httpx.HTTPError:
+            continue
+        if job.get("status") in TERMINAL:
+            break
+    else:
+        run.record("client_timeout")
+        return
+    if job["status"] != "completed":
+        run.record("failed")
+        return
+    run.record("completed", time.perf_counter() - started)
+    synthesis = (job.get("stage_metrics") or {}).get("synthesize") or {}
+    run.fallbacks += bool(synthesis.get("synthesis_fallbacks"))
+
+
+async def _generate_load(client: httpx.AsyncClient, args, documents: list) -> tuple:
+    """Fire arrivals at the target rate; returns (run, elapsed seconds, metrics delta)."""
+    rng = random.Random(args.seed)
+    headers = {"X-API-Key": args.api_key} if args.api_key else {}
+    run = LoadRun()
+    before = await _scrape(client)
+
+    started = time.perf_counter()
+    next_arrival = 0.0
+    tasks = []
+    while next_arrival < args.duration:
+        delay = started + next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        document = documents[len(tasks) % len(documents)]
+        tasks.append(asyncio.create_task(_one_request(client, run, args, document, headers)))
+        next_arrival += rng.expovariate(args.rate) if args.arrivals == "poisson" else 1 / args.rate
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    after = await _scrape(client)
+    delta = {key: after[key] - before.get(key, 0.0) for key in after}
+    return run, elapsed, delta
+
+
+async def _run(args, documents: list, main_module=None) -> tuple:
+    if main_module is None:
+        async with httpx.AsyncClient(base_url=args.url, timeout=None) as client:
+            return await _generate_load(client, args, documents)
+    transport = httpx.ASGITransport(app=main_module.app)
+    async with main_module.lifespan(main_module.app), httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        return await _generate_load(client, args, documents)
+
+
+def _report(args, run: LoadRun, elapsed: float, delta: dict, llm_stats: dict) -> None:
+    arrivals = sum(run.outcomes.values())
+    completed = run.outcomes["completed"]
+    print(f"{arrivals} requests in {elapsed:.1f}s ({arrivals / args.duration:.2f}/s offered over {args.duration:.0f}s)\n")
+    print(f"{'outcome':<18} {'count':>6} {'share':>7}")
+    for outcome, count in run.outcomes.most_common():
+        print(f"{outcome:<18} {count:>6} {count / arrivals:>7.1%}")
+
+    latencies = run.latencies
+    print(f"\n{'latency (s)':<18} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7} {'mean':>7}")
+    if latencies:
+        print(
+            f"{'completed':<18} {_percentile(latencies, 0.5):>7.2f} {_percentile(latencies, 0.95):>7.2f} "
+            f"{_percentile(latencies, 0.99):>7.2f} {max(latencies):>7.2f} {statistics.fmean(latencies):>7.2f}"
+        )
+    print(f"\nthroughput: {completed / elapsed * 60:.1f} completed jobs/min")
+
+    fallbacks = run.fallbacks if args.mode == "async" else delta.get("fallbacks")
+    if fallbacks is not None:
+        share = f" ({fallbacks / completed:.1%} of completed)" if completed else ""
+        print(f"synthesis fallbacks: {fallbacks:.0f}{share}")
+    else:
+        print("synthesis fallbacks: unknown (/metrics not reachable)")
+    if delta.get("llm_calls"):
+        print(f"LLM calls failed after client retries: {delta['llm_errors']:.0f} of {delta['llm_calls']:.0f}")
+    if llm_stats:
+        print(
+            f"mock LLM: {llm_stats['requests']} requests, {llm_stats['rate_limited']} answered 429, "
+            f"{llm_stats['timed_out']} timed out"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="drive a running API instead of the in-process app")
+    parser.add_argument("--llm-stats-url", help="with --url: the mock's /stats, to report its 429s and timeouts")
+    parser.add_argument("--api-key", help="X-API-Key for --url deployments with API_KEY set")
+    parser.add_argument("--mode", choices=["sync", "async"], default="async")
+    parser.add_argument("--rate", type=float, default=0.5, help="target requests per second")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to generate arrivals for")
+    parser.add_argument("--arrivals", choices=["poisson", "uniform"], default="poisson")
+    parser.add_argument("--timeout", type=float, default=900, help="client deadline per request/job in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    add_app_arguments(parser)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    documents = load_documents(args, max(1, int(args.rate * args.duration)))
+    if args.url:
+        run, elapsed, delta = asyncio.run(_run(args, documents))
+        llm_stats = httpx.get(args.llm_stats_url).json() if args.llm_stats_url else {}
+        _report(args, run, elapsed, delta, llm_stats)
+        return
+
+    llm = FakeLLMServer(config_from_args(args), seed=args.seed).start()
+    try:
+        with offline_app(args, llm.base_url) as (main_module, worker):
+            with running_worker(worker, args) if args.mode == "async" else nullcontext():
+                run, elapsed, delta = asyncio.run(_run(args, documents, main_module))
+            _report(args, run, elapsed, delta, llm.stats())
+    finally:
+        llm.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Offline end-to-end pipeline benchmark — the real app against a fake LLM.
+
+Drives POST /analyze (CrewAI in the API process) and POST /analyze/async →
+`analyze_document_task` → the staged Celery pipeline, with everything real
+except the model: agents, tools, PDF parsing, blob store, checkpoints, token
+accounting and the database all run as in production. LLM requests go to
+benchmarks.fake_llm (configurable latency and tokens per answer); Celery runs
+in-process on the in-memory broker; SQLite, the blob store and archives live
+in a temporary directory. No Redis, NIM key or network is needed, and a
+developer's .env is deliberately ignored.
+
+Reports p50/p95 job latency, jobs per minute and, for the async pipeline,
+queue and run time per stage (from each job's `stage_metrics`). Documents are
+generated text PDFs unless --pdf is given.
+
+Usage:
+    python -m benchmarks.pipeline_e2e --jobs 20 --latency 0.5 --completion-tokens 400
+    python -m benchmarks.pipeline_e2e --mode async --jobs 40 --worker-concurrency 16 --pdf data/report.pdf
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMServer, add_arguments, config_from_args
+from benchmarks.reports import report_pdf
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TERMINAL = ("completed", "failed", "cancelled")
+POLL_INTERVAL_SECONDS = 0.05
+STAGES = ["extract", "verify", "analyze", "invest_risk", "synthesize", "persist"]
+
+
+def _isolate_environment(tmp: str, llm_base_url: str, args: argparse.Namespace) -> None:
+    """Point the app at temporary storage and the fake LLM before it is imported."""
+    import dotenv
+
+    # main/worker/agents/tools call load_dotenv(override=True) at import; a
+    # developer's .env (real NIM key, DATABASE_URL, Upstash) must not leak in
+    dotenv.load_dotenv = lambda *args, **kwargs: False
+    os.environ.update({
+        "NVIDIA_API_KEY": "offline-benchmark",
+        "LLM_BASE_URL": llm_base_url,
+        "DATABASE_URL": "",
+        "UPSTASH_REDIS_URL": "",
+        "API_KEY": "",
+        # Per-client rate limits would throttle the load itself
+        "RATE_LIMIT_ENABLED": "false",
+        "BLOB_STORE_BACKEND": "local",
+        "BLOB_STORE_DIR": os.path.join(tmp, "blobs"),
+        "ARCHIVE_DIR": os.path.join(tmp, "archive"),
+        "WORKER_POOL": "threads",
+        "WORKER_CONCURRENCY": str(args.worker_concurrency),
+        # As many threads for sync /analyze crews as the worker has for jobs
+        "SYNC_ANALYSIS_WORKERS": str(args.worker_concurrency),
+        "LLM_MAX_CONCURRENCY": str(args.llm_slots),
+        "WORKER_METRICS_PORT": "0",
+        "SERPER_API_KEY": os.environ.get("SERPER_API_KEY", "offline-benchmark"),
+        "OTEL_SDK_DISABLED": "true",
+        "CREWAI_DISABLE_TELEMETRY": "true",
+        "CREWAI_TRACING_ENABLED": "false",
+    })
+    # SQLite falls back to ./financial_analyzer.db
+    os.chdir(tmp)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+
+def _configure_celery(celery_app) -> None:
+    celery_app.conf.update(
+        broker_url="memory://",
+        result_backend="cache+memory://",
+        broker_use_ssl=None,
+        redis_backend_use_ssl=None,
+        # Prefetch deeper than production (see worker_pool_throughput): the
+        # in-memory transport only refills the window on a slow timer
+        worker_prefetch_multiplier=4,
+        broker_transport_options={"polling_interval": 0.01},
+    )
+
+
+def load_documents(args: argparse.Namespace, count: int) -> list:
+    """(filename, bytes) per distinct document; jobs cycle through them."""
+    if args.pdf:
+        documents = []
+        for path in args.pdf:
+            with open(path, "rb") as f:
+                documents.append((os.path.basename(path), f.read()))
+        return documents
+    rng = random.Random(0)
+    # Distinct content per job, or every upload dedups to one blob
+    return [(f"report-{i}.pdf", report_pdf(rng, args.pages)) for i in range(count)]
+
+
+def add_app_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options for the in-process app, worker and uploaded documents."""
+    parser.add_argument("--worker-concurrency", type=int, default=8, help="Celery threads pool size (and sync /analyze threads)")
+    parser.add_argument("--llm-slots", type=int, default=4, help="LLM_MAX_CONCURRENCY (0 = unlimited)")
+    parser.add_argument("--pdf", nargs="*", help="PDF files to upload (default: generated reports)")
+    parser.add_argument("--pages", type=int, default=12, help="pages per generated report")
+    parser.add_argument("--verbose", action="store_true", help="keep the agents' step-by-step output")
+    parser.add_argument("--query", default="Analyze this financial document for investment insights")
+
+
+@contextmanager
+def offline_app(args: argparse.Namespace, llm_base_url: str) -> Iterator[Tuple[object, object]]:
+    """Import the app against temporary storage and ``llm_base_url``; yields (main, worker)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        _isolate_environment(tmp, llm_base_url, args)
+        for name in ("httpx", "celery", "kombu", "LiteLLM", "crewai", "worker", "main"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+        try:
+            import structlog
+
+            import agents
+            import main as main_module
+            import worker
+
+            if not args.verbose:
+                # Agents print every step and answer, which would bury the report
+                for agent in (agents.verifier, agents.financial_analyst, agents.investment_advisor, agents.risk_assessor):
+                    agent.verbose = False
+
+            structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.ERROR))
+            _configure_celery(worker.celery_app)
+            yield main_module, worker
+        finally:
+            os.chdir(cwd)
+
+
+@contextmanager
+def running_worker(worker, args: argparse.Namespace) -> Iterator[None]:
+    """An in-process Celery worker consuming every pipeline queue."""
+    from celery.contrib.testing.worker import start_worker
+
+    with start_worker(
+        worker.celery_app,
+        pool="threads",
+        concurrency=args.worker_concurrency,
+        queues=worker.ALL_QUEUES,
+        perform_ping_check=False,
+        shutdown_timeout=60,
+    ):
+        yield
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+async def _run_sync(client: httpx.AsyncClient, documents: list, jobs: int, concurrency: int, query: str) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one(i: int) -> None:
+        nonlocal failures
+        filename, content = documents[i % len(documents)]
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                "/analyze",
+                files={"file": (filename, content, "application/pdf")},
+                data={"query": query},
+            )
+            if response.status_code != 200:
+                failures += 1
+                return
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(jobs)))
+    return {"elapsed": time.perf_counter() - started, "latencies": latencies, "failed": failures, "jobs": []}
+
+
+async def _run_async(client: httpx.AsyncClient, documents: list, jobs: int, concurrency: int, query: str) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, finished, failures = [], [], 0
+
+    async def one(i: int) -> None:
+        nonlocal failures
+        filename, content = documents[i % len(documents)]
+        started = time.perf_counter()
+        async with semaphore:
+            response = await client.post(
+                "/analyze/async",
+                files={"file": (filename, content, "application/pdf")},
+                data={"query": query},
+            )
+        if response.status_code != 200:
+            failures += 1
+            return
+        job_id = response.json()["job_id"]
+        while True:
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+            job = (await client.get(f"/jobs/{job_id}")).json()
+            if job["status"] in TERMINAL:
+                break
+        if job["status"] != "completed":
+            failures += 1
+            return
+        latencies.append(time.perf_counter() - started)
+        finished.append(job)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(jobs)))
+    return {"elapsed": time.perf_counter() - started, "latencies": latencies, "failed": failures, "jobs": finished}
+
+
+async def _run_mode(main_module, mode: str, documents: list, args: argparse.Namespace) -> dict:
+    transport = httpx.ASGITransport(app=main_module.app)
+    async with main_module.lifespan(main_module.app), httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        run = _run_sync if mode == "sync" else _run_async
+        return await run(client, documents, args.jobs, args.concurrency, args.query)
+
+
+def _print_summary(mode: str, result: dict, llm_before: dict, llm_after: dict) -> None:
+    latencies = result["latencies"]
+    done = len(latencies)
+    requests = llm_after["requests"] - llm_before["requests"]
+    tokens = (llm_after["prompt_tokens"] + llm_after["completion_tokens"]
+              - llm_before["prompt_tokens"] - llm_before["completion_tokens"])
+    print(
+        f"{mode:<7} {done:>5} {result['failed']:>6} {_percentile(latencies, 0.5):>8.2f} "
+        f"{_percentile(latencies, 0.95):>8.2f} {done / result['elapsed'] * 60:>9.1f} "
+        f"{requests / max(done, 1):>11.1f} {tokens / max(done, 1):>11.0f}"
+    )
+
+
+def _print_stages(jobs: list) -> None:
+    by_stage = defaultdict(lambda: defaultdict(list))
+    for job in jobs:
+        for stage, values in (job.get("stage_metrics") or {}).items():
+            for key, value in values.items():
+                by_stage[stage][key].append(value)
+    if not by_stage:
+        return
+    print(f"\nasync pipeline per stage ({len(jobs)} jobs)")
+    print(f"{'stage':<12} {'queue p50':>10} {'queue p95':>10} {'run p50':>9} {'run p95':>9} {'LLM calls':>10} {'LLM s':>7} {'tools':>6}")
+    for stage in [s for s in STAGES if s in by_stage] + [s for s in by_stage if s not in STAGES]:
+        values = by_stage[stage]
+        print(
+            f"{stage:<12} {_percentile(values['queue_seconds'], 0.5):>10.3f} "
+            f"{_percentile(values['queue_seconds'], 0.95):>10.3f} "
+            f"{_percentile(values['run_seconds'], 0.5):>9.3f} {_percentile(values['run_seconds'], 0.95):>9.3f} "
+            f"{statistics.fmean(values['llm_calls'] or [0]):>10.1f} "
+            f"{statistics.fmean(values['llm_seconds'] or [0]):>7.2f} "
+            f"{statistics.fmean(values['tool_calls'] or [0]):>6.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+    parser.add_argument("--jobs", type=int, default=20, help="jobs per mode")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent /analyze requests (sync) or uploads (async)")
+    add_app_arguments(parser)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    llm = FakeLLMServer(config_from_args(args)).start()
+    documents = load_documents(args, args.jobs)
+    try:
+        with offline_app(args, llm.base_url) as (main_module, worker):
+            print(
+                f"{args.jobs} jobs/mode, {len(documents)} document(s), LLM {args.latency}s + "
+                f"{args.completion_tokens} tokens/answer, worker threads x{args.worker_concurrency}, "
+                f"{args.llm_slots or 'unlimited'} LLM slots\n"
+            )
+            print(f"{'mode':<7} {'done':>5} {'failed':>6} {'p50 s':>8} {'p95 s':>8} {'jobs/min':>9} {'LLM req/job':>11} {'tokens/job':>11}")
+            async_jobs = []
+            for mode in (["sync", "async"] if args.mode == "both" else [args.mode]):
+                before = llm.stats()
+                if mode == "async":
+                    with running_worker(worker, args):
+                        result = asyncio.run(_run_mode(main_module, mode, documents, args))
+                    async_jobs = result["jobs"]
+                else:
+                    result = asyncio.run(_run_mode(main_module, mode, documents, args))
+                _print_summary(mode, result, before, llm.stats())
+            _print_stages(async_jobs)
+    finally:
+        llm.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Rate limiter overhead benchmark — what the per-tenant limiter adds to a request.
+
+Sends the same trivial GET through the full middleware stack with rate
+limiting off, then on with each tenant kind: a client address, and a user
+found by X-API-Key (one database lookup, then the tenant cache). Quotas are
+set high enough that nothing is refused, so the difference is the cost of
+the check itself. The in-process counters are always measured; with
+``--redis-url`` the Redis backend is too (one Lua call per request, so its
+cost is mostly the round trip to Redis).
+
+Also prints the middleware's own p50/p95 from `rate_limit_check_seconds`,
+which is what production exports.
+
+Usage:
+    python -m benchmarks.rate_limiter --requests 2000 --concurrency 20
+    python -m benchmarks.rate_limiter --requests 2000 --redis-url redis://localhost:6379/0
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import database
+import rate_limit
+from config import settings
+from database import Base, User, hash_api_key
+from main import app
+from metrics import RATE_LIMIT_CHECK_SECONDS
+
+BENCH_API_KEY = "bench-rate-limit-key"
+
+
+@app.get("/_bench/ping", include_in_schema=False)
+async def ping():
+    return {"ok": True}
+
+
+def _setup_database(path: str) -> None:
+    """Point the API at a fresh SQLite file holding one active user."""
+    sync_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(sync_engine)
+    database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+    database.AsyncSessionLocal = async_sessionmaker(
+        create_async_engine(f"sqlite+aiosqlite:///{path}"), autoflush=False, expire_on_commit=False
+    )
+    with database.get_db_session() as db:
+        db.add(User(email="bench@example.com", api_key_hash=hash_api_key(BENCH_API_KEY), is_active=1))
+
+
+def _buckets(backend: str) -> list:
+    """Cumulative (upper bound, count) buckets of `rate_limit_check_seconds` for ``backend``."""
+    return [
+        (float(sample.labels["le"]), sample.value)
+        for metric in RATE_LIMIT_CHECK_SECONDS.collect()
+        for sample in metric.samples
+        if sample.name.endswith("_bucket") and sample.labels["backend"] == backend
+    ]
+
+
+def _check_percentiles(before: list, after: list) -> tuple:
+    """(p50, p95) microseconds, as bucket upper bounds, of the checks between two readings."""
+    previous = dict(before)
+    counts = [(le, value - previous.get(le, 0.0)) for le, value in after]
+    total = counts[-1][1] if counts else 0
+    if not total:
+        return None, None
+    return tuple(next(le for le, count in counts if count >= total * fraction) * 1e6 for fraction in (0.5, 0.95))
+
+
+async def _run_load(requests: int, concurrency: int, headers: dict) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        async def one() -> None:
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get("/_bench/ping")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        # Warm up: first tenant lookup, Lua script load, connection pool
+        await asyncio.gather(*(one() for _ in range(min(requests, concurrency))))
+        latencies.clear()
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+    await rate_limit.rate_limiter.close()
+
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50_us": statistics.median(latencies) * 1e6,
+        "p95_us": latencies[int(len(latencies) * 0.95) - 1] * 1e6,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--redis-url", help="also measure the Redis backend against this server")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    # Nothing is refused: only the cost of counting is measured
+    settings.rate_limit_per_minute = 10 ** 9
+    runs = [("off", "memory", False, {})]
+    for backend in ["memory"] + (["redis"] if args.redis_url else []):
+        runs.append((f"{backend}, per address", backend, True, {}))
+        runs.append((f"{backend}, per API key", backend, True, {"X-API-Key": BENCH_API_KEY}))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _setup_database(os.path.join(tmp, "bench.db"))
+        print(f"{args.requests} requests, concurrency {args.concurrency}\n")
+        print(
+            f"{'rate limiting':<24} {'req/s':>8} {'p50 us':>8} {'p95 us':>8} "
+            f"{'check p50 us':>13} {'check p95 us':>13}"
+        )
+        for label, backend, enabled, headers in runs:
+            settings.rate_limit_enabled = enabled
+            settings.upstash_redis_url = args.redis_url if backend == "redis" else ""
+            before = _buckets(backend)
+            stats = asyncio.run(_run_load(args.requests, args.concurrency, headers))
+            check_p50, check_p95 = _check_percentiles(before, _buckets(backend)) if enabled else (None, None)
+            check = (
+                f"{'<=' + format(check_p50, '.0f'):>13} {'<=' + format(check_p95, '.0f'):>13}"
+                if check_p50 is not None else f"{'-':>13} {'-':>13}"
+            )
+            print(f"{label:<24} {stats['rps']:>8.0f} {stats['p50_us']:>8.0f} {stats['p95_us']:>8.0f} {check}")
+        print("\nreq/s and latency are end to end; 'check' is the limiter alone (histogram bucket bounds)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Synthetic analysis reports shared by the benchmarks."""
+import random
+
+REPORT_SIZES = {  # approximate characters per agent output
+    "verification_report": 4_000,
+    "financial_analysis": 12_000,
+    "investment_analysis": 10_000,
+    "risk_assessment": 10_000,
+    "analysis": 14_000,
+}
+VOCABULARY = (
+    "revenue net income operating margin gross profit EBITDA free cash flow capital expenditure "
+    "guidance quarter year-over-year growth decline deliveries automotive energy storage services "
+    "liquidity leverage debt equity dividend valuation multiple risk exposure competition regulatory "
+    "supply chain inflation interest rates demand pricing outlook recommendation HOLD BUY SELL the of "
+    "and to in with by a is was were increased decreased compared due primarily reflecting driven"
+).split()
+
+
+def report_markdown(rng: random.Random, chars: int) -> str:
+    """Report-like markdown with realistic entropy (not trivially compressible)."""
+    lines = []
+    size = 0
+    while size < chars:
+        if rng.random() < 0.1:
+            line = "## " + " ".join(rng.choices(VOCABULARY, k=4)).title()
+        elif rng.random() < 0.3:
+            line = f"- **{rng.choice(VOCABULARY)}**: ${rng.uniform(0.1, 99):.2f}B ({rng.uniform(-30, 30):+.1f}% YoY)"
+        else:
+            line = " ".join(rng.choices(VOCABULARY, k=rng.randint(15, 40))).capitalize() + "."
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+
+def job_reports(rng: random.Random) -> dict:
+    """One completed job's agent outputs and final analysis, keyed by result column."""
+    return {column: report_markdown(rng, size) for column, size in REPORT_SIZES.items()}
+
+
+def _pdf_text(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def report_pdf(rng: random.Random, pages: int = 10, lines_per_page: int = 45) -> bytes:
+    """A text-only PDF (Helvetica, one content stream per page) that pypdf can extract."""
+    page_texts = []
+    for _ in range(pages):
+        words = report_markdown(rng, lines_per_page * 90).replace("\n", " ").split()
+        lines, line = [], ""
+        for word in words:
+            if len(line) + len(word) > 90:
+                lines.append(line)
+                line = ""
+            line = f"{line} {word}" if line else word
+        page_texts.append(lines[:lines_per_page])
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for lines in page_texts:
+        stream = "BT /F1 10 Tf 14 TL 50 800 Td " + " ".join(f"({_pdf_text(line)}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream".encode())
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>".encode()
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
@@ -0,0 +1,143 @@
+"""
+Result caching benchmark — bytes transferred and latency for repeated views.
+
+Seeds one completed job with report-sized agent outputs and views it
+repeatedly, the way the dashboard does when a user reopens a result:
+
+  previous     plain JSON, no validators: every view re-sends the full body
+  revalidate   ETag + compression: first view compressed, then 304s
+  immutable    a browser honouring `Cache-Control: immutable` only fetches once
+
+Both /results/{job_id} and /jobs/{job_id} are measured through the real API
+(httpx ASGI transport). Bytes are as sent on the wire (after compression).
+
+Usage:
+    python -m benchmarks.result_caching --views 50 --encoding br
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import database
+from benchmarks.reports import job_reports
+from database import AnalysisJob, AnalysisResult, Base, JobStatus
+from main import app, load_job_response, load_result_payload
+
+JOB_ID = "00000000-0000-0000-0000-000000000001"
+
+
+@app.get("/_bench/plain/results/{job_id}", include_in_schema=False)
+async def plain_result(job_id: str):
+    """The previous /results: full JSON body on every request."""
+    async with database.get_async_db_session() as db:
+        return await load_result_payload(db, job_id)
+
+
+@app.get("/_bench/plain/jobs/{job_id}", include_in_schema=False)
+async def plain_job(job_id: str):
+    """The previous /jobs/{job_id}: full JSON body on every request."""
+    async with database.get_async_db_session() as db:
+        return await load_job_response(db, job_id)
+
+
+def _seed(path: str) -> None:
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    reports = job_reports(random.Random(7))
+    with sessionmaker(bind=engine)() as db:
+        db.add(AnalysisJob(
+            job_id=JOB_ID,
+            query="Analyze this financial document for investment insights",
+            original_filename="TSLA-Q2-2025-Update.pdf",
+            status=JobStatus.COMPLETED,
+            duration_seconds=184,
+        ))
+        db.add(AnalysisResult(
+            job_id=JOB_ID,
+            query="Analyze this financial document for investment insights",
+            original_filename="TSLA-Q2-2025-Update.pdf",
+            summary=reports["analysis"][:280],
+            duration_seconds=184,
+            **reports,
+        ))
+        db.commit()
+    engine.dispose()
+
+
+async def _views(client: httpx.AsyncClient, url: str, views: int, encoding: str, mode: str) -> dict:
+    """View ``url`` repeatedly; returns total wire bytes and per-view latency."""
+    headers = {"Accept-Encoding": encoding}
+    cached = None  # (etag, cache-control) of the stored copy
+    wire_bytes, timings = 0, []
+    for _ in range(views):
+        started = time.perf_counter()
+        if mode == "immutable" and cached and "immutable" in cached[1]:
+            timings.append(time.perf_counter() - started)  # served from the browser cache
+            continue
+        request_headers = dict(headers)
+        if mode != "previous" and cached:
+            request_headers["If-None-Match"] = cached[0]
+        response = await client.get(url, headers=request_headers)
+        if response.status_code not in (200, 304):
+            response.raise_for_status()
+        timings.append(time.perf_counter() - started)
+        wire_bytes += response.num_bytes_downloaded
+        if "etag" in response.headers:
+            cached = (response.headers["etag"], response.headers.get("cache-control", ""))
+    return {
+        "bytes": wire_bytes,
+        "mean_ms": statistics.mean(timings) * 1000,
+        "first_ms": timings[0] * 1000,
+    }
+
+
+async def _run(views: int, encoding: str) -> list:
+    rows = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for endpoint, plain_url, url in [
+            ("/results/{id}", f"/_bench/plain/results/{JOB_ID}", f"/results/{JOB_ID}"),
+            ("/jobs/{id}", f"/_bench/plain/jobs/{JOB_ID}", f"/jobs/{JOB_ID}"),
+        ]:
+            rows.append((endpoint, "previous", await _views(client, plain_url, views, "identity", "previous")))
+            rows.append((endpoint, "revalidate", await _views(client, url, views, encoding, "revalidate")))
+            if endpoint == "/results/{id}":
+                rows.append((endpoint, "immutable", await _views(client, url, views, encoding, "immutable")))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--views", type=int, default=50, help="views of the same completed job")
+    parser.add_argument("--encoding", default="br", help="Accept-Encoding the client sends (br, gzip, identity)")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        _seed(path)
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        database.AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+        rows = asyncio.run(_run(args.views, args.encoding))
+
+    print(f"{args.views} views of one completed job, Accept-Encoding: {args.encoding}\n")
+    print(f"{'endpoint':<15} {'mode':<12} {'total KB':>10} {'KB/view':>9} {'first ms':>9} {'mean ms':>8}")
+    for endpoint, mode, stats in rows:
+        print(
+            f"{endpoint:<15} {mode:<12} {stats['bytes'] / 1024:>10.1f} {stats['bytes'] / 1024 / args.views:>9.2f} "
+            f"{stats['first_ms']:>9.2f} {stats['mean_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
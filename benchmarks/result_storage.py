@@ -0,0 +1,160 @@
+"""
+Result storage benchmark — database size and result read latency before and
+after migrating to compressed, de-duplicated storage.
+
+Seeds a SQLite file with completed jobs in the previous layout, then runs
+`migrate_results.migrate()` against it:
+
+  previous  plain-text reports, the final report duplicated on analysis_jobs,
+            every stage checkpoint (including the extracted document text)
+            kept after completion
+  current   reports compressed with RESULT_COMPRESSION, one copy of the final
+            report, checkpoints deleted once the result row is written
+
+Sizes are measured after VACUUM. Reads go through the API's own loaders
+(`load_result_payload` for /results, `load_job_response` for /jobs/{job_id}),
+so decompression is included in the current timings.
+
+Usage:
+    python -m benchmarks.result_storage --jobs 2000 --codec zlib
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import database
+import migrate_results
+from benchmarks.reports import job_reports, report_markdown
+from config import settings
+from database import Base, JobStatus
+from main import load_job_response, load_result_payload
+
+DOCUMENT_CHARS = 40_000  # extracted PDF text kept in the "document" checkpoint
+CHECKPOINT_COLUMNS = {
+    "verification": "verification_report",
+    "analysis": "financial_analysis",
+    "investment": "investment_analysis",
+    "risk": "risk_assessment",
+    "synthesis": "analysis",
+}
+DISTINCT_REPORTS = 50  # report sets generated, then reused across jobs
+
+
+def _seed_previous_layout(path: str, jobs: int) -> list:
+    """Write ``jobs`` completed jobs the way earlier releases stored them."""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    rng = random.Random(11)
+    report_sets = [job_reports(rng) for _ in range(DISTINCT_REPORTS)]
+    documents = [report_markdown(rng, DOCUMENT_CHARS) for _ in range(DISTINCT_REPORTS)]
+    now = datetime.utcnow().isoformat(sep=" ")
+    job_ids = []
+
+    conn = sqlite3.connect(path)
+    for i in range(jobs):
+        job_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        job_ids.append(job_id)
+        reports = report_sets[i % DISTINCT_REPORTS]
+        conn.execute(
+            "INSERT INTO analysis_jobs (job_id, query, original_filename, status, result, duration_seconds, "
+            "created_at, completed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, "Analyze this financial document", f"report-{i}.pdf", JobStatus.COMPLETED,
+             reports["analysis"], 180, now, now),
+        )
+        conn.execute(
+            "INSERT INTO analysis_results (job_id, query, original_filename, verification_report, "
+            "financial_analysis, investment_analysis, risk_assessment, analysis, summary, duration_seconds, "
+            "created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, "Analyze this financial document", f"report-{i}.pdf", reports["verification_report"],
+             reports["financial_analysis"], reports["investment_analysis"], reports["risk_assessment"],
+             reports["analysis"], reports["analysis"][:280], 180, now),
+        )
+        checkpoints = [("document", documents[i % DISTINCT_REPORTS])]
+        checkpoints += [(stage, reports[column]) for stage, column in CHECKPOINT_COLUMNS.items()]
+        conn.executemany(
+            "INSERT INTO analysis_checkpoints (job_id, stage, output, created_at) VALUES (?, ?, ?, ?)",
+            [(job_id, stage, output, now) for stage, output in checkpoints],
+        )
+    conn.commit()
+    conn.close()
+    return job_ids
+
+
+def _vacuumed_size(path: str) -> int:
+    conn = sqlite3.connect(path)
+    conn.execute("VACUUM")
+    conn.close()
+    return os.path.getsize(path)
+
+
+async def _read_latency(path: str, job_ids: list, reads: int) -> dict:
+    """Per-read latency (ms) of the /results and /jobs/{job_id} loaders."""
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    database.AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    sample = random.Random(3).sample(job_ids, min(reads, len(job_ids)))
+    timings = {"result": [], "job": []}
+    try:
+        for job_id in sample:
+            for kind, load in (("result", load_result_payload), ("job", load_job_response)):
+                started = time.perf_counter()
+                async with database.get_async_db_session() as db:
+                    assert await load(db, job_id) is not None
+                timings[kind].append((time.perf_counter() - started) * 1000)
+    finally:
+        await async_engine.dispose()
+    return {
+        kind: (statistics.median(values), statistics.quantiles(values, n=20)[18])
+        for kind, values in timings.items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=2000, help="completed jobs to seed")
+    parser.add_argument("--reads", type=int, default=200, help="jobs sampled for read latency")
+    parser.add_argument("--codec", default="zlib", help="RESULT_COMPRESSION for the migration (zlib, zstd, none)")
+    parser.add_argument("--batch-size", type=int, default=200, help="migration batch size")
+    args = parser.parse_args()
+    logging.getLogger("migrate_results").setLevel(logging.WARNING)
+    settings.result_compression = args.codec
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        print(f"Seeding {args.jobs} completed jobs in the previous layout...")
+        job_ids = _seed_previous_layout(path, args.jobs)
+        rows.append(("previous", _vacuumed_size(path), asyncio.run(_read_latency(path, job_ids, args.reads))))
+
+        engine = create_engine(f"sqlite:///{path}")
+        database.engine = migrate_results.engine = engine
+        started = time.perf_counter()
+        stats = migrate_results.migrate(args.batch_size)
+        migration_seconds = time.perf_counter() - started
+        engine.dispose()
+        rows.append(("current", _vacuumed_size(path), asyncio.run(_read_latency(path, job_ids, args.reads))))
+
+    print(f"\nMigration ({args.codec}) took {migration_seconds:.1f}s: {stats}\n")
+    print(f"{'layout':<10} {'DB MB':>8} {'KB/job':>8} {'results p50':>12} {'p95':>7} {'job p50':>8} {'p95':>7}")
+    for layout, size, latency in rows:
+        print(
+            f"{layout:<10} {size / 2**20:>8.1f} {size / 1024 / args.jobs:>8.1f} "
+            f"{latency['result'][0]:>10.2f}ms {latency['result'][1]:>5.2f}ms "
+            f"{latency['job'][0]:>6.2f}ms {latency['job'][1]:>5.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Retention benchmark — hot-table size and query latency as the service ages.
+
+Simulates a year of job inflow into two SQLite files, one day at a time:
+
+  previous  nothing is ever deleted
+  current   the daily maintenance pass archives finished jobs older than
+            --retention-days (retention.archive_expired_jobs + vacuum_tables)
+
+At checkpoints it reports rows in analysis_jobs, database file size, and the
+latency of two API queries that scan by status: the uncached total count and
+the first page of failed jobs.
+
+Usage:
+    python -m benchmarks.retention --days 365 --jobs-per-day 200 --retention-days 90
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, select
+
+import database
+import retention
+from benchmarks.reports import report_markdown
+from database import AnalysisJob, AnalysisResult, Base, JobStatus, compress_text
+
+REPORT_CHARS = 3_000
+CHECKPOINT_DAYS = (30, 90, 180, 270, 365)
+STATUSES = [JobStatus.COMPLETED] * 9 + [JobStatus.FAILED]
+
+
+def _insert_day(path: str, day: datetime, jobs: int, rng: random.Random, reports: list) -> None:
+    conn = sqlite3.connect(path)
+    job_rows, result_rows = [], []
+    for _ in range(jobs):
+        job_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        created_at = (day + timedelta(seconds=rng.randrange(86400))).isoformat(sep=" ")
+        status = rng.choice(STATUSES)
+        job_rows.append((job_id, "Analyze this document", "report.pdf", status, created_at, created_at))
+        if status == JobStatus.COMPLETED:
+            report = rng.choice(reports)
+            result_rows.append((job_id, "Analyze this document", "report.pdf", report, created_at))
+    conn.executemany(
+        "INSERT INTO analysis_jobs (job_id, query, original_filename, status, created_at, completed_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        job_rows,
+    )
+    conn.executemany(
+        "INSERT INTO analysis_results (job_id, query, original_filename, analysis, created_at) VALUES (?, ?, ?, ?, ?)",
+        result_rows,
+    )
+    conn.commit()
+    conn.close()
+
+
+def _query_latency(engine, repeats: int = 20) -> dict:
+    """Median ms of the uncached status count and the first failed-jobs page."""
+    timings = {"count": [], "page": []}
+    with engine.connect() as conn:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            conn.execute(select(func.count()).select_from(AnalysisJob).where(AnalysisJob.status == JobStatus.FAILED)).scalar()
+            timings["count"].append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            conn.execute(
+                select(AnalysisJob.job_id, AnalysisJob.status, AnalysisJob.created_at)
+                .where(AnalysisJob.status == JobStatus.FAILED)
+                .order_by(AnalysisJob.created_at.desc(), AnalysisJob.id.desc())
+                .limit(20)
+            ).all()
+            timings["page"].append((time.perf_counter() - started) * 1000)
+    return {name: statistics.median(values) for name, values in timings.items()}
+
+
+def _simulate(path: str, args, apply_retention: bool, archive_dir: str) -> list:
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    database.engine = retention.engine = engine
+
+    rng = random.Random(5)
+    reports = [compress_text(report_markdown(rng, REPORT_CHARS)) for _ in range(20)]
+    start = datetime.utcnow() - timedelta(days=args.days)
+    rows, archive_seconds = [], 0.0
+
+    for day in range(1, args.days + 1):
+        _insert_day(path, start + timedelta(days=day - 1), args.jobs_per_day, rng, reports)
+        if apply_retention:
+            started = time.perf_counter()
+            cutoff = start + timedelta(days=day - args.retention_days)
+            retention.archive_expired_jobs(cutoff, batch_size=500, archive_dir=archive_dir)
+            retention.vacuum_tables()
+            archive_seconds += time.perf_counter() - started
+        if day in CHECKPOINT_DAYS or day == args.days:
+            with engine.connect() as conn:
+                job_count = conn.execute(select(func.count()).select_from(AnalysisJob)).scalar()
+                result_count = conn.execute(select(func.count()).select_from(AnalysisResult)).scalar()
+            rows.append((day, job_count, result_count, os.path.getsize(path), _query_latency(engine)))
+    engine.dispose()
+    return rows, archive_seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365, help="days of inflow to simulate")
+    parser.add_argument("--jobs-per-day", type=int, default=200, help="jobs created per simulated day")
+    parser.add_argument("--retention-days", type=int, default=90, help="retention applied in the current mode")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("previous", "current"):
+            path = os.path.join(tmp, f"{mode}.db")
+            archive_dir = os.path.join(tmp, "archive")
+            results[mode] = _simulate(path, args, mode == "current", archive_dir)
+        archive_bytes = sum(entry.stat().st_size for entry in os.scandir(archive_dir))
+
+    print(f"{args.days} days x {args.jobs_per_day} jobs/day, retention {args.retention_days} days (SQLite)\n")
+    print(f"{'mode':<10} {'day':>4} {'jobs':>8} {'results':>8} {'DB MB':>7} {'count ms':>9} {'page ms':>8}")
+    for mode, (rows, _) in results.items():
+        for day, jobs, result_rows, size, latency in rows:
+            print(
+                f"{mode:<10} {day:>4} {jobs:>8} {result_rows:>8} {size / 2**20:>7.1f} "
+                f"{latency['count']:>9.2f} {latency['page']:>8.2f}"
+            )
+    archived_days = max(0, args.days - args.retention_days)
+    print(
+        f"\nDaily maintenance: {results['current'][1] / args.days * 1000:.1f} ms/day on average; "
+        f"{archived_days * args.jobs_per_day} jobs archived into {archive_bytes / 2**20:.1f} MB of gzip'd JSON lines"
+    )
+
+
+if __name__ == "__main__":
+    main()
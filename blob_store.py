@@ -0,0 +1,262 @@
+"""
+Content-addressed storage for uploaded PDFs.
+Blobs are keyed by the SHA-256 of their content, so identical uploads are stored
+once. Reference counts live in the database (shared by the API and every
+worker); the bytes live in a pluggable backend. Workers receive a blob key
+instead of a filesystem path.
+"""
+import os
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+from typing import Generator, Iterator, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from config import settings
+from database import get_db_session, DocumentBlob
+
+logger = logging.getLogger(__name__)
+
+# Document references handed to agents look like blob://<sha256>
+BLOB_URI_PREFIX = "blob://"
+
+
+def blob_uri(key: str) -> str:
+    """Reference to a blob that the document reader tool can resolve."""
+    return f"{BLOB_URI_PREFIX}{key}"
+
+
+def content_key(content: bytes) -> str:
+    """Content hash used as the blob key."""
+    return hashlib.sha256(content).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+class BlobUpload:
+    """Incremental writer for a blob whose key is only known once all chunks are in."""
+    
+    def write(self, chunk: bytes) -> None:
+        raise NotImplementedError
+    
+    def commit(self, key: str) -> None:
+        """Publish the written bytes under ``key``."""
+        raise NotImplementedError
+    
+    def abort(self) -> None:
+        """Discard the written bytes."""
+        raise NotImplementedError
+
+
+class BlobStore:
+    """Storage backend interface: raw bytes by key, no reference counting."""
+    
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+    
+    def begin_upload(self) -> BlobUpload:
+        raise NotImplementedError
+    
+    def write(self, key: str, content: bytes) -> None:
+        upload = self.begin_upload()
+        try:
+            upload.write(content)
+            upload.commit(key)
+        except Exception:
+            upload.abort()
+            raise
+    
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+    
+    def local_path(self, key: str):
+        """Context manager yielding a local filesystem path for the blob
+        (downloading it first for remote backends)."""
+        raise NotImplementedError
+    
+    def list_keys(self) -> Iterator[Tuple[str, float]]:
+        """Every stored key with its last-modified time (epoch seconds)."""
+        raise NotImplementedError
+    
+    def discard_stale_uploads(self, older_than: float) -> int:
+        """Delete partial uploads abandoned before ``older_than``; returns how many."""
+        return 0
+
+
+class _LocalBlobUpload(BlobUpload):
+    """Chunks go to a temp file in the store, renamed into place on commit so
+    readers never see a partial blob."""
+    
+    def __init__(self, store: "LocalBlobStore"):
+        self.store = store
+        staging_dir = os.path.join(store.root, "tmp")
+        os.makedirs(staging_dir, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=staging_dir, suffix=".part")
+        self.file = os.fdopen(fd, "wb")
+    
+    def write(self, chunk: bytes) -> None:
+        self.file.write(chunk)
+    
+    def commit(self, key: str) -> None:
+        self.file.close()
+        path = self.store._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(self.tmp_path, path)
+    
+    def abort(self) -> None:
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs stored as files under a local (or shared-volume) directory."""
+    
+    def __init__(self, root: str):
+        self.root = root
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.pdf")
+    
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+    
+    def begin_upload(self) -> BlobUpload:
+        return _LocalBlobUpload(self)
+    
+    def delete(self, key: str) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+    
+    @contextmanager
+    def local_path(self, key: str) -> Generator[str, None, None]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Blob {key} is not available")
+        yield path
+    
+    def list_keys(self) -> Iterator[Tuple[str, float]]:
+        if not os.path.isdir(self.root):
+            return
+        for prefix in os.scandir(self.root):
+            if not prefix.is_dir() or len(prefix.name) != 2:
+                continue  # skips the tmp/ staging directory
+            for entry in os.scandir(prefix.path):
+                if entry.name.endswith(".pdf"):
+                    try:
+                        yield entry.name[:-len(".pdf")], entry.stat().st_mtime
+                    except FileNotFoundError:
+                        continue  # deleted while listing
+    
+    def discard_stale_uploads(self, older_than: float) -> int:
+        staging_dir = os.path.join(self.root, "tmp")
+        if not os.path.isdir(staging_dir):
+            return 0
+        discarded = 0
+        for entry in os.scandir(staging_dir):
+            try:
+                if entry.name.endswith(".part") and entry.stat().st_mtime < older_than:
+                    os.remove(entry.path)
+                    discarded += 1
+            except FileNotFoundError:
+                continue
+        return discarded
+
+
+_BACKENDS = {
+    "local": lambda: LocalBlobStore(settings.blob_store_dir),
+}
+_blob_store = None
+
+
+def get_blob_store() -> BlobStore:
+    """Return the configured backend (BLOB_STORE_BACKEND)."""
+    global _blob_store
+    if _blob_store is None:
+        if settings.blob_store_backend not in _BACKENDS:
+            raise ValueError(f"Unknown BLOB_STORE_BACKEND: {settings.blob_store_backend!r}")
+        _blob_store = _BACKENDS[settings.blob_store_backend]()
+    return _blob_store
+
+
+# ---------------------------------------------------------------------------
+# Reference Counting
+# ---------------------------------------------------------------------------
+def store_blob(content: bytes) -> str:
+    """Store ``content`` (once per unique hash) and take a reference to it."""
+    key = content_key(content)
+    _acquire(key, len(content))
+    store = get_blob_store()
+    if not store.exists(key):
+        store.write(key, content)
+    return key
+
+
+def commit_upload(upload: BlobUpload, key: str, size_bytes: int) -> str:
+    """Take a reference to ``key`` and publish a streamed upload under it.
+    
+    The reference is taken first so a concurrent release of the same content
+    cannot delete the blob underneath us: a release either deleted the file
+    before we took it (we find no file and publish ours) or sees our
+    reference and keeps it (see `release_blob`).
+    """
+    _acquire(key, size_bytes)
+    try:
+        if get_blob_store().exists(key):
+            upload.abort()  # identical content is already stored
+        else:
+            upload.commit(key)
+    except Exception:
+        release_blob(key)
+        raise
+    return key
+
+
+def _acquire(key: str, size_bytes: int) -> None:
+    """Increment the blob's reference count, creating its row on first use."""
+    for _ in range(2):
+        try:
+            with get_db_session() as db:
+                updated = (
+                    db.query(DocumentBlob)
+                    .filter(DocumentBlob.key == key)
+                    .update({DocumentBlob.ref_count: DocumentBlob.ref_count + 1}, synchronize_session=False)
+                )
+                if not updated:
+                    db.add(DocumentBlob(key=key, size_bytes=size_bytes, ref_count=1))
+            return
+        except IntegrityError:
+            # Another upload of the same content inserted the row first
+            continue
+    raise RuntimeError(f"Could not take a reference to blob {key}")
+
+
+def release_blob(key: str) -> None:
+    """Drop one reference; the blob is deleted when nothing references it.
+    
+    The file is deleted inside the transaction that deletes its row, while
+    the row is locked (the whole database on SQLite): an upload of the same
+    content waits in `_acquire`, then finds no row and stores its own copy,
+    rather than taking a reference to a file about to disappear.
+    """
+    if not key:
+        return
+    with get_db_session() as db:
+        db.query(DocumentBlob).filter(DocumentBlob.key == key, DocumentBlob.ref_count > 0).update(
+            {DocumentBlob.ref_count: DocumentBlob.ref_count - 1}, synchronize_session=False
+        )
+        unreferenced = (
+            db.query(DocumentBlob.key)
+            .filter(DocumentBlob.key == key, DocumentBlob.ref_count <= 0)
+            .with_for_update()
+            .first()
+        )
+        if unreferenced is None:
+            return
+        get_blob_store().delete(key)
+        db.query(DocumentBlob).filter(DocumentBlob.key == key).delete(synchronize_session=False)
+    logger.info(f"Deleted unreferenced blob {key}")
@@ -0,0 +1,117 @@
+"""
+Cooperative cancellation for analysis work running in a thread.
+
+A crew cannot be interrupted from outside its thread, so the code that wants
+it stopped sets a `CancelToken`, and the thread checks the token at safe
+points — every LLM call boundary (`llm_client.llm_call_slot`) — and raises
+`OperationCancelled` there. The call that is already in flight finishes;
+nothing after it is started.
+
+The token is found through a context variable, so the crew, its agents and
+tools need no extra arguments: run the work inside `cancellable(token)`.
+
+A token may also carry a deadline (a time budget): past it, the next
+checkpoint raises `DeadlineExceeded`, and `remaining_seconds()` lets an LLM
+request in flight be given no more time than is left.
+
+When the canceller is in another process (DELETE /jobs/{job_id} cancelling a
+worker's job) a `PollingCancelToken` asks a callback instead — at most once
+per interval, at those same checkpoints.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional
+
+
+class OperationCancelled(BaseException):
+    """Raised at the next checkpoint once the work's token is cancelled.
+
+    A BaseException, like asyncio.CancelledError: CrewAI retries a task on any
+    Exception, and the pipeline's own `except Exception` handlers would turn
+    a cancellation into a failure or a fallback answer.
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class DeadlineExceeded(OperationCancelled):
+    """Raised at the next checkpoint once the work's deadline has passed."""
+
+
+class CancelToken:
+    """Set from any thread; checked by the thread doing the work."""
+
+    def __init__(self, deadline: Optional[float] = None):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+        self.deadline = deadline  # time.monotonic() value; None = no time budget
+
+    def cancel(self, reason: str) -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise OperationCancelled(self.reason)
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise DeadlineExceeded("time budget exceeded")
+
+
+class PollingCancelToken(CancelToken):
+    """A token that also cancels itself when ``poll()`` returns a reason.
+
+    ``poll`` runs on the working thread, at a checkpoint, no more often than
+    every ``interval_seconds``.
+    """
+
+    def __init__(self, poll: Callable[[], Optional[str]], interval_seconds: float, deadline: Optional[float] = None):
+        super().__init__(deadline)
+        self._poll = poll
+        self._interval_seconds = interval_seconds
+        self._next_poll = 0.0
+
+    def raise_if_cancelled(self) -> None:
+        now = time.monotonic()
+        if not self.cancelled and now >= self._next_poll:
+            self._next_poll = now + self._interval_seconds
+            reason = self._poll()
+            if reason:
+                self.cancel(reason)
+        super().raise_if_cancelled()
+
+
+_current_token: ContextVar[Optional[CancelToken]] = ContextVar("cancel_token", default=None)
+
+
+@contextmanager
+def cancellable(token: Optional[CancelToken]) -> Iterator[None]:
+    """Make ``token`` the one `checkpoint()` checks in this context."""
+    reset = _current_token.set(token)
+    try:
+        yield
+    finally:
+        _current_token.reset(reset)
+
+
+def checkpoint() -> None:
+    """Raise OperationCancelled if the current work has been cancelled."""
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def remaining_seconds() -> Optional[float]:
+    """Time left before the current work's deadline (None if it has none)."""
+    token = _current_token.get()
+    if token is None or token.deadline is None:
+        return None
+    return token.deadline - time.monotonic()
@@ -12,13 +12,48 @@ class Settings(BaseSettings):
     openai_api_key: str = ""
     nvidia_api_key: str = ""
     llm_model: str = "nvidia/llama-3.1-nemotron-70b-instruct"
+    # OpenAI-compatible endpoint for agent and synthesis calls (point at a
+    # local fake for offline benchmarks, see benchmarks/fake_llm.py)
+    llm_base_url: str = "https://integrate.api.nvidia.com/v1"
     
-    # API Security
-    api_key: str = ""  # Set API_KEY in .env to enable auth
+    # Token prices for cost estimates in /results and /usage (USD per million
+    # tokens; 0 = report token counts only)
+    llm_prompt_price_per_million: float = 0.0
+    llm_completion_price_per_million: float = 0.0
+    
+    # API Security: with AUTH_ENABLED every request needs an X-API-Key — a
+    # user's key (see auth.py), which scopes it to that user's jobs, or API_KEY,
+    # which sees every job. Without it requests with a user's key are still
+    # scoped to that user, and anonymous ones see every job (local dev).
+    api_key: str = ""
+    auth_enabled: bool = False
+    auth_cache_seconds: int = 60  # how long a key's user (or its absence) is reused
+    auth_activity_flush_seconds: int = 60  # users.last_active_at is written in batches this often
+    
+    # Rate limiting: sliding one-minute windows per tenant, shared by all API
+    # instances through Redis when UPSTASH_REDIS_URL is set. A request with a
+    # user's X-API-Key counts against that user (whose users.rate_limit_*
+    # columns override these defaults), any other against its client address.
+    rate_limit_enabled: bool = True
+    rate_limit_per_minute: int = 60  # every endpoint without its own quota
+    rate_limit_analyze_per_minute: int = 5  # POST /analyze
+    rate_limit_analyze_async_per_minute: int = 10  # POST /analyze/async
     
     # File Upload
     max_file_size_mb: int = 10
     
+    # Synchronous /analyze: crews run in a dedicated pool of this many threads,
+    # this many more requests may wait for one, and further ones get a 503.
+    # A running crew is cancelled (at its next LLM call) when the client
+    # disconnects; disconnects are checked this often.
+    sync_analysis_workers: int = 4
+    sync_analysis_max_queued: int = 8
+    sync_analysis_disconnect_poll_seconds: float = 1.0
+    
+    # Blob store for uploaded PDFs (content-addressed, shared by API and workers)
+    blob_store_backend: str = "local"
+    blob_store_dir: str = "data/blobs"
+    
     # Error Tracking
     sentry_dsn: str = ""
     
@@ -28,6 +63,88 @@ class Settings(BaseSettings):
     # Neon PostgreSQL
     database_url: str = ""
     
+    # Connection pool per engine (each API and worker process has one sync and
+    # one async engine). Serverless Postgres caps connections, so keep
+    # (pool_size + max_overflow) x processes under the plan's limit — or point
+    # DATABASE_URL at the provider's pooled (PgBouncer) endpoint.
+    db_pool_size: int = 5
+    db_max_overflow: int = 5
+    db_pool_timeout_seconds: int = 10  # wait for a free connection before erroring
+    db_pool_recycle_seconds: int = 300  # below the provider's idle-connection timeout
+    
+    # SQLite fallback: how long a writer waits on a lock before "database is locked"
+    sqlite_busy_timeout_ms: int = 5000
+    
+    # How long GET /jobs may reuse a total job count before recounting
+    job_count_cache_seconds: int = 30
+    
+    # Codec for stored reports and checkpoints: zlib, zstd (needs `zstandard`) or none
+    result_compression: str = "zlib"
+    
+    # Read-through cache for finished jobs/results: in-process LRU size
+    # (0 disables) and TTL of the optional shared Redis tier (0 disables)
+    result_cache_max_entries: int = 512
+    result_cache_redis_ttl_seconds: int = 0
+    
+    # Retention: the maintenance task (Celery beat) archives finished jobs older
+    # than retention_days to gzip'd files in archive_dir and deletes them
+    # (0 = keep forever), then sweeps unreferenced upload files
+    retention_days: int = 90
+    retention_batch_size: int = 500
+    archive_dir: str = "data/archive"
+    orphan_file_grace_hours: int = 24
+    maintenance_interval_hours: int = 24
+    
+    # Analysis task retries (resumes from the last checkpointed stage)
+    analysis_max_retries: int = 2
+    analysis_retry_delay_seconds: int = 30
+    
+    # A running stage notices DELETE /jobs/{job_id} at its next LLM call,
+    # checking the job's status at most this often
+    job_cancel_poll_seconds: float = 2.0
+    
+    # Time budgets for the LLM stages (verify, analyze, invest_risk, synthesize)
+    # and for the whole job, counted from its first stage (0 = none). A stage
+    # that runs over is cut off at its next LLM call — no request outlives the
+    # budget either — and the job completes with the outputs it already has,
+    # marked partial (`timed_out_stages`).
+    stage_time_budget_seconds: int = 600
+    stage_time_budgets: str = ""  # per-stage overrides, e.g. "verify=120,invest_risk=900"
+    job_time_budget_seconds: int = 1800
+    
+    # Admission control for POST /analyze/async: refuse new jobs (503 with
+    # Retry-After) while more than admission_max_queue_depth messages wait in
+    # the admission_queues broker queues, or more than admission_max_in_flight
+    # jobs are pending/processing (0 disables either check). Queue depth and job
+    # counts are re-read at most every admission_cache_seconds.
+    admission_max_queue_depth: int = 100
+    admission_max_in_flight: int = 200
+    admission_queues: str = "analysis,extraction,llm,persist"  # every pipeline stage queue
+    admission_cache_seconds: float = 2.0
+    admission_retry_after_seconds: int = 30  # when there is no duration history yet
+    
+    # Celery queues this worker consumes (comma-separated, blank = all)
+    worker_queues: str = ""
+    
+    # Celery worker pool — jobs are I/O-bound (waiting on NIM), so a threads or
+    # gevent pool runs many jobs per container; prefork/solo are also accepted
+    worker_pool: str = "threads"
+    worker_concurrency: int = 8
+    llm_max_concurrency: int = 4  # concurrent LLM calls per worker process (0 = unlimited)
+    worker_max_memory_mb: int = 0  # memory budget per worker container (0 = unlimited)
+    worker_job_memory_mb: int = 150  # estimated peak memory per in-flight job
+    worker_beat: bool = False  # also run the beat scheduler (enable on exactly one worker)
+    
+    # Prometheus: each worker serves /metrics on this port (0 = off); the API
+    # serves GET /metrics. For prefork pools also set PROMETHEUS_MULTIPROC_DIR.
+    worker_metrics_port: int = 9101
+    
+    # Profiling: honour the X-Profile request header (jobs are sampled only when
+    # asked), sampling every profile_interval_ms. Off by default: any client can
+    # send the header, and sampling adds CPU to its job
+    profiling_enabled: bool = False
+    profile_interval_ms: int = 5
+    
     # Debug mode
     debug: bool = False
     
@@ -2,13 +2,20 @@
 Database models and connection management using SQLAlchemy.
 Supports Neon PostgreSQL for persistent storage.
 """
+import hashlib
+import time
+import zlib
 from datetime import datetime
-from typing import Generator
-from contextlib import contextmanager
+from typing import AsyncGenerator, Dict, Generator, Optional
+from contextlib import asynccontextmanager, contextmanager
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import create_engine, event, exc, func, inspect, select, text, update, Column, Integer, LargeBinary, String, Text, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
+from sqlalchemy.orm import sessionmaker, Session, relationship, deferred
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.types import TypeDecorator
 
 from config import settings
 
@@ -16,18 +23,207 @@ from config import settings
 # Database Connection
 # ---------------------------------------------------------------------------
 DATABASE_URL = settings.database_url
+SQLITE_PATH = "./financial_analyzer.db"
+# Without DATABASE_URL (local development) the database is the SQLite file at SQLITE_PATH
+_database_url = make_url(DATABASE_URL or f"sqlite:///{SQLITE_PATH}")
+IS_SQLITE = _database_url.get_backend_name() == "sqlite"
 
-if DATABASE_URL:
-    engine = create_engine(DATABASE_URL, pool_pre_ping=True, pool_recycle=300)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+class PoolStats:
+    """Checkout counters for one engine's connection pool."""
+    
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+        self.peak_checked_out = 0
+
+
+class _TimedCheckoutPool:
+    """Pool mixin timing how long each checkout waits for a connection.
+    
+    The wait includes opening a new connection when the pool has room, and
+    queueing for one when it is exhausted. ``stats`` is a class attribute so
+    it survives the pool being recreated (e.g. on `engine.dispose()`).
+    """
+    stats: PoolStats
+    
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.stats.wait_seconds_total += waited
+            self.stats.wait_seconds_max = max(self.stats.wait_seconds_max, waited)
+        self.stats.checkouts += 1
+        self.stats.peak_checked_out = max(self.stats.peak_checked_out, self.checkedout())
+        return connection
+
+
+def _pool_options(pool_class) -> dict:
+    """Pool class and sizing shared by the sync and async engines."""
+    return {
+        "poolclass": type(f"Timed{pool_class.__name__}", (_TimedCheckoutPool, pool_class), {"stats": PoolStats()}),
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+    }
+
+
+def _postgres_options() -> dict:
+    # Serverless Postgres drops idle connections: test on checkout, recycle early
+    return {"pool_pre_ping": True, "pool_recycle": settings.db_pool_recycle_seconds}
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Let the API and the worker share the SQLite file without lock errors."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")  # readers no longer block the writer (or vice versa)
+    cursor.execute("PRAGMA synchronous=NORMAL")  # durable with WAL; fsync on checkpoint only
+    cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+    cursor.execute("PRAGMA cache_size=-16000")  # 16 MB page cache per connection
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+if IS_SQLITE:
+    engine = create_engine(
+        _database_url,
+        connect_args={"check_same_thread": False},
+        **_pool_options(QueuePool),
+    )
+    event.listen(engine, "connect", _set_sqlite_pragmas)
 else:
-    # Fallback to SQLite for local development
-    engine = create_engine("sqlite:///./financial_analyzer.db", connect_args={"check_same_thread": False})
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine = create_engine(DATABASE_URL, **_postgres_options(), **_pool_options(QueuePool))
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+# ---------------------------------------------------------------------------
+# Async Database Connection (FastAPI)
+# ---------------------------------------------------------------------------
+# The API's endpoints are `async def`, so they use a non-blocking engine; the
+# Celery worker keeps the sync engine above.
+def _async_database_config():
+    """Translate DATABASE_URL into an async driver URL plus connect_args."""
+    url = _database_url
+    if IS_SQLITE:
+        return url.set(drivername="sqlite+aiosqlite"), {}
+    if url.get_backend_name() != "postgresql":
+        raise ValueError(f"No async driver configured for {url.drivername}")
+    
+    # asyncpg takes `ssl` instead of libpq's `sslmode`, and rejects libpq-only
+    # options like Neon's `channel_binding`
+    query = dict(url.query)
+    connect_args = {}
+    sslmode = query.pop("sslmode", None)
+    if sslmode and sslmode != "disable":
+        connect_args["ssl"] = "require" if sslmode in ("require", "prefer", "allow") else sslmode
+    query.pop("channel_binding", None)
+    return url.set(drivername="postgresql+asyncpg", query=query), connect_args
+
+
+_async_url, _async_connect_args = _async_database_config()
+async_engine = create_async_engine(
+    _async_url,
+    connect_args=_async_connect_args,
+    **({} if IS_SQLITE else _postgres_options()),
+    **_pool_options(AsyncAdaptedQueuePool),
+)
+if IS_SQLITE:
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+def pool_metrics() -> dict:
+    """Current occupancy and cumulative checkout stats of both engines' pools."""
+    metrics = {}
+    for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        stats = getattr(pool, "stats", None)
+        if stats is None:
+            continue
+        metrics[name] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+            "max_overflow": settings.db_max_overflow,
+            "peak_checked_out": stats.peak_checked_out,
+            "checkouts": stats.checkouts,
+            "wait_ms_avg": round(stats.wait_seconds_total / stats.checkouts * 1000, 3) if stats.checkouts else None,
+            "wait_ms_max": round(stats.wait_seconds_max * 1000, 3),
+            "timeouts": stats.timeouts,
+        }
+    return metrics
 
 Base = declarative_base()
 
 
+# ---------------------------------------------------------------------------
+# Compressed Text Columns
+# ---------------------------------------------------------------------------
+# Reports and checkpoints are large markdown documents. They are stored as
+# compressed bytes behind a two-byte header naming the codec. The header starts
+# with NUL, which can never begin a PostgreSQL text value, so rows written
+# before compression was introduced (plain text, or its UTF-8 bytes once the
+# column is converted) are still read as-is.
+COMPRESSION_HEADERS = {"zlib": b"\x00z", "zstd": b"\x00s", "none": b"\x00n"}
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("RESULT_COMPRESSION=zstd requires the `zstandard` package") from e
+    return zstandard
+
+
+def compress_text(value: str, codec: Optional[str] = None) -> bytes:
+    codec = codec or settings.result_compression
+    data = value.encode("utf-8")
+    if codec == "zlib":
+        data = zlib.compress(data, 6)
+    elif codec == "zstd":
+        data = _zstd().ZstdCompressor(level=9).compress(data)
+    elif codec != "none":
+        raise ValueError(f"Unknown RESULT_COMPRESSION: {codec!r} (expected zlib, zstd or none)")
+    return COMPRESSION_HEADERS[codec] + data
+
+
+def is_compressed(raw) -> bool:
+    return isinstance(raw, (bytes, bytearray, memoryview)) and bytes(raw[:2]) in COMPRESSION_HEADERS.values()
+
+
+def decompress_text(raw) -> Optional[str]:
+    if raw is None or isinstance(raw, str):
+        return raw  # NULL, or a legacy row SQLite still holds as text
+    raw = bytes(raw)
+    header, data = raw[:2], raw[2:]
+    if header == COMPRESSION_HEADERS["zlib"]:
+        data = zlib.decompress(data)
+    elif header == COMPRESSION_HEADERS["zstd"]:
+        data = _zstd().ZstdDecompressor().decompress(data)
+    elif header != COMPRESSION_HEADERS["none"]:
+        data = raw  # legacy uncompressed UTF-8
+    return data.decode("utf-8")
+
+
+class CompressedText(TypeDecorator):
+    """Text stored compressed (RESULT_COMPRESSION codec), decompressed on read."""
+    impl = LargeBinary
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        return None if value is None else compress_text(value)
+    
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
+
+
 # ---------------------------------------------------------------------------
 # Job Status Enum
 # ---------------------------------------------------------------------------
@@ -37,22 +233,36 @@ class JobStatus:
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    # Statuses a job can still be cancelled (or completed) from
+    ACTIVE = (PENDING, PROCESSING)
 
 
 # ---------------------------------------------------------------------------
 # Database Models
 # ---------------------------------------------------------------------------
+def hash_api_key(api_key: str) -> str:
+    """SHA-256 hex digest under which a user's API key is stored and looked up."""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
 class User(Base):
     """User model for API authentication."""
     __tablename__ = "users"
     
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, nullable=True)
-    api_key = Column(String(64), unique=True, nullable=True)
+    api_key = Column(String(64), unique=True, nullable=True)  # legacy plaintext key, hashed on startup
+    api_key_hash = Column(String(64), unique=True, nullable=True, index=True)  # hash_api_key(key)
     name = Column(String(255), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     last_active_at = Column(DateTime, nullable=True)
     is_active = Column(Integer, default=1)
+    # Per-minute request quotas (NULL = the RATE_LIMIT_* default; see rate_limit.py)
+    rate_limit_per_minute = Column(Integer, nullable=True)
+    rate_limit_analyze_per_minute = Column(Integer, nullable=True)
+    rate_limit_analyze_async_per_minute = Column(Integer, nullable=True)
     
     jobs = relationship("AnalysisJob", back_populates="user")
 
@@ -60,6 +270,14 @@ class User(Base):
 class AnalysisJob(Base):
     """Analysis job tracking model."""
     __tablename__ = "analysis_jobs"
+    __table_args__ = (
+        # Keyset pagination for GET /jobs orders by (created_at, id); the
+        # status-prefixed index serves the same ordering under a status filter
+        Index("ix_analysis_jobs_created_at_id", "created_at", "id"),
+        Index("ix_analysis_jobs_status_created_at_id", "status", "created_at", "id"),
+        # The same ordering over one user's jobs (API keys scope the listing)
+        Index("ix_analysis_jobs_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     job_id = Column(String(36), unique=True, nullable=False, index=True)
@@ -67,13 +285,20 @@ class AnalysisJob(Base):
     query = Column(Text, nullable=False)
     original_filename = Column(String(255), nullable=False)
     file_path = Column(String(500), nullable=True)
-    status = Column(String(20), default=JobStatus.PENDING, index=True)
-    result = Column(Text, nullable=True)
+    blob_key = Column(String(64), nullable=True, index=True)  # uploaded PDF in the blob store
+    status = Column(String(20), default=JobStatus.PENDING)
+    # Legacy copy of the final report — new jobs keep it only in analysis_results.analysis
+    result = deferred(Column(CompressedText, nullable=True), group="content")
     error_message = Column(Text, nullable=True)
     duration_seconds = Column(Integer, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
+    stage_metrics = Column(Text, nullable=True)  # JSON: {stage: {queue_seconds, run_seconds, llm_calls, ...}}
+    timed_out_stages = Column(String(100), nullable=True)  # comma-separated; set when the result is partial
+    # LLM token totals so far (sums of the job's analysis_token_usage rows)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
     
     user = relationship("User", back_populates="jobs")
 
@@ -87,19 +312,78 @@ class AnalysisResult(Base):
     query = Column(Text, nullable=False)
     original_filename = Column(String(255), nullable=False)
     
-    # Individual agent outputs
-    verification_report = Column(Text, nullable=True)      # Agent 1: Verifier
-    financial_analysis = Column(Text, nullable=True)       # Agent 2: Financial Analyst
-    investment_analysis = Column(Text, nullable=True)       # Agent 3: Investment Advisor
-    risk_assessment = Column(Text, nullable=True)           # Agent 4: Risk Assessor
+    # Individual agent outputs (large — deferred until explicitly loaded)
+    verification_report = deferred(Column(CompressedText, nullable=True), group="content")   # Agent 1: Verifier
+    financial_analysis = deferred(Column(CompressedText, nullable=True), group="content")    # Agent 2: Financial Analyst
+    investment_analysis = deferred(Column(CompressedText, nullable=True), group="content")   # Agent 3: Investment Advisor
+    risk_assessment = deferred(Column(CompressedText, nullable=True), group="content")       # Agent 4: Risk Assessor
     
-    # Final combined result
-    analysis = Column(Text, nullable=False)
-    summary = Column(Text, nullable=True)
+    # Final combined result (the only stored copy of the report)
+    analysis = deferred(Column(CompressedText, nullable=False), group="content")
+    summary = Column(Text, nullable=True)  # short excerpt shown in job listings
     duration_seconds = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class AnalysisCheckpoint(Base):
+    """Per-stage agent output, persisted as soon as each agent finishes."""
+    __tablename__ = "analysis_checkpoints"
+    __table_args__ = (
+        UniqueConstraint("job_id", "stage", name="uq_analysis_checkpoints_job_stage"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String(36), nullable=False, index=True)
+    stage = Column(String(32), nullable=False)  # verification | analysis | investment | risk
+    output = Column(CompressedText, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class AnalysisTokenUsage(Base):
+    """LLM token usage of one agent (or the synthesis call) within a job."""
+    __tablename__ = "analysis_token_usage"
+    __table_args__ = (
+        UniqueConstraint("job_id", "stage", name="uq_analysis_token_usage_job_stage"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String(36), nullable=False, index=True)
+    stage = Column(String(32), nullable=False)  # verification | analysis | investment | risk | synthesis
+    model = Column(String(255), nullable=True)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    requests = Column(Integer, nullable=False, default=0)  # successful LLM requests
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class AnalysisProfile(Base):
+    """Sampled stack profile of one pipeline stage of a profiled job (see profiling.py)."""
+    __tablename__ = "analysis_profiles"
+    __table_args__ = (
+        UniqueConstraint("job_id", "stage", name="uq_analysis_profiles_job_stage"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String(36), nullable=False, index=True)
+    stage = Column(String(32), nullable=False)  # pipeline stage, or `crew` for sync /analyze
+    samples = Column(Integer, nullable=False, default=0)
+    interval_ms = Column(Integer, nullable=False)
+    wall_ms = Column(Integer, nullable=True)  # time the stage ran while sampled
+    collapsed = deferred(Column(CompressedText, nullable=False))  # `frame;frame milliseconds` lines
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DocumentBlob(Base):
+    """Reference count for a content-addressed upload in the blob store."""
+    __tablename__ = "document_blobs"
+    
+    key = Column(String(64), primary_key=True)  # SHA-256 of the content
+    size_bytes = Column(Integer, nullable=True)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 # ---------------------------------------------------------------------------
 # Database Session Management
 # ---------------------------------------------------------------------------
@@ -117,6 +401,204 @@ def get_db_session() -> Generator[Session, None, None]:
         db.close()
 
 
+@asynccontextmanager
+async def get_async_db_session() -> AsyncGenerator[AsyncSession, None]:
+    """Get an async database session with automatic cleanup."""
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+
 def init_db() -> None:
     """Initialize database tables."""
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _add_missing_indexes()
+    _convert_compressed_columns()
+    _hash_plaintext_api_keys()
+
+
+def _add_missing_columns() -> None:
+    """Add nullable columns introduced after a table was first created.
+    
+    `create_all` never alters existing tables, so deployments created by an
+    older release would otherwise miss newly added columns.
+    """
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+
+def _hash_plaintext_api_keys() -> None:
+    """Replace API keys stored in plaintext (older releases) by their hash."""
+    with get_db_session() as db:
+        for user in db.query(User).filter(User.api_key.is_not(None)):
+            user.api_key_hash = user.api_key_hash or hash_api_key(user.api_key)
+            user.api_key = None
+
+
+def _add_missing_indexes() -> None:
+    """Create indexes declared after a table was first created."""
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+
+
+def _convert_compressed_columns() -> None:
+    """Switch CompressedText columns created as TEXT to a binary type.
+    
+    PostgreSQL only: the existing text is kept as UTF-8 bytes (readable as
+    legacy values); `python migrate_results.py` compresses it afterwards.
+    SQLite stores either kind of value in any column, so needs no change.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"]: column["type"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if isinstance(column.type, CompressedText) and isinstance(existing.get(column.name), (Text, String)):
+                with engine.begin() as conn:
+                    conn.execute(text(
+                        f"ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE bytea "
+                        f"USING convert_to({column.name}, 'UTF8')"
+                    ))
+
+
+# ---------------------------------------------------------------------------
+# Job Status Transitions
+# ---------------------------------------------------------------------------
+# Status changes are single `UPDATE ... WHERE job_id = ?` statements on the
+# unique job_id index — no SELECT first and no ORM objects loaded.
+def job_update(job_id: str, **values):
+    """UPDATE statement setting ``values`` on one job (add `.returning()` as needed)."""
+    return (
+        update(AnalysisJob)
+        .where(AnalysisJob.job_id == job_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def update_job(job_id: str, **values) -> bool:
+    """Set ``values`` on one job in its own transaction; False if it does not exist."""
+    with engine.begin() as conn:
+        return conn.execute(job_update(job_id, **values)).rowcount > 0
+
+
+def update_active_job(job_id: str, **values) -> bool:
+    """Like `update_job`, but only while the job is pending or processing.
+
+    False if the job has already finished — in particular if it was cancelled,
+    whose status and blob release belong to DELETE /jobs/{job_id}.
+    """
+    with engine.begin() as conn:
+        statement = job_update(job_id, **values).where(AnalysisJob.status.in_(JobStatus.ACTIVE))
+        return conn.execute(statement).rowcount > 0
+
+
+def job_status(job_id: str) -> Optional[str]:
+    """A job's current status (None if it does not exist)."""
+    with engine.connect() as conn:
+        return conn.execute(select(AnalysisJob.status).where(AnalysisJob.job_id == job_id)).scalar()
+
+
+# ---------------------------------------------------------------------------
+# Stage Checkpoints and Token Usage
+# ---------------------------------------------------------------------------
+TOKEN_USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens", "requests")
+
+
+def save_checkpoint(job_id: str, stage: str, output: str) -> None:
+    """Persist (or overwrite) the output of a completed stage."""
+    with get_db_session() as db:
+        checkpoint = (
+            db.query(AnalysisCheckpoint)
+            .filter(AnalysisCheckpoint.job_id == job_id, AnalysisCheckpoint.stage == stage)
+            .first()
+        )
+        if checkpoint:
+            checkpoint.output = output
+        else:
+            checkpoint = AnalysisCheckpoint(job_id=job_id, stage=stage, output=output)
+        db.add(checkpoint)
+
+
+def load_checkpoints(job_id: str) -> Dict[str, str]:
+    """Return {stage: output} for every stage already completed for a job."""
+    with get_db_session() as db:
+        rows = db.query(AnalysisCheckpoint).filter(AnalysisCheckpoint.job_id == job_id).all()
+        return {row.stage: row.output for row in rows}
+
+
+def record_token_usage(job_id: str, stage: str, usage: Dict[str, int], model: Optional[str] = None) -> None:
+    """Store (or overwrite) a stage's token usage and refresh the job's totals.
+    
+    Overwriting keeps a retried stage from being counted twice; the totals are
+    recomputed from the usage rows in the same transaction.
+    """
+    usage_table = AnalysisTokenUsage.__table__
+    values = {key: int(usage.get(key) or 0) for key in TOKEN_USAGE_FIELDS}
+    with engine.begin() as conn:
+        updated = conn.execute(
+            usage_table.update()
+            .where(usage_table.c.job_id == job_id, usage_table.c.stage == stage)
+            .values(model=model, **values)
+        ).rowcount
+        if not updated:
+            conn.execute(usage_table.insert().values(job_id=job_id, stage=stage, model=model, **values))
+        conn.execute(job_update(
+            job_id,
+            prompt_tokens=_job_token_sum(usage_table.c.prompt_tokens, job_id),
+            completion_tokens=_job_token_sum(usage_table.c.completion_tokens, job_id),
+        ))
+
+
+def _job_token_sum(column, job_id: str):
+    table = AnalysisTokenUsage.__table__
+    return select(func.coalesce(func.sum(column), 0)).where(table.c.job_id == job_id).scalar_subquery()
+
+
+def save_profile(job_id: str, stage: str, profile) -> None:
+    """Store (or overwrite, on a retry) a stage's StackProfile."""
+    values = dict(
+        samples=profile.samples,
+        interval_ms=round(profile.interval * 1000),
+        wall_ms=round(profile.wall_seconds * 1000),
+        collapsed=profile.collapsed(),
+    )
+    with get_db_session() as db:
+        stored = (
+            db.query(AnalysisProfile)
+            .filter(AnalysisProfile.job_id == job_id, AnalysisProfile.stage == stage)
+            .first()
+        )
+        if stored:
+            for key, value in values.items():
+                setattr(stored, key, value)
+        else:
+            db.add(AnalysisProfile(job_id=job_id, stage=stage, **values))
+
+
+def delete_checkpoints(db: Session, job_id: str) -> None:
+    """Drop a job's checkpoints once its result is stored (they duplicate it)."""
+    db.query(AnalysisCheckpoint).filter(AnalysisCheckpoint.job_id == job_id).delete(synchronize_session=False)
@@ -27,6 +27,11 @@ export async function getJob(jobId) {
   return res.json();
 }
 
+// Server-Sent Events stream of a job's progress (used by useJobPoller)
+export function jobEventsUrl(jobId) {
+  return `${BASE_URL}/jobs/${jobId}/events`;
+}
+
 // Get job result (agent outputs)
 export async function getResult(jobId) {
   const res = await fetch(`${BASE_URL}/results/${jobId}`);
@@ -35,8 +40,13 @@ export async function getResult(jobId) {
 }
 
 // List all jobs
-export async function listJobs(limit = 30) {
-  const res = await fetch(`${BASE_URL}/jobs?limit=${limit}`);
+// Columns the job cards render — keeps the full report out of list polling
+const JOB_CARD_FIELDS = 'job_id,status,query,original_filename,created_at,duration_seconds';
+
+export async function listJobs(limit = 30, fields = JOB_CARD_FIELDS) {
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (fields) params.set('fields', fields);
+  const res = await fetch(`${BASE_URL}/jobs?${params}`);
   if (!res.ok) throw new Error('Failed to fetch jobs list');
   return res.json(); // { jobs: [...], total }
 }
@@ -42,6 +42,10 @@ const JobDetail = ({ jobId }) => {
     navigator.clipboard.writeText(job.job_id);
   };
 
+  // Number of stages with checkpointed output (partial results arrive while processing)
+  const completedStageCount = () =>
+    STAGES.filter((stage) => result?.agent_outputs?.[stage.key]).length;
+
   const getStageStatus = (stageKey, index) => {
     if (result?.agent_outputs?.[stageKey]) return 'completed';
     if (job.status === 'completed') return 'completed'; // Ensure they don't stay 'waiting' if job is done
@@ -49,8 +53,7 @@ const JobDetail = ({ jobId }) => {
     
     // Logic for processing stage
     if (job.status === 'processing') {
-      const outputKeys = result?.agent_outputs ? Object.keys(result.agent_outputs) : [];
-      if (outputKeys.length === index) return 'active';
+      if (completedStageCount() === index) return 'active';
     }
     
     return 'waiting';
@@ -59,8 +62,7 @@ const JobDetail = ({ jobId }) => {
   const getProgressWidth = () => {
     if (job.status === 'completed') return '100%';
     if (job.status === 'failed') return '0%';
-    const outputKeys = result?.agent_outputs ? Object.keys(result.agent_outputs) : [];
-    return `${(outputKeys.length / 4) * 100}%`;
+    return `${(completedStageCount() / STAGES.length) * 100}%`;
   };
 
   return (
@@ -8,6 +8,7 @@ const StatusBadge = ({ status }) => {
       case 'processing': return 'ANALYZING';
       case 'completed': return 'COMPLETE';
       case 'failed': return 'FAILED';
+      case 'cancelled': return 'CANCELLED';
       default: return s?.toUpperCase() || 'UNKNOWN';
     }
   };
@@ -1,19 +1,28 @@
 import { useState, useEffect, useRef } from 'react';
-import { getJob, getResult } from '../api';
+import { getJob, getResult, jobEventsUrl } from '../api';
 
+const TERMINAL_STATUSES = ['completed', 'failed', 'cancelled'];
+
+// Follows one job. Progress is pushed over Server-Sent Events; if the stream
+// is unavailable (e.g. the API runs without Redis) it falls back to polling.
 export function useJobPoller(jobId) {
   const [job, setJob] = useState(null);
   const [result, setResult] = useState(null);
   const [isPolling, setIsPolling] = useState(false);
   const [error, setError] = useState(null);
   const pollIntervalRef = useRef(null);
+  const eventSourceRef = useRef(null);
 
   const stopPolling = () => {
+    if (eventSourceRef.current) {
+      eventSourceRef.current.close();
+      eventSourceRef.current = null;
+    }
     if (pollIntervalRef.current) {
       clearInterval(pollIntervalRef.current);
       pollIntervalRef.current = null;
-      setIsPolling(false);
     }
+    setIsPolling(false);
   };
 
   const fetchStatus = async () => {
@@ -23,11 +32,15 @@ export function useJobPoller(jobId) {
       const jobData = await getJob(jobId);
       setJob(jobData);
 
-      if (jobData.status === 'completed') {
+      if (jobData.status === 'processing') {
+        // Stage outputs are checkpointed as each agent finishes — show them live
+        const resultData = await getResult(jobId);
+        if (resultData) setResult(resultData);
+      } else if (jobData.status === 'completed') {
         stopPolling();
         const resultData = await getResult(jobId);
         setResult(resultData);
-      } else if (jobData.status === 'failed') {
+      } else if (jobData.status === 'failed' || jobData.status === 'cancelled') {
         stopPolling();
         // Even on failure, try to get partial results if any
         const resultData = await getResult(jobId);
@@ -40,6 +53,59 @@ export function useJobPoller(jobId) {
     }
   };
 
+  const startPolling = () => {
+    fetchStatus();
+    pollIntervalRef.current = setInterval(fetchStatus, 2500);
+  };
+
+  const subscribe = () => {
+    const source = new EventSource(jobEventsUrl(jobId));
+    eventSourceRef.current = source;
+
+    const parse = (handler) => (message) => handler(JSON.parse(message.data));
+
+    // Full state: sent on connect, after a server-side resync and at the end
+    source.addEventListener('snapshot', parse(({ job: jobData, result: resultData }) => {
+      setJob(jobData);
+      setResult(resultData);
+      if (TERMINAL_STATUSES.includes(jobData.status)) stopPolling();
+    }));
+
+    source.addEventListener('status', parse(({ status, error: errorMessage, duration_seconds }) => {
+      setJob((prev) => prev && {
+        ...prev,
+        status,
+        error: errorMessage ?? prev.error,
+        duration_seconds: duration_seconds ?? prev.duration_seconds,
+      });
+    }));
+
+    source.addEventListener('stage', parse(({ stage, state, queue_seconds, run_seconds }) => {
+      if (state !== 'finished') return;
+      setJob((prev) => prev && {
+        ...prev,
+        stage_metrics: { ...(prev.stage_metrics || {}), [stage]: { queue_seconds, run_seconds } },
+      });
+    }));
+
+    source.addEventListener('output', parse(({ key, output }) => {
+      if (!key) return;
+      setResult((prev) => ({
+        ...(prev || { job_id: jobId, partial: true }),
+        agent_outputs: { ...(prev?.agent_outputs || {}), [key]: output },
+      }));
+    }));
+
+    source.onerror = () => {
+      // The browser retries dropped connections by itself; a closed source
+      // means the endpoint refused the stream, so poll instead
+      if (source.readyState === EventSource.CLOSED && eventSourceRef.current === source) {
+        eventSourceRef.current = null;
+        startPolling();
+      }
+    };
+  };
+
   useEffect(() => {
     if (!jobId) {
       setJob(null);
@@ -54,11 +120,11 @@ export function useJobPoller(jobId) {
     setError(null);
     setIsPolling(true);
 
-    // Initial fetch
-    fetchStatus();
-
-    // Start polling
-    pollIntervalRef.current = setInterval(fetchStatus, 2500);
+    if (typeof EventSource !== 'undefined') {
+      subscribe();
+    } else {
+      startPolling();
+    }
 
     return () => stopPolling();
   }, [jobId]);
@@ -0,0 +1,170 @@
+"""
+Job progress events over Redis pub/sub.
+
+The worker publishes stage transitions, agent outputs and status changes on a
+per-job channel; the API relays them to browsers over Server-Sent Events
+(`GET /jobs/{job_id}/events`). Publishing is best-effort — the database stays
+the source of truth, and a client that misses events gets a fresh snapshot
+when it (or the API's Redis subscription) reconnects.
+
+Event payloads are JSON objects with an `event` field:
+    {"event": "status", "job_id", "status", ...}             job status changed
+    {"event": "stage", "job_id", "stage", "state", ...}      pipeline stage started/finished
+    {"event": "output", "job_id", "stage", "output"}         an agent's output was checkpointed
+"""
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set
+
+import redis
+import redis.asyncio as aioredis
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "job-events:"
+
+# Queued for every subscriber after the API's Redis subscription reconnects:
+# events may have been missed, so the stream should reload its snapshot
+RESYNC = {"event": "resync"}
+
+
+def job_channel(job_id: str) -> str:
+    return f"{CHANNEL_PREFIX}{job_id}"
+
+
+def events_enabled() -> bool:
+    return bool(settings.upstash_redis_url)
+
+
+# ---------------------------------------------------------------------------
+# Publishing (worker)
+# ---------------------------------------------------------------------------
+_publisher: Optional[redis.Redis] = None
+
+
+def _get_publisher() -> redis.Redis:
+    global _publisher
+    if _publisher is None:
+        _publisher = redis.Redis.from_url(settings.celery_broker_url, socket_timeout=5)
+    return _publisher
+
+
+def publish_job_event(job_id: str, event: str, **data) -> None:
+    """Publish one event for a job. Never raises — progress events are advisory."""
+    if not events_enabled():
+        return
+    message = json.dumps({"event": event, "job_id": job_id, **data}, default=str)
+    try:
+        _get_publisher().publish(job_channel(job_id), message)
+    except redis.RedisError as e:
+        logger.warning(f"Could not publish {event} event for job {job_id}: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Subscribing (API)
+# ---------------------------------------------------------------------------
+class JobEventHub:
+    """
+    Fans a single Redis pattern subscription out to every SSE client in this
+    process, so open dashboards cost one Redis connection per API process
+    rather than one per browser tab.
+    """
+
+    QUEUE_SIZE = 256
+    RECONNECT_DELAY_SECONDS = 1.0
+
+    def __init__(self):
+        self._queues: Dict[str, Set[asyncio.Queue]] = {}
+        self._listeners: List[Callable[[Optional[str], dict], None]] = []
+        self._reader: Optional[asyncio.Task] = None
+
+    def add_listener(self, listener: Callable[[Optional[str], dict], None]) -> None:
+        """Call ``listener(job_id, event)`` for every job's events in this process.
+        
+        After a reconnect it is called once with ``(None, RESYNC)``.
+        """
+        self._listeners.append(listener)
+
+    def start(self) -> None:
+        """Start the shared subscription (otherwise started by the first subscriber)."""
+        if events_enabled() and (self._reader is None or self._reader.done()):
+            self._reader = asyncio.create_task(self._read_forever())
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: str) -> AsyncIterator[asyncio.Queue]:
+        """Yield a queue receiving this job's events (as dicts) until exit."""
+        self.start()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        self._queues.setdefault(job_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._queues.get(job_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._queues[job_id]
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+
+    def _dispatch(self, job_id: str, event: dict) -> None:
+        for queue in self._queues.get(job_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A stalled client falls back to a snapshot instead of blocking others
+                queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+    def _notify_listeners(self, job_id: Optional[str], event: dict) -> None:
+        for listener in self._listeners:
+            try:
+                listener(job_id, event)
+            except Exception:
+                logger.exception("Job event listener failed")
+
+    async def _read_forever(self) -> None:
+        connected_before = False
+        while True:
+            client = aioredis.from_url(settings.celery_broker_url, decode_responses=True)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                if connected_before:
+                    self._notify_listeners(None, RESYNC)
+                    for job_id in list(self._queues):
+                        self._dispatch(job_id, RESYNC)
+                connected_before = True
+
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    job_id = message["channel"][len(CHANNEL_PREFIX):]
+                    if not self._listeners and job_id not in self._queues:
+                        continue
+                    event = json.loads(message["data"])
+                    self._notify_listeners(job_id, event)
+                    if job_id in self._queues:
+                        self._dispatch(job_id, event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Job event subscription lost, reconnecting: {e}")
+                await asyncio.sleep(self.RECONNECT_DELAY_SECONDS)
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+
+
+job_event_hub = JobEventHub()
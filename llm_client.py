@@ -0,0 +1,114 @@
+"""
+Shared guard around outbound LLM calls.
+Caps how many NIM requests a single worker process has in flight, so an
+I/O-optimized pool (threads/gevent) with many concurrent jobs cannot exceed
+the provider's rate limits or the container's memory. Also times each call
+(and the wait for a slot) for the Prometheus metrics in metrics.py, and
+normalizes the token usage reported by CrewAI and LiteLLM.
+
+Within a time budget (see cancellation.py) a request gets no longer than the
+time that is left (`call_timeout`), and one that fails once the budget is
+spent ends the work with DeadlineExceeded instead of being retried.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Generator, Optional, Tuple
+
+from cancellation import checkpoint, remaining_seconds
+from config import settings
+from metrics import LLM_SLOT_WAIT_SECONDS, timed_llm_call
+
+# Per-process cap on concurrent LLM calls (None = unlimited)
+_llm_semaphore = None
+
+
+def set_llm_concurrency(limit: int) -> None:
+    """(Re)size the per-process LLM call cap; 0 disables it."""
+    global _llm_semaphore
+    _llm_semaphore = threading.BoundedSemaphore(limit) if limit > 0 else None
+
+
+set_llm_concurrency(settings.llm_max_concurrency)
+
+# Shortest timeout given to a request, however little of the budget is left
+MIN_CALL_TIMEOUT_SECONDS = 1.0
+
+
+def call_timeout() -> Optional[float]:
+    """Timeout for an LLM request starting now (None = the client's default)."""
+    remaining = remaining_seconds()
+    if remaining is None:
+        return None
+    return max(MIN_CALL_TIMEOUT_SECONDS, remaining)
+
+
+@contextmanager
+def _budget_checked() -> Generator[None, None, None]:
+    """A request that failed (timed out) after the budget was spent ends the work."""
+    try:
+        yield
+    except Exception:
+        checkpoint()
+        raise
+
+
+@contextmanager
+def llm_call_slot(caller: str = "agent") -> Generator[None, None, None]:
+    """Hold one of the process-wide LLM call slots for the duration of a call.
+    
+    ``caller`` labels the call's latency metric ("agent" or "synthesis").
+    Cancelled work (see cancellation.py) stops here, before the request is sent;
+    work whose time budget runs out stops here too, or when its request fails.
+    """
+    checkpoint()
+    if _llm_semaphore is None:
+        with timed_llm_call(caller), _budget_checked():
+            yield
+        return
+    waiting = time.perf_counter()
+    with _llm_semaphore:
+        LLM_SLOT_WAIT_SECONDS.observe(time.perf_counter() - waiting)
+        checkpoint()  # it may have been cancelled while waiting for the slot
+        with timed_llm_call(caller), _budget_checked():
+            yield
+
+
+def token_cost(prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """Estimated USD cost at the configured token prices (None if unpriced)."""
+    if not (settings.llm_prompt_price_per_million or settings.llm_completion_price_per_million):
+        return None
+    return round(
+        (prompt_tokens * settings.llm_prompt_price_per_million
+         + completion_tokens * settings.llm_completion_price_per_million) / 1_000_000,
+        6,
+    )
+
+
+def token_usage(usage) -> Optional[Dict[str, int]]:
+    """Token counts from a CrewAI ``UsageMetrics`` or a LiteLLM response ``usage``.
+    
+    Returns {prompt_tokens, completion_tokens, total_tokens, requests}, or None
+    when nothing was reported.
+    """
+    if usage is None:
+        return None
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    # CrewAI counts successful requests; a LiteLLM response is a single one
+    requests = getattr(usage, "successful_requests", None)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": getattr(usage, "total_tokens", 0) or prompt_tokens + completion_tokens,
+        "requests": 1 if requests is None else requests,
+    }
+
+
+def agent_token_usage(agent) -> Tuple[Optional[Dict[str, int]], Optional[str]]:
+    """Token counts an agent has used so far (as ``token_usage``) and its model.
+    
+    CrewAI keeps the per-agent counter in the private ``Agent._token_process``,
+    so this is the only place that reads it.
+    """
+    return token_usage(agent._token_process.get_summary()), getattr(agent.llm, "model", None)
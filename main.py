@@ -8,7 +8,7 @@
 ## ENHANCEMENTS: 8
 ##   #1 — Added async queue processing with Celery + Redis
 ##   #2 — Added database storage with SQLAlchemy + PostgreSQL
-##   #3 — Added rate limiting with slowapi
+##   #3 — Added per-tenant rate limiting (Redis sliding window)
 ##   #4 — Added structured logging with structlog
 ##   #5 — Added API key authentication
 ##   #6 — Added file size validation
@@ -23,23 +23,28 @@ FastAPI application with async queue processing using Celery + Upstash Redis,
 and persistent storage using Neon PostgreSQL.
 """
 import os
+import json
+import gzip
+import base64
 import uuid
+import hashlib
+import hmac
 import time
 import asyncio
 import logging
 from datetime import datetime
+from collections import OrderedDict
 from contextlib import asynccontextmanager
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple
 
 import structlog
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request, Security
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Query, Request, Security
 from fastapi.security import APIKeyHeader
 from pydantic import BaseModel, Field
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
-from starlette.responses import JSONResponse
+from sqlalchemy import func, select, tuple_, type_coerce, update
+from sqlalchemy.orm import undefer, undefer_group
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse, Response, StreamingResponse
 
 ## ─────────────────────────────────────────────────────
 ## BUG_FIX #1: MISSING_AGENT - Only one agent was used
@@ -63,12 +68,39 @@ from task import (
 from config import settings
 from database import (
     init_db, 
-    get_db_session, 
+    async_engine,
+    get_async_db_session,
     AnalysisJob, 
     AnalysisResult,
-    JobStatus
+    AnalysisCheckpoint,
+    AnalysisProfile,
+    AnalysisTokenUsage,
+    CompressedText,
+    JobStatus,
+    TOKEN_USAGE_FIELDS,
+    pool_metrics,
+    save_profile,
+)
+from blob_store import commit_upload, get_blob_store, release_blob
+from job_events import RESYNC, events_enabled, job_event_hub, publish_job_event
+from result_cache import invalidate_shared_cache, result_cache
+from auth import ApiUser, activity, lookup_user
+from rate_limit import RateLimitMiddleware, rate_limiter
+from sync_executor import ClientDisconnected, ExecutorFull, SyncAnalysisExecutor
+from admission import admission_rejection, queue_position, queue_snapshot, record_admitted, submit_estimates
+from metrics import ADMISSION_REJECTIONS, CONTENT_TYPE_LATEST, JOB_SECONDS, PrometheusMiddleware, latest_metrics, observe_tokens, register_snapshot
+from llm_client import token_cost
+from cancellation import DeadlineExceeded
+from profiling import PROFILE_HEADER, StackProfile, call_sampled, merge_collapsed, profile_requested, speedscope_document
+from worker import (
+    STAGE_NAMES,
+    SYNTHESIS_MODEL,
+    analyze_document_task,
+    celery_app,
+    combine_outputs,
+    generate_final_answer,
+    summarize_report,
 )
-from worker import analyze_document_task
 
 # ---------------------------------------------------------------------------
 # Load environment variables
@@ -97,24 +129,49 @@ structlog.configure(
 )
 log = structlog.get_logger()
 
-# ---------------------------------------------------------------------------
-# Rate limiting
-# ---------------------------------------------------------------------------
-limiter = Limiter(key_func=get_remote_address, default_limits=["60/minute"])
-
 # ---------------------------------------------------------------------------
 # API Key auth
 # ---------------------------------------------------------------------------
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
-async def verify_api_key(key: str = Security(api_key_header)):
-    """Validate X-API-Key header when API_KEY is configured in .env.
-    If API_KEY is not set, auth is disabled (useful for local dev)."""
-    # AUTH DISABLED FOR LOCAL DEV
-    return
+async def verify_api_key(key: Optional[str] = Security(api_key_header)) -> Optional[ApiUser]:
+    """Resolve X-API-Key to the user it belongs to (see auth.py).
     
-    if settings.api_key and key != settings.api_key:
+    Returns None for API_KEY and, unless AUTH_ENABLED, for anonymous requests:
+    both see every job. With AUTH_ENABLED anything else is a 403.
+    """
+    if key and settings.api_key and hmac.compare_digest(key, settings.api_key):
+        return None
+    user = await lookup_user(key) if key else None
+    if user is not None:
+        activity.touch(user.id)
+        return user
+    if settings.auth_enabled:
         raise HTTPException(status_code=403, detail="Invalid or missing API key")
+    return None
+
+
+# Owner of each job looked up so far; a job's owner never changes, so polling
+# a job costs no query for the ownership check
+JOB_OWNER_CACHE_MAX_ENTRIES = 10_000
+_job_owners: "OrderedDict[str, int]" = OrderedDict()
+
+
+async def ensure_job_access(user: Optional[ApiUser], job_id: str) -> None:
+    """404 unless ``user`` may see the job (unscoped callers see every job)."""
+    if user is None:
+        return
+    owner = _job_owners.get(job_id)
+    if owner is None:
+        async with get_async_db_session() as db:
+            owner = await db.scalar(select(AnalysisJob.user_id).where(AnalysisJob.job_id == job_id))
+        if owner is not None:
+            _job_owners[job_id] = owner
+            while len(_job_owners) > JOB_OWNER_CACHE_MAX_ENTRIES:
+                _job_owners.popitem(last=False)
+    if owner != user.id:
+        # Same answer as a missing job, so other users' job ids are not revealed
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
 
 # ---------------------------------------------------------------------------
 # Lifespan context manager for startup/shutdown
@@ -125,7 +182,16 @@ async def lifespan(app: FastAPI):
     log.info("initializing_database")
     init_db()
     log.info("database_initialized")
+    # Final-status events from the worker invalidate cached jobs/results
+    job_event_hub.add_listener(invalidate_cached_job)
+    job_event_hub.start()
+    activity.start()
     yield
+    await activity.close()
+    await job_event_hub.close()
+    await result_cache.close()
+    await rate_limiter.close()
+    await async_engine.dispose()
 
 # ---------------------------------------------------------------------------
 # FastAPI app
@@ -139,79 +205,149 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allow all origins for development
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-app.state.limiter = limiter
-app.add_middleware(SlowAPIMiddleware)
-
-@app.exception_handler(RateLimitExceeded)
-async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
-    return JSONResponse(status_code=429, content={"detail": "Rate limit exceeded. Max 5 requests/minute."})
+# Per-tenant quotas (see rate_limit.py); inside CORS so browsers can read 429s
+app.add_middleware(RateLimitMiddleware, skip_paths={"/health", "/metrics"})
 
 
 # ---------------------------------------------------------------------------
-# Crew runner (synchronous)
+# Streaming uploads
 # ---------------------------------------------------------------------------
-def generate_final_answer(verification: str, financial_analysis: str, investment_analysis: str, risk_assessment: str) -> str:
-    """Use AI to synthesize all 4 agent outputs into a comprehensive final answer."""
-    from litellm import completion
-    
-    prompt = f"""You are a financial analyst. Synthesize the following 4 analysis sections into ONE comprehensive final answer.
-
-## Document Verification:
-{verification or 'Not available'}
+UPLOAD_CHUNK_SIZE = 256 * 1024
+UPLOAD_PATHS = {"/analyze", "/analyze/async"}
+# Room for the multipart boundaries, headers and the query field around the PDF
+MULTIPART_OVERHEAD = 64 * 1024
+PDF_MAGIC = b"%PDF-"
 
-## Financial Analysis:
-{financial_analysis or 'Not available'}
 
-## Investment Analysis:
-{investment_analysis or 'Not available'}
+def _file_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large. Maximum allowed size is {settings.max_file_size_mb}MB.",
+    )
 
-## Risk Assessment:
-{risk_assessment or 'Not available'}
 
-Generate a well-structured final answer that:
-1. Opens with an executive summary
-2. Highlights key financial metrics and trends
-3. Provides investment recommendation (BUY/HOLD/SELL)
-4. Summarizes main risks
-5. Ends with actionable insights
+class UploadSizeLimitMiddleware:
+    """Reject oversized upload bodies before they are buffered.
+    
+    FastAPI parses the whole multipart body before an endpoint runs, so the
+    limit has to be enforced on the raw ASGI stream: a declared Content-Length
+    over the limit is refused outright, and a streamed body is cut off with a
+    413 as soon as it crosses the limit.
+    """
+    
+    def __init__(self, app, max_body_size: int, paths: set):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.paths = paths
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_body_size:
+            await self._reject(send)
+            return
+        
+        received = 0
+        too_large = False
+        response_started = False
+        
+        async def limited_receive():
+            nonlocal received, too_large
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    too_large = True
+                    raise _file_too_large()
+            return message
+        
+        async def guarded_send(message):
+            nonlocal response_started
+            # Whatever the app makes of the aborted body, the client gets a 413
+            if too_large:
+                return
+            response_started = True
+            await send(message)
+        
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not too_large:
+                raise
+        if too_large and not response_started:
+            await self._reject(send)
+    
+    async def _reject(self, send) -> None:
+        response = JSONResponse(status_code=413, content={"detail": _file_too_large().detail})
+        await response({"type": "http"}, None, send)
 
-Keep it concise but comprehensive. Use markdown formatting."""
 
-    try:
-        response = completion(
-            model="nvidia_nim/meta/llama-3.3-70b-instruct",
-            messages=[{"role": "user", "content": prompt}],
-            api_key=settings.nvidia_api_key,
-            base_url="https://integrate.api.nvidia.com/v1",
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        log.error(f"Error generating final answer: {e}")
-        # Fallback: combine all outputs
-        return f"""## Final Analysis Report
-
-### Document Verification
-{verification or 'Not available'}
+# Inside CORS too, so browsers can read 413s
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_body_size=MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+    paths=UPLOAD_PATHS,
+)
 
-### Financial Analysis
-{financial_analysis or 'Not available'}
+# Add CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Allow all origins for development
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
 
-### Investment Analysis
-{investment_analysis or 'Not available'}
+# Outermost, so request latency includes every other middleware
+app.add_middleware(PrometheusMiddleware, skip_paths={"/metrics"})
+register_snapshot("db_pool", pool_metrics, counters={"checkouts", "timeouts"}, label="engine")
+register_snapshot(
+    "result_cache",
+    lambda: {"results": result_cache.metrics()},
+    counters={"l1_hits", "l2_hits", "misses", "evictions", "invalidations"},
+    label="cache",
+)
 
-### Risk Assessment
-{risk_assessment or 'Not available'}"""
 
+async def receive_upload(file: UploadFile) -> str:
+    """Stream an upload into the blob store and return its blob key.
+    
+    Reads fixed-size chunks, so memory per request stays constant: each chunk is
+    size-checked (413 as soon as the limit is crossed), hashed and written
+    straight to blob-store staging. The PDF magic bytes are checked on the
+    first bytes received.
+    """
+    store = get_blob_store()
+    upload = await asyncio.to_thread(store.begin_upload)
+    hasher = hashlib.sha256()
+    head = b""
+    size = 0
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > MAX_FILE_SIZE:
+                raise _file_too_large()
+            if len(head) < len(PDF_MAGIC):
+                head += chunk[:len(PDF_MAGIC)]
+                if len(head) >= len(PDF_MAGIC) and not head.startswith(PDF_MAGIC):
+                    raise HTTPException(status_code=400, detail="File is not a valid PDF document.")
+            hasher.update(chunk)
+            await asyncio.to_thread(upload.write, chunk)
+        
+        if not head.startswith(PDF_MAGIC):
+            raise HTTPException(status_code=400, detail="File is not a valid PDF document.")
+        return await asyncio.to_thread(commit_upload, upload, hasher.hexdigest(), size)
+    except BaseException:
+        await asyncio.to_thread(upload.abort)
+        raise
 
+# ---------------------------------------------------------------------------
+# Crew runner (synchronous)
+# ---------------------------------------------------------------------------
 ## ─────────────────────────────────────────────────────
 ## BUG_FIX #3: LOGIC_FIX - file_path not passed to crew
 ## BUG_FIX #4: LOGIC_FIX - No extraction of individual agent outputs
@@ -224,17 +360,32 @@ Keep it concise but comprehensive. Use markdown formatting."""
 ##             (2) Extract individual outputs from result.tasks_output[i].raw
 ##             (3) Return dict with both final answer and individual agent outputs.
 ## ─────────────────────────────────────────────────────
+# Crew task -> the pipeline stage that runs it (the name reported in timed_out_stages)
+CREW_TASK_STAGES = {"verification": "verify", "analysis": "analyze", "investment": "invest_risk", "risk": "invest_risk"}
+
+
 def run_crew(query: str, file_path: str) -> dict:
-    """Run the full multi-agent financial analysis crew (synchronous — called via asyncio.to_thread).
-    Returns dict with final result and individual agent outputs."""
+    """Run the full multi-agent financial analysis crew (synchronous — runs in `sync_executor`).
+    Returns dict with final result, individual agent outputs and token usage per stage.
     
+    Within JOB_TIME_BUDGET_SECONDS (the executor's deadline) a crew that runs
+    over is cut off and the result is built from the agents that finished,
+    listed as partial in ``timed_out_stages`` like a pipeline job's.
+    """
+    from llm_client import agent_token_usage
+    
+    # A per-request copy, so each agent's token counter covers this request only
     financial_crew = Crew(
         agents=[verifier, financial_analyst, investment_advisor, risk_assessor],
         tasks=[verification, analyze_task, investment_analysis, risk_assessment],
         process=Process.sequential,
         verbose=False,
-    )
-    result = financial_crew.kickoff({"query": query, "file_path": file_path})
+    ).copy()
+    timed_out_stages = []
+    try:
+        result = financial_crew.kickoff({"query": query, "file_path": file_path})
+    except DeadlineExceeded:
+        result = None
     
     ## ─────────────────────────────────────────────────────
     ## BUG_FIX #4: Extract individual agent outputs from CrewAI result
@@ -247,12 +398,20 @@ def run_crew(query: str, file_path: str) -> dict:
     # Extract individual task outputs from result.tasks_output
     task_outputs = {}
     if hasattr(result, 'tasks_output') and result.tasks_output:
-        task_names = ['verification', 'analysis', 'investment', 'risk']
         for i, task_output in enumerate(result.tasks_output):
-            if i < len(task_names):
+            if i < len(STAGE_NAMES):
                 raw_output = getattr(task_output, 'raw', None)
                 if raw_output:
-                    task_outputs[task_names[i]] = str(raw_output)
+                    task_outputs[STAGE_NAMES[i]] = str(raw_output)
+    elif result is None:
+        # Cut off by the time budget: keep the outputs of the agents that finished
+        for name, crew_task in zip(STAGE_NAMES, financial_crew.tasks):
+            raw_output = getattr(crew_task.output, 'raw', None)
+            if raw_output:
+                task_outputs[name] = str(raw_output)
+        cut_off = next((name for name in STAGE_NAMES if name not in task_outputs), None)
+        if cut_off:
+            timed_out_stages.append(CREW_TASK_STAGES[cut_off])
     
     ## ─────────────────────────────────────────────────────
     ## ENHANCEMENT #7: AI-synthesized final answer
@@ -260,12 +419,19 @@ def run_crew(query: str, file_path: str) -> dict:
     ##             synthesize them into one comprehensive, well-structured report.
     ## ─────────────────────────────────────────────────────
     # Generate AI-synthesized final answer
-    final_answer = generate_final_answer(
-        verification=task_outputs.get('verification'),
-        financial_analysis=task_outputs.get('analysis'),
-        investment_analysis=task_outputs.get('investment'),
-        risk_assessment=task_outputs.get('risk'),
-    )
+    agent_outputs = [task_outputs.get(name) for name in STAGE_NAMES]
+    try:
+        final_answer, synthesis_usage = generate_final_answer(*agent_outputs)
+    except DeadlineExceeded:
+        final_answer, synthesis_usage = combine_outputs(*agent_outputs), None
+        timed_out_stages.append("synthesize")
+    
+    # {stage: (usage, model)}; the crew's own total is the sum of its agents'
+    stage_usage = {
+        name: agent_token_usage(crew_task.agent)
+        for name, crew_task in zip(CREW_TASK_STAGES, financial_crew.tasks)
+    }
+    stage_usage["synthesis"] = (synthesis_usage, SYNTHESIS_MODEL)
     
     return {
         "result": final_answer,
@@ -273,9 +439,21 @@ def run_crew(query: str, file_path: str) -> dict:
         "financial_analysis": task_outputs.get('analysis'),
         "investment_analysis": task_outputs.get('investment'),
         "risk_assessment": task_outputs.get('risk'),
+        "token_usage": {name: value for name, value in stage_usage.items() if value[0]},
+        "timed_out_stages": timed_out_stages,
     }
 
 
+# Crews for synchronous /analyze (see sync_executor.py)
+sync_executor = SyncAnalysisExecutor(
+    settings.sync_analysis_workers,
+    settings.sync_analysis_max_queued,
+    default_retry_after=settings.admission_retry_after_seconds,
+    time_budget_seconds=settings.job_time_budget_seconds,
+)
+register_snapshot("sync_analysis", sync_executor.metrics, counters={"rejected", "cancelled"}, label="executor")
+
+
 # ---------------------------------------------------------------------------
 # Pydantic models
 # ---------------------------------------------------------------------------
@@ -291,16 +469,459 @@ class JobStatusResponse(BaseModel):
     job_id: str
     status: str
     query: Optional[str] = None
+    original_filename: Optional[str] = None
     result: Optional[str] = None
+    summary: Optional[str] = None
     error: Optional[str] = None
     created_at: Optional[str] = None
     completed_at: Optional[str] = None
     duration_seconds: Optional[int] = None
+    stage_metrics: Optional[Dict[str, Dict[str, float]]] = None
+    timed_out_stages: Optional[List[str]] = None  # set when the result is partial
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    total_tokens: Optional[int] = None
 
 
 class JobListResponse(BaseModel):
     jobs: List[JobStatusResponse]
     total: int
+    next_cursor: Optional[str] = None
+
+
+def job_status_response(job: AnalysisJob) -> JobStatusResponse:
+    """Serialize an AnalysisJob row for the /jobs endpoints."""
+    return JobStatusResponse(
+        job_id=job.job_id,
+        status=job.status,
+        query=job.query,
+        original_filename=job.original_filename,
+        result=job.result,
+        error=job.error_message,
+        created_at=job.created_at.isoformat() if job.created_at else None,
+        completed_at=job.completed_at.isoformat() if job.completed_at else None,
+        duration_seconds=job.duration_seconds,
+        stage_metrics=json.loads(job.stage_metrics) if job.stage_metrics else None,
+        timed_out_stages=job.timed_out_stages.split(",") if job.timed_out_stages else None,
+        prompt_tokens=job.prompt_tokens,
+        completion_tokens=job.completion_tokens,
+        total_tokens=(job.prompt_tokens or 0) + (job.completion_tokens or 0) if job.prompt_tokens is not None else None,
+    )
+
+
+# Field name accepted by `GET /jobs?fields=` -> column it is read from.
+# `result` and `summary` live on the result row and come in through an outer
+# join (`result` falls back to the copy legacy jobs kept on their own row).
+JOB_FIELD_COLUMNS = {
+    "job_id": AnalysisJob.job_id,
+    "status": AnalysisJob.status,
+    "query": AnalysisJob.query,
+    "original_filename": AnalysisJob.original_filename,
+    "result": type_coerce(func.coalesce(AnalysisResult.analysis, AnalysisJob.result), CompressedText()),
+    "summary": AnalysisResult.summary,
+    "error": AnalysisJob.error_message,
+    "created_at": AnalysisJob.created_at,
+    "completed_at": AnalysisJob.completed_at,
+    "duration_seconds": AnalysisJob.duration_seconds,
+    "stage_metrics": AnalysisJob.stage_metrics,
+    "timed_out_stages": AnalysisJob.timed_out_stages,
+    "prompt_tokens": AnalysisJob.prompt_tokens,
+    "completion_tokens": AnalysisJob.completion_tokens,
+    "total_tokens": AnalysisJob.prompt_tokens + AnalysisJob.completion_tokens,
+}
+
+# The full report is only sent for a single job or when asked for explicitly
+DEFAULT_LIST_FIELDS = [name for name in JOB_FIELD_COLUMNS if name != "result"]
+RESULT_JOIN_FIELDS = {"result", "summary"}
+
+
+def parse_job_fields(fields: Optional[str]) -> List[str]:
+    """Validate a comma-separated `fields` parameter; job_id and status are always included."""
+    if not fields:
+        return DEFAULT_LIST_FIELDS
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = sorted(set(requested) - set(JOB_FIELD_COLUMNS))
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown job field(s): {', '.join(unknown)}. "
+                   f"Allowed: {', '.join(JOB_FIELD_COLUMNS)}",
+        )
+    always = ["job_id", "status"]
+    return always + [name for name in dict.fromkeys(requested) if name not in always]
+
+
+def job_row_response(values: dict) -> JobStatusResponse:
+    """Build a response from a projected row, setting only the selected fields."""
+    for name in ("created_at", "completed_at"):
+        if values.get(name) is not None:
+            values[name] = values[name].isoformat()
+    if values.get("stage_metrics"):
+        values["stage_metrics"] = json.loads(values["stage_metrics"])
+    if values.get("timed_out_stages"):
+        values["timed_out_stages"] = values["timed_out_stages"].split(",")
+    return JobStatusResponse(**values)
+
+
+def encode_job_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque `GET /jobs` cursor pointing just past the given row."""
+    raw = json.dumps([created_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_job_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# Job totals are cached per status filter: the dashboard polls /jobs every few
+# seconds and an exact COUNT(*) over a large table on each poll is wasted work.
+# Entries are per user, so the least recently used are dropped past the bound
+_CACHEABLE_COUNT_FILTERS = {
+    None, JobStatus.PENDING, JobStatus.PROCESSING, JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED,
+}
+JOB_COUNT_CACHE_MAX_ENTRIES = 10_000
+_job_count_cache: "OrderedDict[Tuple[Optional[int], Optional[str]], Tuple[float, int]]" = OrderedDict()
+
+
+async def cached_job_count(db, status: Optional[str], user_id: Optional[int] = None) -> int:
+    """Total jobs matching `status` (of one user, if given), at most JOB_COUNT_CACHE_SECONDS stale."""
+    cached = _job_count_cache.get((user_id, status))
+    if cached and time.monotonic() - cached[0] < settings.job_count_cache_seconds:
+        _job_count_cache.move_to_end((user_id, status))
+        return cached[1]
+    
+    query = select(func.count()).select_from(AnalysisJob)
+    if status:
+        query = query.where(AnalysisJob.status == status)
+    if user_id is not None:
+        query = query.where(AnalysisJob.user_id == user_id)
+    total = await db.scalar(query)
+    if status in _CACHEABLE_COUNT_FILTERS:
+        _job_count_cache[(user_id, status)] = (time.monotonic(), total)
+        _job_count_cache.move_to_end((user_id, status))
+        while len(_job_count_cache) > JOB_COUNT_CACHE_MAX_ENTRIES:
+            _job_count_cache.popitem(last=False)
+    return total
+
+
+# Checkpoint stage name -> key used in the /results `agent_outputs` payload
+CHECKPOINT_OUTPUT_KEYS = {
+    "verification": "verification",
+    "analysis": "financial_analysis",
+    "investment": "investment_analysis",
+    "risk": "risk_assessment",
+}
+
+
+async def load_job_response(db, job_id: str) -> Optional[JobStatusResponse]:
+    """The GET /jobs/{job_id} payload, or None if the job does not exist."""
+    job = (
+        await db.execute(
+            select(AnalysisJob)
+            .options(undefer(AnalysisJob.result))
+            .where(AnalysisJob.job_id == job_id)
+        )
+    ).scalars().first()
+    if not job:
+        return None
+    
+    response = job_status_response(job)
+    stored = (
+        await db.execute(
+            select(AnalysisResult.analysis, AnalysisResult.summary).where(AnalysisResult.job_id == job_id)
+        )
+    ).first()
+    if stored:
+        response.result, response.summary = stored.analysis, stored.summary
+    return response
+
+
+def usage_summary(rows: List[dict]) -> dict:
+    """Sum token usage rows and add the estimated cost at the configured prices."""
+    summary = {field: sum(row[field] or 0 for row in rows) for field in TOKEN_USAGE_FIELDS}
+    summary["estimated_cost_usd"] = token_cost(summary["prompt_tokens"], summary["completion_tokens"])
+    return summary
+
+
+async def load_token_usage(db, job_id: str) -> Optional[dict]:
+    """{total, stages: {stage: usage}} for one job, or None if nothing was recorded."""
+    rows = (
+        await db.execute(
+            select(AnalysisTokenUsage.stage, AnalysisTokenUsage.model, *(getattr(AnalysisTokenUsage, field) for field in TOKEN_USAGE_FIELDS))
+            .where(AnalysisTokenUsage.job_id == job_id)
+            .order_by(AnalysisTokenUsage.id)
+        )
+    ).mappings().all()
+    if not rows:
+        return None
+    return {
+        "total": usage_summary(rows),
+        "stages": {row["stage"]: {key: value for key, value in row.items() if key != "stage"} for row in rows},
+    }
+
+
+async def load_result_payload(db, job_id: str) -> Optional[dict]:
+    """The GET /results/{job_id} payload, or None if nothing is stored yet."""
+    result = (
+        await db.execute(
+            select(AnalysisResult)
+            .options(undefer_group("content"))
+            .where(AnalysisResult.job_id == job_id)
+        )
+    ).scalars().first()
+    
+    if not result:
+        job = (await db.execute(select(AnalysisJob).where(AnalysisJob.job_id == job_id))).scalars().first()
+        checkpoints = {}
+        if job:
+            rows = await db.execute(
+                select(AnalysisCheckpoint.stage, AnalysisCheckpoint.output).where(
+                    AnalysisCheckpoint.job_id == job_id,
+                    AnalysisCheckpoint.stage.in_(CHECKPOINT_OUTPUT_KEYS),
+                )
+            )
+            checkpoints = dict(rows.all())
+        if not checkpoints:
+            return None
+        
+        # Only completed stages are included, so the number of keys is the progress
+        return {
+            "job_id": job.job_id,
+            "query": job.query,
+            "original_filename": job.original_filename,
+            "status": job.status,
+            "partial": True,
+            "timed_out_stages": None,
+            "agent_outputs": {
+                CHECKPOINT_OUTPUT_KEYS[stage]: output for stage, output in checkpoints.items()
+            },
+            "final_analysis": None,
+            "summary": None,
+            "duration_seconds": None,
+            "token_usage": await load_token_usage(db, job_id),
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+        }
+    
+    # A job whose stages ran out of time completes with what it had
+    timed_out_stages = await db.scalar(select(AnalysisJob.timed_out_stages).where(AnalysisJob.job_id == job_id))
+    return {
+        "job_id": result.job_id,
+        "query": result.query,
+        "original_filename": result.original_filename,
+        "status": JobStatus.COMPLETED,
+        "partial": bool(timed_out_stages),
+        "timed_out_stages": timed_out_stages.split(",") if timed_out_stages else None,
+        "agent_outputs": {
+            "verification": result.verification_report,
+            "financial_analysis": result.financial_analysis,
+            "investment_analysis": result.investment_analysis,
+            "risk_assessment": result.risk_assessment,
+        },
+        "final_analysis": result.analysis,
+        "summary": result.summary,
+        "duration_seconds": result.duration_seconds,
+        "token_usage": await load_token_usage(db, job_id),
+        "created_at": result.created_at.isoformat() if result.created_at else None,
+    }
+
+
+# ---------------------------------------------------------------------------
+# HTTP Caching & Compression
+# ---------------------------------------------------------------------------
+# JSON bodies of the job/result endpoints get a strong ETag (hash of the body)
+# and are compressed per request; SSE and upload responses are not touched.
+try:
+    import brotli  # optional: br is offered only when installed, gzip otherwise
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = 1024
+# A completed result never changes, so browsers may reuse it without asking
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+# Anything else may change: cache it, but revalidate (cheap 304) before reuse
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+def _accepted_encodings(request: Request) -> Dict[str, float]:
+    """Parse Accept-Encoding into {coding: q}."""
+    encodings = {}
+    for item in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        encodings[coding.strip().lower()] = q
+    return encodings
+
+
+def _choose_encoding(request: Request) -> Optional[str]:
+    accepted = _accepted_encodings(request)
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def _etag_matches(request: Request, etag_base: str) -> bool:
+    """If-None-Match check; a tag matches whatever content-coding it was sent with."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip().removeprefix("W/").strip('"')
+        if tag == "*" or tag.split("-", 1)[0] == etag_base:
+            return True
+    return False
+
+
+def cached_json_response(request: Request, payload, cache_control: str = REVALIDATE_CACHE_CONTROL) -> Response:
+    """
+    Serialize `payload` as JSON with a strong ETag, honouring If-None-Match
+    (304, no body) and compressing bodies over COMPRESS_MIN_BYTES.
+    """
+    body = json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode()
+    etag_base = hashlib.sha256(body).hexdigest()[:32]
+    encoding = _choose_encoding(request) if len(body) >= COMPRESS_MIN_BYTES else None
+    
+    # Each content-coding is a different representation, so gets its own tag
+    headers = {
+        "ETag": f'"{etag_base}-{encoding}"' if encoding else f'"{etag_base}"',
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_matches(request, etag_base):
+        return Response(status_code=304, headers=headers)
+    
+    if encoding == "br":
+        body = brotli.compress(body, quality=5)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=6)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# ---------------------------------------------------------------------------
+# Read-through cache for finished jobs and results
+# ---------------------------------------------------------------------------
+TERMINAL_STATUSES = {JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED}
+
+
+async def fetch_job(job_id: str) -> Optional[dict]:
+    """GET /jobs/{job_id} payload, cached once the job has finished."""
+    async def load():
+        async with get_async_db_session() as db:
+            job = await load_job_response(db, job_id)
+        return job.model_dump() if job else None
+    
+    return await result_cache.get_or_load(
+        "job", job_id, load, lambda job: job["status"] in TERMINAL_STATUSES
+    )
+
+
+async def fetch_result(job_id: str) -> Optional[dict]:
+    """GET /results/{job_id} payload, cached once the job has finished."""
+    async def load():
+        async with get_async_db_session() as db:
+            return await load_result_payload(db, job_id)
+    
+    return await result_cache.get_or_load(
+        "result", job_id, load, lambda result: result["status"] in TERMINAL_STATUSES
+    )
+
+
+def invalidate_cached_job(job_id: Optional[str], event: dict) -> None:
+    """Job event listener: drop cached entries when a job's status changes."""
+    if event is RESYNC:
+        result_cache.clear_local()  # events may have been missed
+    elif event.get("event") == "status":
+        result_cache.invalidate_local(job_id)
+
+
+# ---------------------------------------------------------------------------
+# Live Job Events (Server-Sent Events)
+# ---------------------------------------------------------------------------
+SSE_KEEPALIVE_SECONDS = 15
+
+
+def sse_message(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def load_job_snapshot(job_id: str) -> Optional[dict]:
+    job = await fetch_job(job_id)
+    if job is None:
+        return None
+    return {"job": job, "result": await fetch_result(job_id)}
+
+
+async def job_event_stream(request: Request, job_id: str):
+    """
+    Relay a job's worker events to one client.
+    
+    The subscription is opened before the snapshot is read, so nothing
+    published in between is lost. The database is only read for snapshots —
+    on connect, on completion and after a Redis reconnect — never per event.
+    """
+    async with job_event_hub.subscribe(job_id) as events:
+        snapshot = await load_job_snapshot(job_id)
+        if snapshot is None:
+            return
+        yield "retry: 3000\n\n"
+        yield sse_message("snapshot", snapshot)
+        if snapshot["job"]["status"] in TERMINAL_STATUSES:
+            return
+        
+        while True:
+            try:
+                event = await asyncio.wait_for(events.get(), timeout=SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            
+            if event is RESYNC:
+                snapshot = await load_job_snapshot(job_id)
+                if snapshot is None:
+                    return
+                yield sse_message("snapshot", snapshot)
+                if snapshot["job"]["status"] in TERMINAL_STATUSES:
+                    return
+                continue
+            
+            if event["event"] == "output":
+                event["key"] = CHECKPOINT_OUTPUT_KEYS.get(event["stage"])
+            yield sse_message(event["event"], event)
+            
+            if event["event"] == "status" and event.get("status") in TERMINAL_STATUSES:
+                # One last read so the client gets the stored result without polling
+                snapshot = await load_job_snapshot(job_id)
+                if snapshot is not None:
+                    yield sse_message("snapshot", snapshot)
+                return
+
+
+# ---------------------------------------------------------------------------
+# Profiling
+# ---------------------------------------------------------------------------
+PROFILE_FORMATS = ("speedscope", "collapsed")
+
+
+def wants_profile(request: Request) -> bool:
+    """Whether the client asked for this job to be profiled (X-Profile: 1)."""
+    return settings.profiling_enabled and profile_requested(request.headers.get(PROFILE_HEADER))
 
 
 # ---------------------------------------------------------------------------
@@ -327,26 +948,34 @@ async def health():
         "status": "healthy",
         "database": db_status,
         "redis_queue": redis_status,
+        "db_pool": pool_metrics(),
+        "result_cache": result_cache.metrics(),
+        "sync_analysis": sync_executor.metrics()["sync"],
         "timestamp": datetime.utcnow().isoformat()
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for this API process (workers serve theirs on WORKER_METRICS_PORT)."""
+    return Response(content=latest_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 # ---------------------------------------------------------------------------
 # Synchronous Analysis (original endpoint - blocks until complete)
 # ---------------------------------------------------------------------------
 @app.post("/analyze")
-@limiter.limit("5/minute")
 async def analyze_document(
     request: Request,
     file: UploadFile = File(...),
     query: str = Form(default="Analyze this financial document for investment insights"),
-    _: None = Security(verify_api_key),
+    user: Optional[ApiUser] = Security(verify_api_key),
 ):
     """Analyze a financial document (PDF) synchronously - blocks until complete.
 
     - **file**: PDF financial document to analyze (required)
     - **query**: Specific question or analysis focus (optional, has default)
-    - **X-API-Key**: Required header when API_KEY is set in .env
+    - **X-API-Key**: A user's key or API_KEY (required when AUTH_ENABLED)
     """
     job_id = str(uuid.uuid4())
 
@@ -354,14 +983,6 @@ async def analyze_document(
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported.")
 
-    # File size limit
-    content = await file.read()
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Maximum allowed size is {settings.max_file_size_mb}MB.",
-        )
-
     # Validate query
     query = query.strip() if query and query.strip() else "Analyze this financial document for investment insights"
     try:
@@ -369,37 +990,65 @@ async def analyze_document(
     except Exception:
         raise HTTPException(status_code=422, detail="Query must be between 5 and 500 characters.")
 
+    # Refuse before the upload is stored when every analysis thread is taken
+    try:
+        slot = sync_executor.admit()
+    except ExecutorFull as e:
+        log.warning("sync_analysis_rejected", retry_after=e.retry_after)
+        raise HTTPException(
+            status_code=503,
+            detail=f"All synchronous analysis slots are busy; retry in about {e.retry_after} seconds "
+                   f"or submit to /analyze/async.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    # Stream the upload into the blob store (size-limited, deduplicated by
+    # content hash); the reference is released in `finally`
+    try:
+        blob_key = await receive_upload(file)
+    except BaseException:
+        slot.close()
+        raise
+
     log.info("sync_analysis_started", job_id=job_id, query=query, filename=file.filename)
     start = time.time()
+    profile = StackProfile(settings.profile_interval_ms) if wants_profile(request) else None
 
     try:
-        # Save temp file
-        os.makedirs("data", exist_ok=True)
-        file_path = f"data/financial_document_{job_id}.pdf"
-        with open(file_path, "wb") as f:
-            f.write(content)
-
-        # Run analysis
-        crew_result = await asyncio.to_thread(run_crew, query=query, file_path=file_path)
+        # Run analysis in the sync executor (sampled in its thread when profiling
+        # was requested); a client disconnect cancels it at the next LLM call
+        with get_blob_store().local_path(blob_key) as file_path:
+            crew_result = await slot.run(
+                request, call_sampled, profile, run_crew, query=query, file_path=file_path,
+                poll_seconds=settings.sync_analysis_disconnect_poll_seconds,
+            )
         response = crew_result["result"]
 
         duration = round(time.time() - start, 2)
+        JOB_SECONDS.labels("sync", JobStatus.COMPLETED).observe(duration)
         log.info("sync_analysis_complete", job_id=job_id, duration_seconds=duration)
 
         # Store result in database
-        with get_db_session() as db:
+        stage_usage = crew_result.get("token_usage", {})
+        async with get_async_db_session() as db:
             db_job = AnalysisJob(
                 job_id=job_id,
+                user_id=user.id if user else None,
                 query=query,
                 original_filename=file.filename,
-                file_path=file_path,
+                blob_key=blob_key,
                 status=JobStatus.COMPLETED,
-                result=response,
                 duration_seconds=int(duration),
+                timed_out_stages=",".join(crew_result["timed_out_stages"]) or None,
+                prompt_tokens=sum(usage["prompt_tokens"] for usage, _ in stage_usage.values()) if stage_usage else None,
+                completion_tokens=sum(usage["completion_tokens"] for usage, _ in stage_usage.values()) if stage_usage else None,
             )
             db.add(db_job)
+            for stage, (usage, model) in stage_usage.items():
+                db.add(AnalysisTokenUsage(job_id=job_id, stage=stage, model=model, **usage))
+                observe_tokens(stage, usage)
             
-            # Also store in results table with individual agent outputs
+            # The report and agent outputs are stored once, in the results table
             db_result = AnalysisResult(
                 job_id=job_id,
                 query=query,
@@ -409,32 +1058,49 @@ async def analyze_document(
                 investment_analysis=crew_result.get("investment_analysis"),
                 risk_assessment=crew_result.get("risk_assessment"),
                 analysis=response,
+                summary=summarize_report(response),
                 duration_seconds=int(duration),
             )
             db.add(db_result)
 
-        # Clean up temp file
-        if os.path.exists(file_path):
-            os.remove(file_path)
-
-        return {
+        body = {
             "status": "success",
             "job_id": job_id,
             "query": query,
             "analysis": response,
             "file_processed": file.filename,
             "duration_seconds": duration,
+            "timed_out_stages": crew_result["timed_out_stages"] or None,
         }
+        if profile:
+            body["profile_url"] = f"/jobs/{job_id}/profile"
+        return body
 
     except HTTPException:
         raise
+    except ClientDisconnected:
+        JOB_SECONDS.labels("sync", JobStatus.CANCELLED).observe(time.time() - start)
+        log.warning("sync_analysis_cancelled", job_id=job_id, reason="client disconnected")
+        async with get_async_db_session() as db:
+            db.add(AnalysisJob(
+                job_id=job_id,
+                user_id=user.id if user else None,
+                query=query,
+                original_filename=file.filename,
+                status=JobStatus.CANCELLED,
+                error_message="Cancelled: client disconnected",
+            ))
+        # Nobody is listening; 499 is the conventional "client closed request"
+        raise HTTPException(status_code=499, detail="Client disconnected; analysis cancelled")
     except Exception as e:
+        JOB_SECONDS.labels("sync", JobStatus.FAILED).observe(time.time() - start)
         log.error("sync_analysis_failed", job_id=job_id, error=str(e))
         
         # Update job status to failed
-        with get_db_session() as db:
+        async with get_async_db_session() as db:
             db_job = AnalysisJob(
                 job_id=job_id,
+                user_id=user.id if user else None,
                 query=query,
                 original_filename=file.filename,
                 status=JobStatus.FAILED,
@@ -446,24 +1112,28 @@ async def analyze_document(
             status_code=500,
             detail=f"Error processing financial document: {str(e)}",
         )
+    finally:
+        slot.close()
+        if profile:
+            await asyncio.to_thread(save_profile, job_id, "crew", profile)
+        await asyncio.to_thread(release_blob, blob_key)
 
 
 # ---------------------------------------------------------------------------
 # Asynchronous Analysis (Queue-based - returns immediately)
 # ---------------------------------------------------------------------------
 @app.post("/analyze/async")
-@limiter.limit("10/minute")
 async def analyze_document_async(
     request: Request,
     file: UploadFile = File(...),
     query: str = Form(default="Analyze this financial document for investment insights"),
-    _: None = Security(verify_api_key),
+    user: Optional[ApiUser] = Security(verify_api_key),
 ):
     """Submit a document for async analysis via the queue. Returns job_id immediately.
 
     - **file**: PDF financial document to analyze (required)
     - **query**: Specific question or analysis focus (optional, has default)
-    - **X-API-Key**: Required header when API_KEY is set in .env
+    - **X-API-Key**: A user's key or API_KEY (required when AUTH_ENABLED)
     
     Returns job_id - use GET /jobs/{job_id} to check status and get results.
     """
@@ -473,14 +1143,6 @@ async def analyze_document_async(
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported.")
 
-    # File size limit
-    content = await file.read()
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Maximum allowed size is {settings.max_file_size_mb}MB.",
-        )
-
     # Validate query
     query = query.strip() if query and query.strip() else "Analyze this financial document for investment insights"
     try:
@@ -488,36 +1150,73 @@ async def analyze_document_async(
     except Exception:
         raise HTTPException(status_code=422, detail="Query must be between 5 and 500 characters.")
 
-    # Save file for worker to process
-    os.makedirs("data", exist_ok=True)
-    file_path = f"data/financial_document_{job_id}.pdf"
-    with open(file_path, "wb") as f:
-        f.write(content)
-
-    # Create job record in database
-    with get_db_session() as db:
-        db_job = AnalysisJob(
-            job_id=job_id,
-            query=query,
-            original_filename=file.filename,
-            file_path=file_path,
-            status=JobStatus.PENDING,
+    # Refuse before the upload is stored when the pipeline is too far behind
+    async with get_async_db_session() as db:
+        snapshot = await queue_snapshot(db, celery_app)
+    rejection = admission_rejection(snapshot)
+    if rejection:
+        reason, retry_after = rejection
+        ADMISSION_REJECTIONS.labels(reason).inc()
+        log.warning(
+            "async_job_rejected", reason=reason, queue_depth=snapshot.queue_depth,
+            in_flight=snapshot.in_flight, retry_after=retry_after,
+        )
+        raise HTTPException(
+            status_code=503,
+            detail=(
+                f"Analysis queue is full ({snapshot.queue_depth} jobs waiting)" if reason == "queue_depth"
+                else f"Too many analyses in progress ({snapshot.in_flight})"
+            ) + f"; retry in about {retry_after} seconds.",
+            headers={"Retry-After": str(retry_after)},
         )
-        db.add(db_job)
 
-    # Submit to Celery queue
-    task = analyze_document_task.delay(job_id, query, file_path, file.filename)
+    # Stream the upload into the shared blob store; the worker releases the
+    # reference when the job finishes, so only release it here if we never
+    # hand it over
+    blob_key = await receive_upload(file)
+    try:
+        # Create job record in database
+        async with get_async_db_session() as db:
+            db_job = AnalysisJob(
+                job_id=job_id,
+                user_id=user.id if user else None,
+                query=query,
+                original_filename=file.filename,
+                blob_key=blob_key,
+                status=JobStatus.PENDING,
+            )
+            db.add(db_job)
+            position = await queue_position(db, db_job)
+        record_admitted()
+
+        # Submit to Celery queue (the flag is only sent when set, so workers
+        # from before profiling existed still accept ordinary jobs). The task
+        # id is the job id, so DELETE /jobs/{job_id} can revoke it
+        profile = wants_profile(request)
+        task = analyze_document_task.apply_async(
+            (job_id, query, blob_key, file.filename),
+            {"profile": True} if profile else {},
+            task_id=job_id,
+        )
+    except Exception:
+        await asyncio.to_thread(release_blob, blob_key)
+        raise
 
-    log.info("async_job_submitted", job_id=job_id, task_id=task.id, query=query)
+    log.info("async_job_submitted", job_id=job_id, task_id=task.id, query=query, profile=profile, queue_position=position)
 
-    return {
+    body = {
         "status": "queued",
         "job_id": job_id,
         "task_id": task.id,
         "query": query,
         "file_processed": file.filename,
+        "queue_position": position,
+        **submit_estimates(snapshot, position, datetime.utcnow()),
         "message": "Job submitted to queue. Use GET /jobs/{job_id} to check status.",
     }
+    if profile:
+        body["profile_url"] = f"/jobs/{job_id}/profile"
+    return body
 
 
 # ---------------------------------------------------------------------------
@@ -526,103 +1225,290 @@ async def analyze_document_async(
 @app.get("/jobs/{job_id}", response_model=JobStatusResponse)
 async def get_job_status(
     job_id: str,
-    _: None = Security(verify_api_key),
+    request: Request,
+    user: Optional[ApiUser] = Security(verify_api_key),
 ):
     """Get the status and result of an analysis job.
 
+    Responses carry an ETag; send it back in If-None-Match to get a 304 when
+    nothing has changed.
+
     - **job_id**: The job ID returned from /analyze/async
-    - **X-API-Key**: Required header when API_KEY is set in .env
+    - **X-API-Key**: A user's key or API_KEY (required when AUTH_ENABLED)
     """
-    with get_db_session() as db:
-        job = db.query(AnalysisJob).filter(AnalysisJob.job_id == job_id).first()
-        
-        if not job:
+    await ensure_job_access(user, job_id)
+    job = await fetch_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return cached_json_response(request, job)
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(
+    job_id: str,
+    user: Optional[ApiUser] = Security(verify_api_key),
+):
+    """Cancel a pending or processing job.
+
+    A queued job never starts. A running one stops at its next LLM call (within
+    JOB_CANCEL_POLL_SECONDS of it); the call already in flight is not
+    interrupted. Either way the job is `cancelled` and its document released
+    as soon as this returns. Finished jobs get a 409.
+
+    - **job_id**: The job ID returned from /analyze/async
+    - **X-API-Key**: A user's key or API_KEY (required when AUTH_ENABLED)
+    """
+    await ensure_job_access(user, job_id)
+    # Only one caller — this one or the worker finishing — wins the status change
+    async with get_async_db_session() as db:
+        cancelled = (await db.execute(
+            update(AnalysisJob)
+            .where(AnalysisJob.job_id == job_id, AnalysisJob.status.in_(JobStatus.ACTIVE))
+            .values(status=JobStatus.CANCELLED, error_message="Cancelled by request", completed_at=datetime.utcnow())
+            .returning(AnalysisJob.blob_key)
+        )).first()
+        if cancelled is None:
+            status = await db.scalar(select(AnalysisJob.status).where(AnalysisJob.job_id == job_id))
+    if cancelled is None:
+        if status is None:
             raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
-        
-        return JobStatusResponse(
-            job_id=job.job_id,
-            status=job.status,
-            query=job.query,
-            result=job.result,
-            error=job.error_message,
-            created_at=job.created_at.isoformat() if job.created_at else None,
-            completed_at=job.completed_at.isoformat() if job.completed_at else None,
-            duration_seconds=job.duration_seconds,
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is already {status}")
+    
+    # Drop the entry task if no worker has taken it yet; stages already queued
+    # or running see the status and stop on their own
+    try:
+        await asyncio.to_thread(celery_app.control.revoke, job_id)
+    except Exception as e:
+        log.warning("job_revoke_failed", job_id=job_id, error=str(e))
+    await asyncio.to_thread(invalidate_shared_cache, job_id)
+    await asyncio.to_thread(publish_job_event, job_id, "status", status=JobStatus.CANCELLED, error="Cancelled by request")
+    await asyncio.to_thread(release_blob, cancelled.blob_key)
+    log.info("job_cancelled", job_id=job_id)
+    return {"status": JobStatus.CANCELLED, "job_id": job_id}
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    request: Request,
+    user: Optional[ApiUser] = Security(verify_api_key),
+):
+    """Stream live progress for a job as Server-Sent Events.
+
+    The first event is a `snapshot` (`{job, result}`, shaped like the /jobs/{id}
+    and /results/{id} responses); after that the stream relays `stage`,
+    `output` and `status` events published by the worker, and ends with a
+    final `snapshot` once the job completes, fails or is cancelled.
+
+    - **job_id**: The job ID returned from /analyze/async
+    - **X-API-Key**: A user's key or API_KEY (required when AUTH_ENABLED)
+    """
+    if not events_enabled():
+        raise HTTPException(status_code=503, detail="Live job events require UPSTASH_REDIS_URL; poll /jobs/{job_id} instead")
+    
+    await ensure_job_access(user, job_id)
+    async with get_async_db_session() as db:
+        exists = await db.scalar(select(AnalysisJob.id).where(AnalysisJob.job_id == job_id))
+    if not exists:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    
+    return StreamingResponse(
+        job_event_stream(request, job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/usage")
+async def token_usage_summary(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user: Optional[ApiUser] = Security(verify_api_key),
+):
+    """Aggregate LLM token usage (and estimated cost) per agent stage.
+
+    Covers jobs still in the database (see RETENTION_DAYS); a user's key
+    covers that user's jobs only.
+
+    - **since** / **until**: optional ISO-8601 bounds on when the usage was recorded (UTC)
+    - **X-API-Key**: A user's key or API_KEY (required when AUTH_ENABLED)
+    """
+    conditions = []
+    if since:
+        conditions.append(AnalysisTokenUsage.created_at >= since)
+    if until:
+        conditions.append(AnalysisTokenUsage.created_at < until)
+    if user is not None:
+        conditions.append(
+            AnalysisTokenUsage.job_id.in_(select(AnalysisJob.job_id).where(AnalysisJob.user_id == user.id))
         )
+    
+    async with get_async_db_session() as db:
+        rows = (
+            await db.execute(
+                select(
+                    AnalysisTokenUsage.stage,
+                    func.count(AnalysisTokenUsage.job_id.distinct()).label("jobs"),
+                    *(func.sum(getattr(AnalysisTokenUsage, field)).label(field) for field in TOKEN_USAGE_FIELDS),
+                )
+                .where(*conditions)
+                .group_by(AnalysisTokenUsage.stage)
+            )
+        ).mappings().all()
+        jobs = await db.scalar(select(func.count(AnalysisTokenUsage.job_id.distinct())).where(*conditions))
+    
+    stages = {}
+    for row in rows:
+        stage = usage_summary([row])
+        stage["jobs"] = row["jobs"]
+        stage["avg_total_tokens_per_job"] = round(row["total_tokens"] / row["jobs"], 1) if row["jobs"] else None
+        stages[row["stage"]] = stage
+    total = usage_summary(rows)
+    total["jobs"] = jobs
+    return {
+        "since": since.isoformat() if since else None,
+        "until": until.isoformat() if until else None,
+        "total": total,
+        "stages": stages,
+    }
+
+
+@app.get("/jobs/{job_id}/profile")
+async def get_job_profile(
+    job_id: str,
+    format: str = Query("speedscope"),
+    user: Optional[ApiUser] = Security(verify_api_key),
+):
+    """Download the stack profile of a job submitted with `X-Profile: 1`.
+
+    Stages are stored as they finish, so a running job returns those done so far.
+
+    - **format**: `speedscope` (JSON, one profile per stage — open at https://www.speedscope.app)
+      or `collapsed` (flamegraph.pl input, stacks rooted at `stage:<name>`)
+    - **X-API-Key**: A user's key or API_KEY (required when AUTH_ENABLED)
+    """
+    if format not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(PROFILE_FORMATS)}")
+    
+    await ensure_job_access(user, job_id)
+    async with get_async_db_session() as db:
+        rows = (
+            await db.execute(
+                select(AnalysisProfile.stage, AnalysisProfile.collapsed)
+                .where(AnalysisProfile.job_id == job_id)
+                .order_by(AnalysisProfile.id)
+            )
+        ).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"No profile recorded for job {job_id}")
+    
+    if format == "collapsed":
+        content = merge_collapsed([(row.stage, row.collapsed) for row in rows])
+        media_type, filename = "text/plain; charset=utf-8", f"{job_id}.collapsed.txt"
+    else:
+        document = speedscope_document(f"job {job_id}", [(row.stage, row.collapsed) for row in rows])
+        content = json.dumps(document, separators=(",", ":"))
+        media_type, filename = "application/json", f"{job_id}.speedscope.json"
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @app.get("/jobs", response_model=JobListResponse)
 async def list_jobs(
     request: Request,
     status: Optional[str] = None,
-    limit: int = 20,
-    offset: int = 0,
-    _: None = Security(verify_api_key),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    fields: Optional[str] = None,
+    user: Optional[ApiUser] = Security(verify_api_key),
 ):
-    """List all analysis jobs, optionally filtered by status.
+    """List analysis jobs, newest first, optionally filtered by status.
+
+    A user's key lists that user's jobs only.
 
-    - **status**: Filter by job status (pending, processing, completed, failed)
-    - **limit**: Maximum number of jobs to return (default 20)
-    - **offset**: Number of jobs to skip (for pagination)
-    - **X-API-Key**: Required header when API_KEY is set in .env
+    Page through results by passing the `next_cursor` of one response as the
+    `cursor` of the next request; it is null on the last page. `total` may lag
+    by up to JOB_COUNT_CACHE_SECONDS.
+
+    Listings carry a short `summary` instead of the full report; pass
+    `fields=...,result` to include it.
+
+    - **status**: Filter by job status (pending, processing, completed, failed, cancelled)
+    - **limit**: Maximum number of jobs to return (default 20, max 100)
+    - **cursor**: `next_cursor` from the previous page
+    - **offset**: Number of jobs to skip (deprecated — slow on deep pages, use `cursor`)
+    - **fields**: Comma-separated job fields to return (default: all but `result`)
+    - **X-API-Key**: A user's key or API_KEY (required when AUTH_ENABLED)
     """
-    with get_db_session() as db:
-        query = db.query(AnalysisJob)
+    selected = parse_job_fields(fields)
+    after = decode_job_cursor(cursor) if cursor else None
+    
+    async with get_async_db_session() as db:
+        query = select(
+            *(JOB_FIELD_COLUMNS[name].label(name) for name in selected),
+            AnalysisJob.created_at.label("_cursor_created_at"),
+            AnalysisJob.id.label("_cursor_id"),
+        )
+        if RESULT_JOIN_FIELDS.intersection(selected):
+            query = query.select_from(AnalysisJob).outerjoin(
+                AnalysisResult, AnalysisResult.job_id == AnalysisJob.job_id
+            )
         
         if status:
-            query = query.filter(AnalysisJob.status == status)
+            query = query.where(AnalysisJob.status == status)
+        if user is not None:
+            query = query.where(AnalysisJob.user_id == user.id)
+        if after:
+            # Row-value comparison so the (status,) created_at, id index can seek
+            query = query.where(tuple_(AnalysisJob.created_at, AnalysisJob.id) < after)
         
-        total = query.count()
-        jobs = query.order_by(AnalysisJob.created_at.desc()).offset(offset).limit(limit).all()
+        total = await cached_job_count(db, status, user.id if user else None)
+        rows = await db.execute(
+            query.order_by(AnalysisJob.created_at.desc(), AnalysisJob.id.desc())
+            .offset(offset)
+            .limit(limit + 1)  # one extra row tells us whether another page exists
+        )
         
-        job_list = [
-            JobStatusResponse(
-                job_id=job.job_id,
-                status=job.status,
-                query=job.query,
-                result=job.result,
-                error=job.error_message,
-                created_at=job.created_at.isoformat() if job.created_at else None,
-                completed_at=job.completed_at.isoformat() if job.completed_at else None,
-                duration_seconds=job.duration_seconds,
-            )
-            for job in jobs
-        ]
+        job_list, next_cursor = [], None
+        for row in rows:
+            values = dict(row._mapping)
+            position = values.pop("_cursor_created_at"), values.pop("_cursor_id")
+            if len(job_list) == limit:
+                next_cursor = encode_job_cursor(*last_position)
+                break
+            job_list.append(job_row_response(values))
+            last_position = position
         
-        return JobListResponse(jobs=job_list, total=total)
+    listing = JobListResponse(jobs=job_list, total=total, next_cursor=next_cursor)
+    return cached_json_response(request, listing.model_dump(exclude_unset=True))
 
 
 @app.get("/results/{job_id}")
 async def get_analysis_result(
     job_id: str,
-    _: None = Security(verify_api_key),
+    request: Request,
+    user: Optional[ApiUser] = Security(verify_api_key),
 ):
-    """Get the stored analysis result for a completed job.
+    """Get the stored analysis result for a job.
+
+    While a job is still running, returns the agent outputs checkpointed so far
+    with ``partial: true`` so the dashboard can show each stage as it finishes.
+    Completed results never change and are served with
+    ``Cache-Control: immutable`` and a strong ETag.
 
     - **job_id**: The job ID returned from /analyze/async
-    - **X-API-Key**: Required header when API_KEY is set in .env
+    - **X-API-Key**: A user's key or API_KEY (required when AUTH_ENABLED)
     """
-    with get_db_session() as db:
-        result = db.query(AnalysisResult).filter(AnalysisResult.job_id == job_id).first()
-        
-        if not result:
-            raise HTTPException(status_code=404, detail=f"Result for job {job_id} not found")
-        
-        return {
-            "job_id": result.job_id,
-            "query": result.query,
-            "original_filename": result.original_filename,
-            "agent_outputs": {
-                "verification": result.verification_report,
-                "financial_analysis": result.financial_analysis,
-                "investment_analysis": result.investment_analysis,
-                "risk_assessment": result.risk_assessment,
-            },
-            "final_analysis": result.analysis,
-            "summary": result.summary,
-            "duration_seconds": result.duration_seconds,
-            "created_at": result.created_at.isoformat() if result.created_at else None,
-        }
+    await ensure_job_access(user, job_id)
+    payload = await fetch_result(job_id)
+    if payload is None:
+        raise HTTPException(status_code=404, detail=f"Result for job {job_id} not found")
+    cache_control = REVALIDATE_CACHE_CONTROL if payload["partial"] else IMMUTABLE_CACHE_CONTROL
+    return cached_json_response(request, payload, cache_control)
 
 
 # ---------------------------------------------------------------------------
@@ -0,0 +1,304 @@
+"""
+Prometheus metrics for the API and the Celery worker.
+
+The API serves them at `GET /metrics`; each worker process serves its own on
+WORKER_METRICS_PORT. With the prefork pool (several processes per worker) set
+PROMETHEUS_MULTIPROC_DIR to an empty directory so the processes' metrics are
+aggregated (see prometheus_client's multiprocess mode).
+
+Pipeline metrics are recorded by the worker: stage run and queue time, time
+per agent, LLM call latency (and time spent waiting for an LLM call slot),
+tokens used, tool calls, synthesis fallbacks, and end-to-end job time. The
+same per-stage numbers are also stored on the job row
+(`analysis_jobs.stage_metrics`) through `collect_stage_usage()`.
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Iterator, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# LLM-bound work takes seconds to minutes; DB and queue waits can be sub-second
+SLOW_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600)
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_duration_seconds",
+    "Run time of one pipeline stage task (extract, verify, analyze, invest_risk, synthesize, persist)",
+    ["stage", "outcome"],
+    buckets=SLOW_BUCKETS,
+)
+STAGE_QUEUE_SECONDS = Histogram(
+    "pipeline_stage_queue_seconds",
+    "Time a stage waited in its Celery queue after the previous stage finished",
+    ["stage"],
+    buckets=FAST_BUCKETS,
+)
+STAGE_TIMEOUTS = Counter(
+    "pipeline_stage_timeouts_total",
+    "Pipeline stages cut off by their time budget (the job completed with partial results)",
+    ["stage"],
+)
+AGENT_SECONDS = Histogram(
+    "agent_duration_seconds",
+    "Time for one CrewAI agent to produce its output (verification, analysis, investment, risk)",
+    ["agent"],
+    buckets=SLOW_BUCKETS,
+)
+LLM_CALL_SECONDS = Histogram(
+    "llm_call_duration_seconds",
+    "Latency of one LLM request (caller: agent or synthesis)",
+    ["caller", "outcome"],
+    buckets=SLOW_BUCKETS,
+)
+LLM_SLOT_WAIT_SECONDS = Histogram(
+    "llm_slot_wait_seconds",
+    "Time an LLM call waited for a per-process concurrency slot (LLM_MAX_CONCURRENCY)",
+    buckets=FAST_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "LLM tokens used, by agent stage (or synthesis) and kind (prompt or completion)",
+    ["stage", "kind"],
+)
+SYNTHESIS_FALLBACKS = Counter(
+    "synthesis_fallbacks_total",
+    "Final answers built by concatenating agent outputs because the synthesis LLM call failed",
+    ["error"],
+)
+TOOL_CALLS = Counter(
+    "tool_calls_total",
+    "Agent tool invocations",
+    ["tool", "outcome"],
+)
+TOOL_SECONDS = Histogram(
+    "tool_call_duration_seconds",
+    "Run time of one agent tool invocation",
+    ["tool"],
+    buckets=FAST_BUCKETS,
+)
+JOB_SECONDS = Histogram(
+    "job_duration_seconds",
+    "End-to-end analysis time (mode: async pipeline or sync /analyze)",
+    ["mode", "status"],
+    buckets=SLOW_BUCKETS,
+)
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections_total",
+    "POST /analyze/async requests refused with 503 because the pipeline is backed up",
+    ["reason"],
+)
+RATE_LIMITED = Counter(
+    "rate_limited_requests_total",
+    "Requests refused with 429 by the per-tenant rate limiter, by limit scope",
+    ["scope"],
+)
+RATE_LIMIT_CHECK_SECONDS = Histogram(
+    "rate_limit_check_seconds",
+    "Time the rate limiter adds to each request (backend: redis or memory)",
+    ["backend"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "API time to response start, by route template",
+    ["method", "route", "status"],
+    buckets=FAST_BUCKETS,
+)
+
+
+# ---------------------------------------------------------------------------
+# Per-stage usage (stored on the job row)
+# ---------------------------------------------------------------------------
+_stage_usage: ContextVar[Optional[dict]] = ContextVar("stage_usage", default=None)
+
+
+@contextmanager
+def collect_stage_usage() -> Iterator[dict]:
+    """Tally LLM and tool calls made in this context (one pipeline stage)."""
+    usage = {"llm_calls": 0, "llm_seconds": 0.0, "tool_calls": 0}
+    token = _stage_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _stage_usage.reset(token)
+
+
+def _add_usage(**amounts) -> None:
+    usage = _stage_usage.get()
+    if usage is not None:
+        for key, amount in amounts.items():
+            usage[key] = usage.get(key, 0) + amount
+
+
+def observe_agent(agent: str, seconds: float) -> None:
+    AGENT_SECONDS.labels(agent).observe(seconds)
+    _add_usage(**{f"{agent}_seconds": round(seconds, 3)})
+
+
+def observe_tokens(stage: str, usage: Optional[dict]) -> None:
+    if usage:
+        LLM_TOKENS.labels(stage, "prompt").inc(usage.get("prompt_tokens") or 0)
+        LLM_TOKENS.labels(stage, "completion").inc(usage.get("completion_tokens") or 0)
+
+
+def observe_synthesis_fallback(error: Exception) -> None:
+    SYNTHESIS_FALLBACKS.labels(type(error).__name__).inc()
+    _add_usage(synthesis_fallbacks=1)
+
+
+@contextmanager
+def timed_llm_call(caller: str) -> Iterator[None]:
+    """Time one LLM request (run inside its concurrency slot)."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        seconds = time.perf_counter() - started
+        LLM_CALL_SECONDS.labels(caller, outcome).observe(seconds)
+        _add_usage(llm_calls=1, llm_seconds=round(seconds, 3))
+
+
+def instrumented_tool(name: str) -> Callable:
+    """Count and time calls to an agent tool; apply beneath `@tool(name)`."""
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = fn(*args, **kwargs)
+                outcome = "success"
+                return result
+            finally:
+                TOOL_CALLS.labels(name, outcome).inc()
+                TOOL_SECONDS.labels(name).observe(time.perf_counter() - started)
+                _add_usage(tool_calls=1)
+        return wrapper
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# Exposition
+# ---------------------------------------------------------------------------
+def _multiprocess_mode() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+class _CallbackCollector:
+    """Exports gauges/counters from a `name -> dict` snapshot callable at scrape time."""
+
+    def __init__(self, prefix: str, snapshot: Callable[[], dict], counters: set, label: str):
+        self.prefix = prefix
+        self.snapshot = snapshot
+        self.counters = counters
+        self.label = label
+
+    def collect(self):
+        families = {}
+        for label_value, values in self.snapshot().items():
+            for key, value in values.items():
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    continue
+                if key not in families:
+                    name = f"{self.prefix}_{key}"
+                    family_class = CounterMetricFamily if key in self.counters else GaugeMetricFamily
+                    families[key] = family_class(name, f"{self.prefix} {key}", labels=[self.label])
+                families[key].add_metric([label_value], value)
+        return list(families.values())
+
+
+def register_snapshot(prefix: str, snapshot: Callable[[], dict], counters: set = frozenset(), label: str = "name") -> None:
+    """Expose a stats dict (e.g. `pool_metrics()`) at scrape time.
+
+    ``snapshot`` returns {label_value: {stat: number}}; stats named in
+    ``counters`` are exported as counters, the rest as gauges. Only for the
+    single-process registry (the API), not prefork worker processes.
+    """
+    REGISTRY.register(_CallbackCollector(prefix, snapshot, set(counters), label))
+
+
+def latest_metrics() -> bytes:
+    """Prometheus text exposition of every metric in this process (or directory)."""
+    if _multiprocess_mode():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def start_metrics_server(port: int) -> None:
+    """Serve /metrics on ``port`` from a background thread (worker processes)."""
+    if port <= 0:
+        return
+    registry = REGISTRY
+    if _multiprocess_mode():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    try:
+        start_http_server(port, registry=registry)
+        logger.info(f"Serving Prometheus metrics on :{port}")
+    except OSError as e:
+        # e.g. a second worker on the same host — its metrics stay unexported
+        logger.warning(f"Could not serve metrics on :{port}: {e}")
+
+
+class PrometheusMiddleware:
+    """Records HTTP_REQUEST_SECONDS per route template (not raw path, to bound cardinality).
+
+    Timed to response start, so streaming responses (SSE) measure time to
+    first byte rather than how long the client stayed connected.
+    """
+
+    def __init__(self, app, skip_paths: set = frozenset()):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        recorded = False
+
+        def record(status: int) -> None:
+            nonlocal recorded
+            if recorded:
+                return
+            recorded = True
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status),
+            ).observe(time.perf_counter() - started)
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        except Exception:
+            record(500)
+            raise
@@ -0,0 +1,107 @@
+"""
+One-off migration to compressed, de-duplicated result storage.
+
+For rows written before reports were compressed:
+  - analysis_results: compresses the agent reports and final analysis
+  - analysis_jobs.result: cleared where analysis_results holds the same
+    report, compressed otherwise
+  - analysis_checkpoints: deleted for completed jobs (their result row holds
+    the outputs), compressed otherwise
+
+Safe to re-run — rows already compressed are skipped — and safe while the API
+and workers are running, since readers handle both formats. `init_db()`
+(run first) converts the PostgreSQL columns to bytea. Disk space is only
+returned to the OS by VACUUM FULL (PostgreSQL) or VACUUM (SQLite) afterwards.
+
+Usage:
+    python migrate_results.py [--batch-size 200]
+"""
+import argparse
+import logging
+
+from sqlalchemy import LargeBinary, select, type_coerce, update
+
+from database import (
+    AnalysisCheckpoint,
+    AnalysisJob,
+    AnalysisResult,
+    JobStatus,
+    decompress_text,
+    engine,
+    init_db,
+    is_compressed,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RESULT_COLUMNS = ["verification_report", "financial_analysis", "investment_analysis", "risk_assessment", "analysis"]
+
+
+def _recompress(table, columns, batch_size: int) -> int:
+    """Compress the uncompressed values in ``columns``; returns rows updated."""
+    # Coerced to plain binary so values come back as stored, not decompressed
+    raw_columns = [type_coerce(table.c[name], LargeBinary()).label(name) for name in columns]
+    updated, last_id = 0, 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(table.c.id, *raw_columns)
+                .where(table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+        if not rows:
+            return updated
+        last_id = rows[-1].id
+
+        with engine.begin() as conn:
+            for row in rows:
+                values = {
+                    name: decompress_text(raw)
+                    for name, raw in zip(columns, row[1:])
+                    if raw is not None and not is_compressed(raw)
+                }
+                if values:
+                    conn.execute(update(table).where(table.c.id == row.id).values(**values))
+                    updated += 1
+        logger.info(f"{table.name}: compressed {updated} rows (through id {last_id})")
+
+
+def migrate(batch_size: int = 200) -> dict:
+    init_db()
+    jobs, results, checkpoints = AnalysisJob.__table__, AnalysisResult.__table__, AnalysisCheckpoint.__table__
+
+    with engine.begin() as conn:
+        # The report already lives in analysis_results — drop the duplicate copy
+        deduplicated = conn.execute(
+            update(jobs)
+            .where(jobs.c.result.is_not(None))
+            .where(jobs.c.job_id.in_(select(results.c.job_id)))
+            .values(result=None)
+        ).rowcount
+        completed = select(jobs.c.job_id).where(jobs.c.status == JobStatus.COMPLETED)
+        dropped_checkpoints = conn.execute(
+            checkpoints.delete().where(
+                checkpoints.c.job_id.in_(completed),
+                checkpoints.c.job_id.in_(select(results.c.job_id)),
+            )
+        ).rowcount
+    logger.info(f"Cleared {deduplicated} duplicate job reports, deleted {dropped_checkpoints} checkpoints")
+
+    stats = {
+        "deduplicated_job_results": deduplicated,
+        "deleted_checkpoints": dropped_checkpoints,
+        "compressed_results": _recompress(results, RESULT_COLUMNS, batch_size),
+        "compressed_job_results": _recompress(jobs, ["result"], batch_size),
+        "compressed_checkpoints": _recompress(checkpoints, ["output"], batch_size),
+    }
+    logger.info(f"Result storage migration finished: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=200, help="rows read per batch")
+    args = parser.parse_args()
+    migrate(args.batch_size)
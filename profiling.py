@@ -0,0 +1,178 @@
+"""
+On-demand sampling profiler for analysis jobs.
+
+Opt-in per job: an `X-Profile: 1` header on POST /analyze or /analyze/async,
+or `profile=True` when calling `analyze_document_task` directly. While a
+profiled stage runs, a background thread samples the stage's Python stack
+every PROFILE_INTERVAL_MS (like py-spy, but in-process and stdlib only). Each
+sample is weighted by the time since the previous one, since a thread holding
+the GIL delays the sampler. Each stage's profile is stored with the job as
+collapsed stacks (`frame;frame;frame milliseconds`, the flamegraph.pl format)
+and served by GET /jobs/{job_id}/profile as collapsed text or speedscope JSON.
+
+Jobs that are not profiled never start a sampler, so the cost when off is one
+dict lookup per stage.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+_FRAME_PATTERN = re.compile(r"^(?P<name>.*) \((?P<file>.*):(?P<line>\d+)\)$")
+
+
+def profile_requested(header_value: str) -> bool:
+    return (header_value or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _threads_are_greenlets() -> bool:
+    """Under gevent's monkey patching a sampler thread would never preempt the job."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+
+def _short_path(path: str) -> str:
+    marker = f"site-packages{os.sep}"
+    if marker in path:
+        return path.split(marker, 1)[1]
+    cwd = os.getcwd()
+    if path.startswith(cwd + os.sep):
+        return os.path.relpath(path, cwd)
+    return os.path.basename(path)
+
+
+class StackProfile:
+    """Seconds spent in each sampled call stack (root first) of the sampled threads."""
+
+    def __init__(self, interval_ms: float):
+        self.interval = max(interval_ms, 1) / 1000
+        self.seconds: Counter = Counter()
+        self.samples = 0
+        self.wall_seconds = 0.0
+        self._labels = {}
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            # First line of the function, so samples anywhere in it merge
+            label = self._labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _sample(self, thread_id: int, stop: threading.Event) -> None:
+        last = time.perf_counter()
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            now = time.perf_counter()
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.seconds[tuple(reversed(stack))] += now - last
+                self.samples += 1
+            last = now
+
+    @contextmanager
+    def sampling(self) -> Iterator[None]:
+        """Sample the calling thread's stack until the block exits."""
+        if _threads_are_greenlets():
+            logger.warning("Profiling is not supported with the gevent pool; skipping")
+            yield
+            return
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=self._sample, args=(threading.get_ident(), stop), name="stack-sampler", daemon=True
+        )
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            sampler.join()
+            self.wall_seconds += time.perf_counter() - started
+
+    def collapsed(self) -> str:
+        """Collapsed-stack text: one `frame;frame;frame milliseconds` line per distinct stack."""
+        return "".join(
+            f"{';'.join(stack)} {max(1, round(seconds * 1000))}\n"
+            for stack, seconds in self.seconds.most_common()
+        )
+
+
+def call_sampled(profile, fn, *args, **kwargs):
+    """Call ``fn`` in this thread, sampled into ``profile`` unless it is None."""
+    if profile is None:
+        return fn(*args, **kwargs)
+    with profile.sampling():
+        return fn(*args, **kwargs)
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+def _parse_collapsed(text: str) -> Iterator[Tuple[List[str], int]]:
+    for line in text.splitlines():
+        stack, _, milliseconds = line.rpartition(" ")
+        if stack and milliseconds.isdigit():
+            yield stack.split(";"), int(milliseconds)
+
+
+def merge_collapsed(stages: List[Tuple[str, str]]) -> str:
+    """One collapsed file for several stages, each stack rooted at `stage:<name>`."""
+    return "".join(
+        f"stage:{name};{';'.join(stack)} {milliseconds}\n"
+        for name, text in stages
+        for stack, milliseconds in _parse_collapsed(text)
+    )
+
+
+def speedscope_document(title: str, stages: List[Tuple[str, str]]) -> dict:
+    """A speedscope file with one sampled profile per (stage, collapsed text)."""
+    frames, frame_index = [], {}
+    profiles = []
+    for name, text in stages:
+        samples, weights = [], []
+        for stack, milliseconds in _parse_collapsed(text):
+            indexes = []
+            for label in stack:
+                if label not in frame_index:
+                    frame_index[label] = len(frames)
+                    match = _FRAME_PATTERN.match(label)
+                    frames.append(
+                        {"name": match["name"], "file": match["file"], "line": int(match["line"])}
+                        if match else {"name": label}
+                    )
+                indexes.append(frame_index[label])
+            samples.append(indexes)
+            weights.append(milliseconds)
+        profiles.append({
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        })
+    return {
+        "$schema": SPEEDSCOPE_SCHEMA,
+        "name": title,
+        "exporter": "financial-document-analyzer",
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": profiles,
+    }
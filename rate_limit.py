@@ -0,0 +1,275 @@
+"""
+Per-tenant sliding-window rate limiting for the API.
+
+Tenants: a request whose X-API-Key belongs to an active user counts against
+that user, whatever address it comes from; any other request counts against
+its client address. Each tenant has a per-minute quota per scope:
+
+  analyze        POST /analyze          RATE_LIMIT_ANALYZE_PER_MINUTE
+  analyze_async  POST /analyze/async    RATE_LIMIT_ANALYZE_ASYNC_PER_MINUTE
+  default        everything else        RATE_LIMIT_PER_MINUTE
+
+A user's `rate_limit_*_per_minute` columns override the defaults (NULL keeps
+the default, 0 blocks the scope). Users come from the API-key cache in auth.py, so identifying
+the tenant costs no query on most requests. A key the cache does not know yet
+is only looked up once its client address's quota admits the request, so
+made-up keys are limited like anonymous traffic rather than costing a
+database query each.
+
+Algorithm: sliding-window counter. Requests are counted in fixed one-minute
+windows, and the previous window's count is weighted by how much of it still
+overlaps the last 60 seconds. This takes two integers per tenant and scope,
+and one Lua call per request. With UPSTASH_REDIS_URL set the counters live in
+Redis, so every API instance enforces the same quota. Without it (local dev)
+they are kept in process. If Redis fails, requests are let through (fail open)
+and a warning is logged. The time the limiter adds to each request is exported
+as `rate_limit_check_seconds`.
+"""
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+from starlette.responses import JSONResponse
+
+from auth import ApiUser, cached_user, lookup_user
+from config import settings
+from metrics import RATE_LIMIT_CHECK_SECONDS, RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 60
+REDIS_KEY_PREFIX = "ratelimit:"
+LOCAL_COUNTER_MAX_ENTRIES = 10_000
+WARNING_INTERVAL_SECONDS = 60
+
+# (method, path) -> scope; each scope's quota is the settings/User attribute
+ROUTE_SCOPES = {
+    ("POST", "/analyze"): "analyze",
+    ("POST", "/analyze/async"): "analyze_async",
+}
+SCOPE_LIMIT_ATTRIBUTES = {
+    "default": "rate_limit_per_minute",
+    "analyze": "rate_limit_analyze_per_minute",
+    "analyze_async": "rate_limit_analyze_async_per_minute",
+}
+
+# KEYS: current window, previous window. ARGV: limit, elapsed fraction of the
+# current window, key TTL. Returns {allowed, current count, previous count}.
+SLIDING_WINDOW_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+if previous * (1 - tonumber(ARGV[2])) + current + 1 > tonumber(ARGV[1]) then
+    return {0, current, previous}
+end
+current = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {1, current, previous}
+"""
+
+
+@dataclass
+class Tenant:
+    key: str  # "user:<id>" or "ip:<address>"
+    limits: Dict[str, int] = field(default_factory=dict)  # per-user overrides by scope
+
+    def limit(self, scope: str) -> int:
+        # A per-user quota of 0 blocks the scope; only a missing one means the default
+        value = self.limits.get(scope)
+        return value if value is not None else getattr(settings, SCOPE_LIMIT_ATTRIBUTES[scope])
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: int = 0
+
+
+def _retry_after(limit: int, current: int, previous: int, elapsed: float) -> int:
+    """Seconds until one more request fits under ``limit``."""
+    if current < limit and previous:
+        # The previous window's weight has to decay enough
+        needed = 1 - (limit - 1 - current) / previous
+        wait = (needed - elapsed) * WINDOW_SECONDS
+    else:
+        # Not before the next window, where this window becomes the previous one
+        wait = (1 - elapsed) * WINDOW_SECONDS + max(0.0, 1 - (limit - 1) / max(current, 1)) * WINDOW_SECONDS
+    return max(1, math.ceil(wait))
+
+
+def _decision(limit: int, allowed: bool, current: int, previous: int, elapsed: float) -> Decision:
+    weighted = previous * (1 - elapsed) + current
+    if allowed:
+        return Decision(True, limit, max(0, int(limit - weighted)))
+    return Decision(False, limit, 0, _retry_after(limit, current, previous, elapsed))
+
+
+class SlidingWindowLimiter:
+    """Sliding-window counters in Redis, or in this process without Redis."""
+
+    def __init__(self):
+        self._redis: Optional[aioredis.Redis] = None
+        self._script = None
+        self._counts: Dict[str, int] = {}
+        self._last_warning = 0.0
+
+    @property
+    def backend(self) -> str:
+        return "redis" if settings.upstash_redis_url else "memory"
+
+    def _get_script(self):
+        if self._script is None:
+            self._redis = aioredis.from_url(settings.celery_broker_url, socket_timeout=2)
+            self._script = self._redis.register_script(SLIDING_WINDOW_SCRIPT)
+        return self._script
+
+    def _local_hit(self, current_key: str, previous_key: str, limit: int, elapsed: float) -> Tuple[bool, int, int]:
+        current = self._counts.get(current_key, 0)
+        previous = self._counts.get(previous_key, 0)
+        if previous * (1 - elapsed) + current + 1 > limit:
+            return False, current, previous
+        self._counts[current_key] = current + 1
+        return True, current + 1, previous
+
+    def _prune(self, window: int) -> None:
+        """Drop in-process counters for windows that no longer count."""
+        if len(self._counts) > LOCAL_COUNTER_MAX_ENTRIES:
+            self._counts = {
+                key: count for key, count in self._counts.items()
+                if int(key.rsplit(":", 1)[1]) >= window - 1
+            }
+
+    async def hit(self, scope: str, tenant: Tenant, now: Optional[float] = None) -> Decision:
+        """Count one request for ``tenant`` in ``scope`` unless it is over quota."""
+        limit = tenant.limit(scope)
+        now = time.time() if now is None else now
+        window, offset = divmod(now, WINDOW_SECONDS)
+        window, elapsed = int(window), offset / WINDOW_SECONDS
+        base = f"{REDIS_KEY_PREFIX}{scope}:{tenant.key}:"
+        current_key, previous_key = f"{base}{window}", f"{base}{window - 1}"
+
+        try:
+            if self.backend == "redis":
+                allowed, current, previous = await self._get_script()(
+                    keys=[current_key, previous_key],
+                    args=[limit, elapsed, WINDOW_SECONDS * 2],
+                )
+            else:
+                self._prune(window)
+                allowed, current, previous = self._local_hit(current_key, previous_key, limit, elapsed)
+        except redis.RedisError as e:
+            if time.monotonic() - self._last_warning > WARNING_INTERVAL_SECONDS:
+                self._last_warning = time.monotonic()
+                logger.warning(f"Rate limiter unavailable, allowing requests: {e}")
+            return Decision(True, limit, limit)
+        return _decision(limit, bool(allowed), int(current), int(previous), elapsed)
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+            self._script = None
+
+
+rate_limiter = SlidingWindowLimiter()
+
+
+# ---------------------------------------------------------------------------
+# Tenants
+# ---------------------------------------------------------------------------
+def _user_tenant(user: ApiUser) -> Tenant:
+    limits = {
+        scope: user.rate_limits[attribute]
+        for scope, attribute in SCOPE_LIMIT_ATTRIBUTES.items()
+        if attribute in user.rate_limits
+    }
+    return Tenant(f"user:{user.id}", limits)
+
+
+def _address_tenant(client_host: Optional[str]) -> Tenant:
+    return Tenant(f"ip:{client_host or 'unknown'}")
+
+
+async def check_request(scope: str, api_key: Optional[str], client_host: Optional[str]) -> Decision:
+    """Count one request against its tenant: the user owning ``api_key``, else the client address.
+
+    A key already in the auth cache resolves without a query. Any other key
+    is counted against the client address first and looked up only if that
+    quota admits it; a valid key found this way also counts against its
+    user, so that request is charged to both.
+    """
+    cached, user = cached_user(api_key) if api_key else (True, None)
+    if user is None:
+        decision = await rate_limiter.hit(scope, _address_tenant(client_host))
+        if cached or not decision.allowed:
+            return decision
+        user = await lookup_user(api_key)
+        if user is None:
+            return decision
+    return await rate_limiter.hit(scope, _user_tenant(user))
+
+
+# ---------------------------------------------------------------------------
+# Middleware
+# ---------------------------------------------------------------------------
+class RateLimitMiddleware:
+    """Apply the tenant's quota before the request reaches the app (and its upload is read).
+
+    Allowed responses carry X-RateLimit-Limit / X-RateLimit-Remaining; refused
+    ones are a 429 with Retry-After naming the quota that was exceeded.
+    """
+
+    def __init__(self, app, skip_paths: set = frozenset()):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not settings.rate_limit_enabled
+            or scope["method"] == "OPTIONS"
+            or scope["path"] in self.skip_paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        limit_scope = ROUTE_SCOPES.get((scope["method"], scope["path"]), "default")
+        api_key = dict(scope["headers"]).get(b"x-api-key", b"").decode("latin-1") or None
+        client = scope.get("client")
+        started = time.perf_counter()
+        decision = await check_request(limit_scope, api_key, client[0] if client else None)
+        RATE_LIMIT_CHECK_SECONDS.labels(rate_limiter.backend).observe(time.perf_counter() - started)
+        limit_headers = {
+            "X-RateLimit-Limit": str(decision.limit),
+            "X-RateLimit-Remaining": str(decision.remaining),
+        }
+
+        if not decision.allowed:
+            RATE_LIMITED.labels(limit_scope).inc()
+            target = "this endpoint" if limit_scope == "default" else f"{scope['method']} {scope['path']}"
+            response = JSONResponse(
+                status_code=429,
+                content={
+                    "detail": (
+                        f"Rate limit exceeded: {decision.limit} requests per minute for {target}. "
+                        f"Retry in {decision.retry_after} seconds."
+                    )
+                },
+                headers={"Retry-After": str(decision.retry_after), **limit_headers},
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (name.lower().encode(), value.encode()) for name, value in limit_headers.items()
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,176 @@
+"""
+Read-through cache for finished jobs and results in the API process.
+
+Jobs and results only enter the cache once they reach a terminal status, so
+entries almost never change — the exception is the worker rewriting a job's
+final status (e.g. a redelivered task), which invalidates them:
+
+  L1  bounded in-process LRU (RESULT_CACHE_MAX_ENTRIES per API process)
+  L2  optional Redis tier shared by all API processes
+      (RESULT_CACHE_REDIS_TTL_SECONDS > 0 and UPSTASH_REDIS_URL set)
+
+Invalidation: the worker deletes the job's L2 keys and publishes its final
+status event (job_events); every API process drops the job's L1 entries when
+that event arrives. If the event subscription drops, L1 is cleared entirely.
+
+Cached values are plain JSON-able dicts shared between requests — treat them
+as read-only.
+"""
+import json
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("job", "result")
+REDIS_KEY_PREFIX = "job-cache:"
+
+
+def _redis_key(kind: str, job_id: str) -> str:
+    return f"{REDIS_KEY_PREFIX}{kind}:{job_id}"
+
+
+def redis_tier_enabled() -> bool:
+    return bool(settings.upstash_redis_url) and settings.result_cache_redis_ttl_seconds > 0
+
+
+class ResultCache:
+    """Two-tier read-through cache keyed by (kind, job_id)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+        self._redis: Optional[aioredis.Redis] = None
+        self.stats: Dict[str, int] = {
+            "l1_hits": 0,
+            "l2_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    # -- L1 ----------------------------------------------------------------
+    def _l1_get(self, key: Tuple[str, str]) -> Optional[dict]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def _l1_put(self, key: Tuple[str, str], value: dict) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    # -- L2 ----------------------------------------------------------------
+    def _get_redis(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.from_url(settings.celery_broker_url, socket_timeout=2)
+        return self._redis
+
+    async def _l2_get(self, kind: str, job_id: str) -> Optional[dict]:
+        if not redis_tier_enabled():
+            return None
+        try:
+            raw = await self._get_redis().get(_redis_key(kind, job_id))
+        except redis.RedisError as e:
+            logger.warning(f"Result cache read failed for {kind} {job_id}: {e}")
+            return None
+        return json.loads(raw) if raw else None
+
+    async def _l2_put(self, kind: str, job_id: str, value: dict) -> None:
+        if not redis_tier_enabled():
+            return
+        try:
+            await self._get_redis().set(
+                _redis_key(kind, job_id),
+                json.dumps(value, default=str),
+                ex=settings.result_cache_redis_ttl_seconds,
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Result cache write failed for {kind} {job_id}: {e}")
+
+    # -- Public API ----------------------------------------------------------
+    async def get_or_load(
+        self,
+        kind: str,
+        job_id: str,
+        load: Callable[[], Awaitable[Optional[dict]]],
+        cacheable: Callable[[dict], bool],
+    ) -> Optional[dict]:
+        """Return the cached value, or `load()` it and cache it if `cacheable`."""
+        key = (kind, job_id)
+        value = self._l1_get(key)
+        if value is not None:
+            self.stats["l1_hits"] += 1
+            return value
+
+        value = await self._l2_get(kind, job_id)
+        if value is not None:
+            self.stats["l2_hits"] += 1
+            self._l1_put(key, value)
+            return value
+
+        self.stats["misses"] += 1
+        value = await load()
+        if value is not None and cacheable(value):
+            self._l1_put(key, value)
+            await self._l2_put(kind, job_id, value)
+        return value
+
+    def invalidate_local(self, job_id: str) -> None:
+        """Drop a job's L1 entries (the worker already cleared L2)."""
+        for kind in KINDS:
+            if self._entries.pop((kind, job_id), None) is not None:
+                self.stats["invalidations"] += 1
+
+    def clear_local(self) -> None:
+        self.stats["invalidations"] += len(self._entries)
+        self._entries.clear()
+
+    def metrics(self) -> dict:
+        lookups = self.stats["l1_hits"] + self.stats["l2_hits"] + self.stats["misses"]
+        hits = self.stats["l1_hits"] + self.stats["l2_hits"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "redis_tier": redis_tier_enabled(),
+        }
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+result_cache = ResultCache(settings.result_cache_max_entries)
+
+
+# ---------------------------------------------------------------------------
+# Worker-side invalidation
+# ---------------------------------------------------------------------------
+_sync_redis: Optional[redis.Redis] = None
+
+
+def invalidate_shared_cache(job_id: str) -> None:
+    """Delete a job's L2 entries; call before publishing its final status event."""
+    global _sync_redis
+    if not redis_tier_enabled():
+        return
+    try:
+        if _sync_redis is None:
+            _sync_redis = redis.Redis.from_url(settings.celery_broker_url, socket_timeout=5)
+        _sync_redis.delete(*(_redis_key(kind, job_id) for kind in KINDS))
+    except redis.RedisError as e:
+        logger.warning(f"Could not invalidate cached results for job {job_id}: {e}")
@@ -0,0 +1,232 @@
+"""
+Retention, archival and orphan-file reclamation.
+
+Run by Celery beat (`maintenance_task` in worker.py, every
+MAINTENANCE_INTERVAL_HOURS) or by hand:
+
+    python retention.py
+
+Each run:
+  1. Archives finished (completed, failed or cancelled) jobs older than
+     RETENTION_DAYS: batches of RETENTION_BATCH_SIZE jobs, with their result
+     rows, checkpoints and token usage, are written to gzip'd JSON-lines files
+     under ARCHIVE_DIR and then deleted. One line per job: {"job": {...}, "result": {...} | null,
+     "checkpoints": {stage: output}, "token_usage": {stage: {...}}}. Stack
+     profiles are diagnostics and are deleted without being archived.
+  2. Deletes checkpoints older than the cutoff whose job no longer exists.
+  3. Deletes files nothing references, once older than ORPHAN_FILE_GRACE_HOURS:
+     uploads left in data/ by earlier releases (financial_document_*.pdf),
+     blobs without a reference-count row, and abandoned partial uploads.
+  4. Vacuums the job tables so freed space is reused and the hot tables stay
+     the same size (plain VACUUM on PostgreSQL; SQLite only when a quarter of
+     the file is free pages).
+
+An archive file is written and synced before its batch is deleted, in the
+same transaction that selected the batch. If that transaction fails after the
+write, a later run archives the same jobs again, so readers should key
+archived records on job_id.
+"""
+import argparse
+import glob
+import gzip
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, text
+
+from blob_store import get_blob_store
+from config import settings
+from database import (
+    AnalysisCheckpoint,
+    AnalysisJob,
+    AnalysisProfile,
+    AnalysisResult,
+    AnalysisTokenUsage,
+    DocumentBlob,
+    JobStatus,
+    engine,
+)
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED)
+HOT_TABLES = ("analysis_jobs", "analysis_results", "analysis_checkpoints", "analysis_token_usage", "analysis_profiles")
+
+# Earlier releases saved sync /analyze uploads here and leaked them on failure
+LEGACY_UPLOAD_PATTERN = os.path.join("data", "financial_document_*.pdf")
+
+# SQLite VACUUM rewrites the whole file, so only run it when worthwhile
+SQLITE_VACUUM_FREE_RATIO = 0.25
+
+
+# ---------------------------------------------------------------------------
+# Archival
+# ---------------------------------------------------------------------------
+def _write_archive(archive_dir: str, job_rows: list, result_rows: dict, checkpoint_rows: dict, usage_rows: dict) -> str:
+    """Write one batch to a gzip'd JSON-lines file; returns its path."""
+    first, last = job_rows[0], job_rows[-1]
+    name = f"jobs-{first['created_at']:%Y%m%d}-{last['created_at']:%Y%m%d}-{first['id']}.jsonl.gz"
+    path = os.path.join(archive_dir, name)
+    partial_path = f"{path}.part"
+
+    with gzip.open(partial_path, "wt", encoding="utf-8") as archive:
+        for job in job_rows:
+            result = result_rows.get(job["job_id"])
+            record = {
+                "job": dict(job),
+                "result": dict(result) if result else None,
+                "checkpoints": checkpoint_rows.get(job["job_id"], {}),
+                "token_usage": usage_rows.get(job["job_id"], {}),
+            }
+            archive.write(json.dumps(record, default=str) + "\n")
+    with open(partial_path, "rb") as archive:
+        os.fsync(archive.fileno())
+    os.replace(partial_path, path)
+    return path
+
+
+def archive_expired_jobs(cutoff: datetime, batch_size: int, archive_dir: str) -> dict:
+    """Move finished jobs created before ``cutoff`` from the database to archive files."""
+    jobs, results, checkpoints = AnalysisJob.__table__, AnalysisResult.__table__, AnalysisCheckpoint.__table__
+    usage, profiles = AnalysisTokenUsage.__table__, AnalysisProfile.__table__
+    os.makedirs(archive_dir, exist_ok=True)
+    archived = files = 0
+
+    while True:
+        with engine.begin() as conn:
+            # SKIP LOCKED (PostgreSQL) lets overlapping runs take different batches
+            job_rows = conn.execute(
+                select(jobs)
+                .where(jobs.c.status.in_(FINISHED_STATUSES), jobs.c.created_at < cutoff)
+                .order_by(jobs.c.created_at, jobs.c.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            ).mappings().all()
+            if not job_rows:
+                break
+
+            job_ids = [row["job_id"] for row in job_rows]
+            result_rows = {
+                row["job_id"]: row
+                for row in conn.execute(select(results).where(results.c.job_id.in_(job_ids))).mappings()
+            }
+            checkpoint_rows = defaultdict(dict)
+            for row in conn.execute(select(checkpoints).where(checkpoints.c.job_id.in_(job_ids))).mappings():
+                checkpoint_rows[row["job_id"]][row["stage"]] = row["output"]
+            usage_rows = defaultdict(dict)
+            for row in conn.execute(select(usage).where(usage.c.job_id.in_(job_ids))).mappings():
+                usage_rows[row["job_id"]][row["stage"]] = {key: row[key] for key in row.keys() if key not in ("id", "job_id", "stage")}
+
+            path = _write_archive(archive_dir, job_rows, result_rows, checkpoint_rows, usage_rows)
+            for table in (checkpoints, usage, profiles, results, jobs):
+                conn.execute(table.delete().where(table.c.job_id.in_(job_ids)))
+
+        archived += len(job_rows)
+        files += 1
+        logger.info(f"Archived {len(job_rows)} jobs to {path}")
+
+    return {"archived_jobs": archived, "archive_files": files}
+
+
+def delete_orphan_checkpoints(cutoff: datetime) -> int:
+    """Delete checkpoints older than ``cutoff`` whose job row no longer exists."""
+    checkpoints, jobs = AnalysisCheckpoint.__table__, AnalysisJob.__table__
+    with engine.begin() as conn:
+        return conn.execute(
+            checkpoints.delete().where(
+                checkpoints.c.created_at < cutoff,
+                checkpoints.c.job_id.not_in(select(jobs.c.job_id)),
+            )
+        ).rowcount
+
+
+# ---------------------------------------------------------------------------
+# Orphaned Files
+# ---------------------------------------------------------------------------
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def sweep_orphan_files(grace_seconds: int) -> dict:
+    """Delete unreferenced upload files last modified more than ``grace_seconds`` ago."""
+    older_than = time.time() - grace_seconds
+
+    legacy_uploads = 0
+    for path in glob.glob(LEGACY_UPLOAD_PATTERN):
+        try:
+            if os.path.getmtime(path) < older_than and _remove(path):
+                legacy_uploads += 1
+        except FileNotFoundError:
+            continue
+
+    store = get_blob_store()
+    stale_uploads = store.discard_stale_uploads(older_than)
+
+    # Blobs whose reference-count row is gone (e.g. left by a release that
+    # failed between deleting the file's row and the file, before releases
+    # deleted both in one transaction), checked against the database in chunks
+    orphan_blobs = 0
+    candidates = [key for key, modified in store.list_keys() if modified < older_than]
+    for start in range(0, len(candidates), 500):
+        chunk = candidates[start:start + 500]
+        with engine.connect() as conn:
+            referenced = set(conn.execute(select(DocumentBlob.key).where(DocumentBlob.key.in_(chunk))).scalars())
+        for key in chunk:
+            if key not in referenced:
+                store.delete(key)
+                orphan_blobs += 1
+
+    return {"legacy_uploads": legacy_uploads, "stale_uploads": stale_uploads, "orphan_blobs": orphan_blobs}
+
+
+# ---------------------------------------------------------------------------
+# Vacuum
+# ---------------------------------------------------------------------------
+def vacuum_tables() -> None:
+    """Make space freed by archival reusable (VACUUM cannot run in a transaction)."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if engine.dialect.name == "postgresql":
+            for table in HOT_TABLES:
+                conn.execute(text(f"VACUUM (ANALYZE) {table}"))
+        elif engine.dialect.name == "sqlite":
+            free_pages = conn.execute(text("PRAGMA freelist_count")).scalar()
+            total_pages = conn.execute(text("PRAGMA page_count")).scalar()
+            if total_pages and free_pages / total_pages >= SQLITE_VACUUM_FREE_RATIO:
+                conn.execute(text("VACUUM"))
+            conn.execute(text("ANALYZE"))
+
+
+# ---------------------------------------------------------------------------
+# Entry Point
+# ---------------------------------------------------------------------------
+def run_maintenance() -> dict:
+    """One retention pass: archive, drop orphaned rows and files, vacuum."""
+    started = time.time()
+    stats = {}
+    if settings.retention_days > 0:
+        cutoff = datetime.utcnow() - timedelta(days=settings.retention_days)
+        stats.update(archive_expired_jobs(cutoff, settings.retention_batch_size, settings.archive_dir))
+        stats["orphan_checkpoints"] = delete_orphan_checkpoints(cutoff)
+    stats.update(sweep_orphan_files(settings.orphan_file_grace_hours * 3600))
+    vacuum_tables()
+    stats["duration_seconds"] = round(time.time() - started, 2)
+    logger.info(f"Maintenance finished: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--retention-days", type=int, help="override RETENTION_DAYS for this run (0 = no archival)")
+    args = parser.parse_args()
+    if args.retention_days is not None:
+        settings.retention_days = args.retention_days
+    run_maintenance()
@@ -0,0 +1,155 @@
+"""
+Dedicated, bounded executor for synchronous POST /analyze.
+
+The crew runs in its own pool of SYNC_ANALYSIS_WORKERS threads instead of
+asyncio's default executor, which upload writes, blob releases and other
+`asyncio.to_thread` calls share — long analyses no longer starve them, or
+each other without limit. Up to SYNC_ANALYSIS_MAX_QUEUED more requests wait
+for a thread; beyond that a request is refused (503 with Retry-After) before
+its upload is stored.
+
+While an analysis runs the request watches for the client to disconnect and
+then cancels the crew cooperatively (see cancellation.py): it stops at its
+next LLM call rather than spending minutes on a result nobody will read. A
+request's place is held until its thread has actually stopped, so the pool
+never runs more crews than it has threads.
+
+A run may also have a time budget (JOB_TIME_BUDGET_SECONDS), counted from
+when its thread picks it up: the token's deadline, checked at the same LLM
+call boundaries and bounding each request's timeout (see llm_client.py).
+"""
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from cancellation import CancelToken, OperationCancelled, cancellable
+
+# Weight of the newest run in the moving average used for Retry-After
+DURATION_SMOOTHING = 0.2
+
+
+class ExecutorFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"all analysis slots are busy; retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class ClientDisconnected(Exception):
+    """The client went away and the analysis was cancelled."""
+
+
+class SyncAnalysisExecutor:
+    """Thread pool with a bounded wait queue and per-run cancel tokens."""
+
+    def __init__(self, workers: int, max_queued: int, default_retry_after: int = 30, time_budget_seconds: float = 0):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.default_retry_after = default_retry_after
+        self.time_budget_seconds = time_budget_seconds  # 0 = unlimited
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sync-analysis")
+        self._lock = threading.Lock()
+        self._admitted = 0  # running + queued, from admission until the thread is done
+        self._running = 0
+        self._mean_seconds: Optional[float] = None
+        self.rejected = 0
+        self.cancelled = 0
+
+    def _release(self) -> None:
+        with self._lock:
+            self._admitted -= 1
+
+    def retry_after(self) -> int:
+        """Seconds until a place is likely to free up."""
+        if self._mean_seconds is None:
+            return self.default_retry_after
+        waiting = self._admitted - self.workers + 1
+        return max(1, math.ceil(self._mean_seconds * waiting / self.workers))
+
+    def admit(self) -> "Slot":
+        """Reserve a place for one analysis, or raise ExecutorFull."""
+        with self._lock:
+            full = self._admitted >= self.workers + self.max_queued
+            if not full:
+                self._admitted += 1
+        if full:
+            self.rejected += 1
+            raise ExecutorFull(self.retry_after())
+        return Slot(self)
+
+    def _call(self, token: CancelToken, fn: Callable, args: tuple, kwargs: dict):
+        with self._lock:
+            self._running += 1
+        started = time.perf_counter()
+        if self.time_budget_seconds > 0:
+            token.deadline = time.monotonic() + self.time_budget_seconds
+        try:
+            with cancellable(token):
+                token.raise_if_cancelled()  # cancelled while it was queued
+                return fn(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - started
+            with self._lock:
+                self._running -= 1
+                if not token.cancelled:
+                    self._mean_seconds = seconds if self._mean_seconds is None else (
+                        DURATION_SMOOTHING * seconds + (1 - DURATION_SMOOTHING) * self._mean_seconds
+                    )
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "sync": {
+                    "workers": self.workers,
+                    "running": self._running,
+                    "queued": self._admitted - self._running,
+                    "rejected": self.rejected,
+                    "cancelled": self.cancelled,
+                }
+            }
+
+
+class Slot:
+    """A place in the executor, held from admission until the analysis has stopped."""
+
+    def __init__(self, executor: SyncAnalysisExecutor):
+        self.executor = executor
+        self.submitted = False
+        self.closed = False
+
+    def close(self) -> None:
+        """Give the place back if nothing was run in it (a run releases it when done)."""
+        if not self.submitted and not self.closed:
+            self.closed = True
+            self.executor._release()
+
+    async def run(self, request, fn: Callable, *args, poll_seconds: float = 1.0, **kwargs):
+        """Run ``fn`` in the pool; if ``request``'s client disconnects, cancel it.
+
+        Raises ClientDisconnected once the cancelled run has stopped.
+        """
+        executor = self.executor
+        token = CancelToken()
+        future = executor._pool.submit(executor._call, token, fn, args, kwargs)
+        self.submitted = True
+        future.add_done_callback(lambda _: executor._release())
+        waiter = asyncio.wrap_future(future)
+
+        while True:
+            done, _ = await asyncio.wait({waiter}, timeout=poll_seconds)
+            if done:
+                return waiter.result()
+            if await request.is_disconnected():
+                break
+
+        token.cancel("client disconnected")
+        executor.cancelled += 1
+        # Wait for the crew to reach its next checkpoint, so the caller's
+        # cleanup (blob release, profile) runs after it stopped reading
+        try:
+            await asyncio.shield(waiter)
+        except (Exception, OperationCancelled):
+            pass
+        raise ClientDisconnected()
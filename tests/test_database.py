@@ -0,0 +1,35 @@
+"""Engine configuration in database.py, which is decided at import time."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _import_database(tmp_path, database_url: str) -> subprocess.CompletedProcess:
+    """Import database.py in a fresh interpreter with DATABASE_URL set."""
+    env = {**os.environ, "DATABASE_URL": database_url, "PYTHONPATH": str(REPO_ROOT)}
+    script = (
+        "import database; "
+        "print(database.IS_SQLITE, database.engine.url.drivername, database.async_engine.url.drivername, "
+        "database.async_engine.url.database)"
+    )
+    return subprocess.run(
+        [sys.executable, "-c", script], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120
+    )
+
+
+def test_sqlite_database_url_uses_aiosqlite_for_the_async_engine(tmp_path):
+    db_path = tmp_path / "explicit.db"
+    result = _import_database(tmp_path, f"sqlite:///{db_path}")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split()[-4:] == ["True", "sqlite", "sqlite+aiosqlite", str(db_path)]
+
+
+def test_pysqlite_database_url_uses_aiosqlite_for_the_async_engine(tmp_path):
+    db_path = tmp_path / "explicit.db"
+    result = _import_database(tmp_path, f"sqlite+pysqlite:///{db_path}")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split()[-4:] == ["True", "sqlite+pysqlite", "sqlite+aiosqlite", str(db_path)]
+
@@ -14,6 +14,9 @@
 
 ## Importing libraries and files
 import os
+import threading
+from collections import OrderedDict
+from typing import Optional
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
@@ -31,6 +34,9 @@ load_dotenv(override=True)
 from crewai.tools import tool
 from crewai_tools import SerperDevTool
 
+from blob_store import BLOB_URI_PREFIX, get_blob_store
+from metrics import instrumented_tool
+
 ## Creating search tool
 search_tool = SerperDevTool()
 
@@ -41,7 +47,28 @@ search_tool = SerperDevTool()
 ## ─────────────────────────────────────────────────────
 # Fix 1: Cache parsed PDFs so the document is only read once per path,
 #         even when multiple agents call this tool for the same file.
-_doc_cache: dict = {}
+#         Bounded (least recently used first out): workers are long-lived and
+#         every job adds its full document text; an evicted document is just
+#         read again from the blob store.
+DOC_CACHE_MAX_ENTRIES = 32
+_doc_cache: "OrderedDict[str, str]" = OrderedDict()
+_doc_cache_lock = threading.Lock()
+
+
+def _cached_document(path: str) -> Optional[str]:
+    with _doc_cache_lock:
+        text = _doc_cache.get(path)
+        if text is not None:
+            _doc_cache.move_to_end(path)
+        return text
+
+
+def _cache_document(path: str, text: str) -> None:
+    with _doc_cache_lock:
+        _doc_cache[path] = text
+        _doc_cache.move_to_end(path)
+        while len(_doc_cache) > DOC_CACHE_MAX_ENTRIES:
+            _doc_cache.popitem(last=False)
 
 ## ─────────────────────────────────────────────────────
 ## BUG_FIX #3: MISSING_DEP - Undefined Pdf class
@@ -61,6 +88,7 @@ _doc_cache: dict = {}
 ## Creating custom pdf reader tool
 
 @tool("Financial_Document_Reader")
+@instrumented_tool("Financial_Document_Reader")
 def read_financial_document(path: str) -> str:
     """Read and extract text content from a financial PDF document.
 
@@ -72,9 +100,32 @@ def read_financial_document(path: str) -> str:
     """
     # Return cached result if already read — avoids re-parsing the same PDF
     # for every agent that calls this tool during a crew run.
-    if path in _doc_cache:
-        return _doc_cache[path]
+    cached = _cached_document(path)
+    if cached is not None:
+        return cached
+
+    if path.startswith(BLOB_URI_PREFIX):
+        # Uploads are referenced by blob key, not by a path on this machine
+        with get_blob_store().local_path(path[len(BLOB_URI_PREFIX):]) as local_path:
+            full_report = extract_document_text(local_path)
+    else:
+        full_report = extract_document_text(path)
+    _cache_document(path, full_report)
+    return full_report
 
+
+def prime_document_cache(path: str, text: str) -> None:
+    """Seed the reader cache with text extracted by an earlier pipeline stage,
+    so LLM stages never touch the PDF (or need it on local disk)."""
+    _cache_document(path, text)
+
+
+def extract_document_text(path: str) -> str:
+    """Parse a PDF into the priority-ordered text the reader tool returns.
+
+    This is the CPU-bound part of the pipeline; the Celery `extract` stage runs
+    it once per job on its own queue.
+    """
     ## ─────────────────────────────────────────────────────
     ## BUG_FIX #3: Use pypdf directly instead of undefined Pdf class
     ## Original:   docs = Pdf(file_path=path).load()
@@ -113,7 +164,6 @@ def read_financial_document(path: str) -> str:
     if len(full_report) > 100_000:
         full_report = full_report[:100_000] + "\n\n[TRUNCATED]"
     
-    _doc_cache[path] = full_report
     return full_report
 
 
@@ -128,6 +178,7 @@ def read_financial_document(path: str) -> str:
 ##             to clean and return document data for agent analysis.
 ## ─────────────────────────────────────────────────────
 @tool("Investment_Analyzer")
+@instrumented_tool("Investment_Analyzer")
 def analyze_investment(financial_document_data: str) -> str:
     """Analyze financial document data and provide investment insights.
 
@@ -158,6 +209,7 @@ def analyze_investment(financial_document_data: str) -> str:
 ## Fix:        Converted to sync @tool function and implemented basic logic.
 ## ─────────────────────────────────────────────────────
 @tool("Risk_Assessment_Tool")
+@instrumented_tool("Risk_Assessment_Tool")
 def create_risk_assessment(financial_document_data: str) -> str:
     """Assess financial risks from a financial document.
 
@@ -2,25 +2,87 @@
 Celery Worker Configuration for async job processing.
 Uses Upstash Redis as the broker and result backend.
 """
+import os
+import re
+import json
 import time
 import logging
-from celery import Celery
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, Optional, Tuple
 
 # Load environment variables first
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
+# gevent must patch the stdlib before celery, redis and ssl are imported
+# (`celery -A worker worker -P gevent` does this itself; `python -m worker` does not)
+if __name__ == "__main__" and os.getenv("WORKER_POOL", "").lower() == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+
+from celery import Celery, chain
+from celery.exceptions import Ignore
+from celery.signals import worker_init
+from sqlalchemy import func
+
 from config import settings
-from database import get_db_session, AnalysisJob, JobStatus, init_db
+from cancellation import DeadlineExceeded, OperationCancelled, PollingCancelToken, cancellable
+from blob_store import blob_uri, get_blob_store, release_blob
+from job_events import publish_job_event
+from result_cache import invalidate_shared_cache
+from metrics import (
+    JOB_SECONDS,
+    STAGE_QUEUE_SECONDS,
+    STAGE_SECONDS,
+    STAGE_TIMEOUTS,
+    collect_stage_usage,
+    observe_agent,
+    observe_synthesis_fallback,
+    observe_tokens,
+    start_metrics_server,
+)
+from retention import run_maintenance
+from profiling import StackProfile
+from database import (
+    get_db_session,
+    AnalysisJob,
+    AnalysisResult,
+    JobStatus,
+    init_db,
+    save_checkpoint,
+    load_checkpoints,
+    delete_checkpoints,
+    record_token_usage,
+    save_profile,
+    job_status,
+    job_update,
+    update_active_job,
+    update_job,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def generate_final_answer(verification: str, financial_analysis: str, investment_analysis: str, risk_assessment: str) -> str:
-    """Use AI to synthesize all 4 agent outputs into a comprehensive final answer."""
+SYNTHESIS_MODEL = "nvidia_nim/meta/llama-3.3-70b-instruct"
+
+
+def generate_final_answer(verification: str, financial_analysis: str, investment_analysis: str, risk_assessment: str) -> Tuple[str, Optional[dict]]:
+    """Use AI to synthesize all 4 agent outputs into a comprehensive final answer.
+    
+    Returns the answer and the call's token usage (None for the fallback).
+    With no agent output at all (e.g. the job's budget ran out in the first
+    stage) there is nothing to synthesize, so the fallback is returned
+    without a call.
+    """
     from litellm import completion
+    from llm_client import call_timeout, llm_call_slot, token_usage
+    
+    outputs = (verification, financial_analysis, investment_analysis, risk_assessment)
+    if not any(outputs):
+        return combine_outputs(*outputs), None
     
     prompt = f"""You are a financial analyst. Synthesize the following 4 analysis sections into ONE comprehensive final answer.
 
@@ -46,17 +108,24 @@ Generate a well-structured final answer that:
 Keep it concise but comprehensive. Use markdown formatting."""
 
     try:
-        response = completion(
-            model="nvidia_nim/meta/llama-3.3-70b-instruct",
-            messages=[{"role": "user", "content": prompt}],
-            api_key=settings.nvidia_api_key,
-            base_url="https://integrate.api.nvidia.com/v1",
-        )
-        return response.choices[0].message.content
+        with llm_call_slot("synthesis"):
+            response = completion(
+                model=SYNTHESIS_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                api_key=settings.nvidia_api_key,
+                base_url=settings.llm_base_url,
+                timeout=call_timeout(),
+            )
+        return response.choices[0].message.content, token_usage(getattr(response, "usage", None))
     except Exception as e:
         logger.error(f"Error generating final answer: {e}")
-        # Fallback: combine all outputs
-        return f"""## Final Analysis Report
+        observe_synthesis_fallback(e)
+        return combine_outputs(verification, financial_analysis, investment_analysis, risk_assessment), None
+
+
+def combine_outputs(verification: str, financial_analysis: str, investment_analysis: str, risk_assessment: str) -> str:
+    """Fallback final answer: the 4 agent outputs, one section each."""
+    return f"""## Final Analysis Report
 
 ### Document Verification
 {verification or 'Not available'}
@@ -70,9 +139,71 @@ Keep it concise but comprehensive. Use markdown formatting."""
 ### Risk Assessment
 {risk_assessment or 'Not available'}"""
 
+SUMMARY_MAX_CHARS = 280
+
+
+def summarize_report(report: str, max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    """Short plain-text summary of a final report for job listings.
+    
+    Takes the first prose paragraph (normally the executive summary), strips
+    markdown markup and trims it at a sentence or word boundary.
+    """
+    if not report:
+        return ""
+    
+    paragraph = ""
+    for block in re.split(r"\n\s*\n", report):
+        lines = [line.strip() for line in block.strip().splitlines()]
+        lines = [line for line in lines if line and not line.startswith("#") and not re.fullmatch(r"[-*_=]{3,}", line)]
+        if lines:
+            paragraph = " ".join(lines)
+            break
+    
+    text = re.sub(r"[*_`>]+", "", paragraph)
+    text = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", text)  # [label](url) -> label
+    text = re.sub(r"^\s*(?:[-+]|\d+\.)\s+", "", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    if len(text) <= max_chars:
+        return text
+    
+    cut = text[:max_chars]
+    sentence_end = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+    if sentence_end >= max_chars // 2:
+        return cut[:sentence_end + 1]
+    return cut.rsplit(" ", 1)[0].rstrip(",;:") + "…"
+
+
 # ---------------------------------------------------------------------------
 # Celery Configuration
 # ---------------------------------------------------------------------------
+QUEUE_ANALYSIS = "analysis"      # pipeline entry point (dispatch only)
+QUEUE_EXTRACTION = "extraction"  # CPU-bound PDF parsing
+QUEUE_LLM = "llm"                # I/O-bound agent and synthesis calls
+QUEUE_PERSIST = "persist"        # final DB writes and cleanup
+ALL_QUEUES = [QUEUE_ANALYSIS, QUEUE_EXTRACTION, QUEUE_LLM, QUEUE_PERSIST]
+
+WORKER_POOLS = ("threads", "gevent", "prefork", "solo")
+
+
+def worker_concurrency() -> int:
+    """Configured pool size, capped by the container memory budget if one is set."""
+    if settings.worker_pool not in WORKER_POOLS:
+        raise ValueError(f"WORKER_POOL must be one of {', '.join(WORKER_POOLS)}, got {settings.worker_pool!r}")
+    if settings.worker_pool == "solo":
+        return 1
+    concurrency = max(1, settings.worker_concurrency)
+    if settings.worker_max_memory_mb > 0 and settings.worker_job_memory_mb > 0:
+        concurrency = min(concurrency, max(1, settings.worker_max_memory_mb // settings.worker_job_memory_mb))
+    return concurrency
+
+
+def worker_max_memory_per_child_kb():
+    """Per-child resident memory limit for prefork pools (None = unlimited)."""
+    if settings.worker_pool != "prefork" or settings.worker_max_memory_mb <= 0:
+        return None
+    return settings.worker_max_memory_mb * 1024 // worker_concurrency()
+
+
 celery_app = Celery(
     "financial_analyzer",
     broker=settings.celery_broker_url,
@@ -88,15 +219,19 @@ celery_app.conf.update(
     timezone="UTC",
     enable_utc=True,
     
-    # Worker settings
+    # Worker settings (pool mode and sizing come from Settings)
     worker_prefetch_multiplier=1,  # Only fetch one task at a time
-    worker_concurrency=2,  # Number of concurrent workers
+    worker_pool=settings.worker_pool,
+    worker_concurrency=worker_concurrency(),
+    worker_max_memory_per_child=worker_max_memory_per_child_kb(),  # enforced by prefork only
     
     # Task execution settings
     task_acks_late=True,  # Acknowledge task after completion
     task_reject_on_worker_lost=True,
     
-    # Result backend settings
+    # Result backend settings — job state lives in the database and nothing
+    # reads task results, so they are not written to Redis at all
+    task_ignore_result=True,
     result_expires=3600,  # Results expire after 1 hour
     
     # Broker connection settings
@@ -111,9 +246,28 @@ celery_app.conf.update(
         "ssl_cert_reqs": None,  # CERT_NONE - don't verify cert
     },
     
-    # Task routing
+    # Task routing — CPU-bound parsing, I/O-bound LLM calls and DB writes each
+    # get their own queue so they can be scaled independently
+    task_default_queue=QUEUE_ANALYSIS,
     task_routes={
-        "worker.analyze_document_task": {"queue": "analysis"},
+        "analyze_document_task": {"queue": QUEUE_ANALYSIS},
+        "extract_document_task": {"queue": QUEUE_EXTRACTION},
+        "verify_document_task": {"queue": QUEUE_LLM},
+        "analyze_financials_task": {"queue": QUEUE_LLM},
+        "assess_investment_risk_task": {"queue": QUEUE_LLM},
+        "synthesize_report_task": {"queue": QUEUE_LLM},
+        "persist_results_task": {"queue": QUEUE_PERSIST},
+        "maintenance_task": {"queue": QUEUE_PERSIST},
+    },
+    
+    # Periodic tasks (run `celery -A worker beat`, or WORKER_BEAT=true on one worker)
+    beat_schedule={
+        "maintenance": {
+            "task": "maintenance_task",
+            "schedule": settings.maintenance_interval_hours * 3600,
+            # A missed run is skipped rather than piling up behind the next one
+            "options": {"expires": settings.maintenance_interval_hours * 3600 / 2},
+        },
     },
 )
 
@@ -129,21 +283,34 @@ def init_worker_db(sender, **kwargs):
     logger.info("Database initialized successfully")
 
 
+@worker_init.connect
+def start_worker_metrics(sender=None, **kwargs):
+    """Serve this worker's Prometheus metrics (WORKER_METRICS_PORT, 0 = off)."""
+    start_metrics_server(settings.worker_metrics_port)
+
+
 # ---------------------------------------------------------------------------
-# Analysis Task
+# Stage Runner (checkpointed)
 # ---------------------------------------------------------------------------
-@celery_app.task(bind=True, name="analyze_document_task")
-def analyze_document_task(self, job_id: str, query: str, file_path: str, original_filename: str):
+# Agent stage names in pipeline order — also the keys used for checkpoints
+STAGE_NAMES = ['verification', 'analysis', 'investment', 'risk']
+
+# Non-agent checkpoints written by the extract and synthesize stages
+DOCUMENT_CHECKPOINT = 'document'
+SYNTHESIS_CHECKPOINT = 'synthesis'
+
+
+def run_stages(job_id: str, query: str, file_path: str, task_outputs: dict, stages: list = STAGE_NAMES) -> dict:
     """
-    Celery task to run the financial document analysis.
+    Run every stage in ``stages`` not yet present in ``task_outputs`` and
+    checkpoint each agent's output the moment it finishes.
     
-    Args:
-        job_id: Unique job identifier
-        query: User's analysis query
-        file_path: Path to the uploaded PDF file
-        original_filename: Original filename from upload
+    Completed stages are skipped; their checkpointed text is restored as the
+    task output so later stages still receive it as context.
     """
     from crewai import Crew, Process
+    from crewai.tasks.task_output import TaskOutput
+    from llm_client import agent_token_usage
     from agents import financial_analyst, verifier, investment_advisor, risk_assessor
     from task import (
         verification,
@@ -152,121 +319,491 @@ def analyze_document_task(self, job_id: str, query: str, file_path: str, origina
         risk_assessment,
     )
     
-    logger.info(f"Starting analysis for job {job_id}")
-    start_time = time.time()
+    # Work on per-run copies: thread/gevent pools run several jobs in one
+    # process, and the module-level tasks would otherwise share interpolated
+    # descriptions and outputs between them
+    template = Crew(
+        agents=[verifier, financial_analyst, investment_advisor, risk_assessor],
+        tasks=[verification, analyze_task, investment_analysis, risk_assessment],
+        process=Process.sequential,
+        verbose=False,
+    ).copy()
+    stage_tasks = dict(zip(STAGE_NAMES, template.tasks))
+    stage_by_role = {task.agent.role: name for name, task in stage_tasks.items()}
+    
+    pending = []
+    for name, task in stage_tasks.items():
+        if name in task_outputs:
+            # Restore the checkpoint so dependent tasks get it via `context`
+            task.output = TaskOutput(
+                description=task.description,
+                raw=task_outputs[name],
+                agent=task.agent.role,
+            )
+        elif name in stages:
+            pending.append(task)
+    
+    if not pending:
+        return task_outputs
+    
+    # Agents run one after another, so each one's time runs from the previous callback
+    last_output_at = [time.perf_counter()]
+    
+    def checkpoint_stage(output) -> None:
+        """Crew task_callback — persist each agent's output as soon as it is produced."""
+        stage = stage_by_role.get(getattr(output, 'agent', None))
+        raw_output = getattr(output, 'raw', None)
+        now = time.perf_counter()
+        if stage:
+            observe_agent(stage, now - last_output_at[0])
+        last_output_at[0] = now
+        if not stage or not raw_output:
+            logger.warning(f"Skipping checkpoint for unrecognised task output in job {job_id}")
+            return
+        task_outputs[stage] = str(raw_output)
+        save_checkpoint(job_id, stage, task_outputs[stage])
+        
+        # Each per-run agent copy runs one task, so its token counter is this stage's usage
+        _save_token_usage(job_id, stage, *agent_token_usage(stage_tasks[stage].agent))
+        publish_job_event(job_id, "output", stage=stage, output=task_outputs[stage])
+        logger.info(f"Checkpointed {stage} for job {job_id}: {len(raw_output)} chars")
+    
+    financial_crew = Crew(
+        agents=[task.agent for task in pending],
+        tasks=pending,
+        process=Process.sequential,
+        task_callback=checkpoint_stage,
+        verbose=False,
+    )
+    financial_crew.kickoff({"query": query, "file_path": file_path})
+    
+    return task_outputs
+
+
+# ---------------------------------------------------------------------------
+# Pipeline Plumbing
+# ---------------------------------------------------------------------------
+# Every stage task receives and returns the same JSON payload:
+#   {job_id, query, blob_key, file_path, original_filename, enqueued_at, started_at, stage_metrics, profile,
+#    timed_out_stages}
+# `file_path` is the blob:// reference agents pass to the document reader.
+# Agent outputs travel through the checkpoint table, not the broker.
+
+def _record_stage_metrics(job_id: str, stage_metrics: dict) -> None:
+    """Persist per-stage timings and LLM/tool usage on the job row."""
+    update_job(job_id, stage_metrics=json.dumps(stage_metrics))
+
+
+def _save_token_usage(job_id: str, stage: str, usage: Optional[dict], model: Optional[str]) -> None:
+    """Store a stage's LLM token usage on the job and count it in the metrics."""
+    if not usage:
+        return
+    record_token_usage(job_id, stage, usage, model)
+    observe_tokens(stage, usage)
+
+
+def _observe_job_duration(payload: dict, status: str) -> None:
+    """Record end-to-end pipeline time, from the first extract attempt."""
+    started_at = payload.get('started_at')
+    if started_at:
+        seconds = (datetime.utcnow() - datetime.fromisoformat(started_at)).total_seconds()
+        JOB_SECONDS.labels("pipeline", status).observe(seconds)
+
+
+def _fail_job(payload: dict, error_msg: str) -> None:
+    """Mark the job failed and release its uploaded document."""
+    logger.error(f"Analysis failed for job {payload['job_id']}: {error_msg}")
     
-    # Update job status to processing
-    with get_db_session() as db:
-        job = db.query(AnalysisJob).filter(AnalysisJob.job_id == job_id).first()
-        if job:
-            job.status = JobStatus.PROCESSING
-            db.add(job)
+    if not update_active_job(
+        payload['job_id'],
+        status=JobStatus.FAILED,
+        error_message=error_msg,
+        completed_at=datetime.utcnow(),
+        stage_metrics=json.dumps(payload.get('stage_metrics') or {}),
+    ):
+        # Cancelled meanwhile: the cancellation already released the document
+        return
+    _observe_job_duration(payload, JobStatus.FAILED)
+    invalidate_shared_cache(payload['job_id'])
+    publish_job_event(payload['job_id'], "status", status=JobStatus.FAILED, error=error_msg)
     
+    # Release the uploaded document on failure too
+    release_blob(payload['blob_key'])
+
+
+# Stage tasks that run agents, and every stage a time budget applies to
+# (extract parses the PDF and persist writes the result; neither calls the LLM)
+AGENT_TASK_STAGES = ("verify", "analyze", "invest_risk")
+BUDGETED_STAGES = AGENT_TASK_STAGES + ("synthesize",)
+
+
+def stage_time_budgets() -> Dict[str, float]:
+    """Seconds each budgeted stage may run (0 = unlimited), from STAGE_TIME_BUDGETS."""
+    budgets = dict.fromkeys(BUDGETED_STAGES, float(settings.stage_time_budget_seconds))
+    for item in settings.stage_time_budgets.split(","):
+        if not item.strip():
+            continue
+        stage, _, seconds = item.partition("=")
+        if stage.strip() not in budgets:
+            raise ValueError(f"STAGE_TIME_BUDGETS: unknown stage {stage.strip()!r} (one of {', '.join(BUDGETED_STAGES)})")
+        budgets[stage.strip()] = float(seconds)
+    return budgets
+
+
+stage_time_budgets()  # a malformed STAGE_TIME_BUDGETS stops the worker at startup
+
+
+def _time_left(payload: dict, stage: str) -> Optional[float]:
+    """Seconds ``stage`` may still run: its budget, capped by what is left of the job's (None = unlimited)."""
+    if stage not in BUDGETED_STAGES:
+        return None
+    limits = []
+    stage_budget = stage_time_budgets()[stage]
+    if stage_budget > 0:
+        limits.append(stage_budget)
+    started_at = payload.get('started_at')
+    if settings.job_time_budget_seconds > 0 and started_at:
+        elapsed = (datetime.utcnow() - datetime.fromisoformat(started_at)).total_seconds()
+        limits.append(settings.job_time_budget_seconds - elapsed)
+    return min(limits) if limits else None
+
+
+def _cancel_reason(job_id: str) -> Optional[str]:
+    """Why a job's work should stop (None while it may go on)."""
+    if job_status(job_id) == JobStatus.CANCELLED:
+        return "job cancelled"
+    return None
+
+
+def _run_stage(task, payload: dict, stage: str, fn) -> dict:
+    """
+    Run one pipeline stage with timing, retry and failure handling.
+    
+    Queue time is measured from when the previous stage handed off the payload;
+    run time covers ``fn`` only. Both, plus the stage's LLM and tool calls, are
+    added to the payload's ``stage_metrics``, saved on the job row, and exported
+    as Prometheus metrics. Profiled jobs also get a stack profile of ``fn``
+    saved per stage (failed attempts included). Retries resume from
+    checkpoints, so a stage can safely be re-run. Once retries are exhausted
+    the job is marked failed and the chain stops.
+    
+    A cancelled job (DELETE /jobs/{job_id}) stops the chain too: checked before
+    ``fn`` starts and, while it runs, at every LLM call. The cancellation
+    itself has already marked the job and released its document.
+    
+    A stage that runs out of its time budget (or the job's) is cut off the
+    same way, but the chain goes on: the remaining agent stages are skipped
+    and the job is synthesized and persisted from the outputs it has, with
+    the stage listed in the payload's ``timed_out_stages``.
+    """
+    job_id = payload['job_id']
+    if stage in AGENT_TASK_STAGES and payload.get('timed_out_stages'):
+        logger.info(f"Skipping stage {stage} for job {job_id}: finishing with partial results")
+        return payload
+    
+    time_left = _time_left(payload, stage)
+    cancel_token = PollingCancelToken(
+        lambda: _cancel_reason(job_id),
+        settings.job_cancel_poll_seconds,
+        deadline=None if time_left is None else time.monotonic() + time_left,
+    )
+    started = time.time()
+    queue_seconds = max(0.0, started - payload.get('enqueued_at', started))
+    STAGE_QUEUE_SECONDS.labels(stage).observe(queue_seconds)
+    publish_job_event(payload['job_id'], "stage", stage=stage, state="started")
+    
+    outcome = "success"
+    profile = StackProfile(settings.profile_interval_ms) if payload.get('profile') else None
     try:
-        # Run the CrewAI analysis
-        financial_crew = Crew(
-            agents=[verifier, financial_analyst, investment_advisor, risk_assessor],
-            tasks=[verification, analyze_task, investment_analysis, risk_assessment],
-            process=Process.sequential,
-            verbose=False,
-        )
+        with collect_stage_usage() as usage, (profile.sampling() if profile else nullcontext()), cancellable(cancel_token):
+            cancel_token.raise_if_cancelled()
+            fn(payload)
+    except DeadlineExceeded:
+        outcome = "timeout"
+        STAGE_TIMEOUTS.labels(stage).inc()
+        payload.setdefault('timed_out_stages', []).append(stage)
+        logger.warning(f"Stage {stage} for job {job_id} ran out of time; finishing with partial results")
+    except OperationCancelled as e:
+        STAGE_SECONDS.labels(stage, "cancelled").observe(time.time() - started)
+        logger.info(f"Stage {stage} for job {job_id} stopped: {e.reason}")
+        raise Ignore()  # no retry, and the rest of the chain is not run
+    except Exception as e:
+        STAGE_SECONDS.labels(stage, "error").observe(time.time() - started)
+        if task.request.retries < task.max_retries and not isinstance(e, FileNotFoundError):
+            logger.warning(f"Stage {stage} failed for job {payload['job_id']}, retrying: {e}")
+            raise task.retry(exc=e)
+        _fail_job(payload, str(e))
+        raise
+    finally:
+        if profile:
+            save_profile(payload['job_id'], stage, profile)
+    
+    run_seconds = time.time() - started
+    STAGE_SECONDS.labels(stage, outcome).observe(run_seconds)
+    payload.setdefault('stage_metrics', {})[stage] = {
+        "queue_seconds": round(queue_seconds, 3),
+        "run_seconds": round(run_seconds, 3),
+        **{key: round(value, 3) for key, value in usage.items()},
+    }
+    _record_stage_metrics(payload['job_id'], payload['stage_metrics'])
+    payload['enqueued_at'] = time.time()
+    publish_job_event(payload['job_id'], "stage", stage=stage, state="finished", outcome=outcome, **payload['stage_metrics'][stage])
+    logger.info(f"Stage {stage} for job {payload['job_id']}: queued {queue_seconds:.2f}s, ran {run_seconds:.2f}s")
+    return payload
+
+
+def _load_stage_inputs(payload: dict) -> dict:
+    """Load checkpoints and prime the reader cache with the extracted text."""
+    from tools import prime_document_cache
+    
+    checkpoints = load_checkpoints(payload['job_id'])
+    document_text = checkpoints.pop(DOCUMENT_CHECKPOINT, None)
+    if document_text is None:
+        raise FileNotFoundError(f"No extracted document text for job {payload['job_id']}")
+    prime_document_cache(payload['file_path'], document_text)
+    return checkpoints
+
+
+def _run_agent_stages(payload: dict, stages: list) -> None:
+    """Shared body of the LLM stage tasks."""
+    task_outputs = _load_stage_inputs(payload)
+    run_stages(payload['job_id'], payload['query'], payload['file_path'], task_outputs, stages)
+
+
+_stage_options = dict(
+    bind=True,
+    max_retries=settings.analysis_max_retries,
+    default_retry_delay=settings.analysis_retry_delay_seconds,
+)
+
+
+# ---------------------------------------------------------------------------
+# Pipeline Stage Tasks
+# ---------------------------------------------------------------------------
+@celery_app.task(name="extract_document_task", **_stage_options)
+def extract_document_task(self, payload: dict) -> dict:
+    """Stage 1 (CPU): parse the PDF once and checkpoint its text."""
+    def extract(payload):
+        from tools import extract_document_text
         
-        result = financial_crew.kickoff({"query": query, "file_path": file_path})
-        result_str = str(result)
+        job_id = payload['job_id']
+        # A retried extract keeps the first attempt's start time
+        with get_db_session() as db:
+            started_at = db.execute(
+                job_update(
+                    job_id,
+                    status=JobStatus.PROCESSING,
+                    started_at=func.coalesce(AnalysisJob.started_at, datetime.utcnow()),
+                )
+                .where(AnalysisJob.status.in_(JobStatus.ACTIVE))
+                .returning(AnalysisJob.started_at)
+            ).scalar()
+        if started_at is None:
+            raise OperationCancelled("job cancelled")  # since the stage started
+        payload['started_at'] = started_at.isoformat()
+        publish_job_event(job_id, "status", status=JobStatus.PROCESSING)
         
-        # Extract individual task outputs from result.tasks_output
-        # Each TaskOutput has .raw attribute containing the agent's output text
-        task_outputs = {}
-        try:
-            if hasattr(result, 'tasks_output') and result.tasks_output:
-                task_names = ['verification', 'analysis', 'investment', 'risk']
-                for i, task_output in enumerate(result.tasks_output):
-                    if i < len(task_names):
-                        # The .raw attribute contains the actual output text
-                        raw_output = getattr(task_output, 'raw', None)
-                        if raw_output:
-                            task_outputs[task_names[i]] = str(raw_output)
-                            logger.info(f"Extracted {task_names[i]}: {len(raw_output)} chars")
-                        else:
-                            logger.warning(f"No raw output for task {i}")
-            else:
-                logger.warning("No tasks_output in result")
-        except Exception as e:
-            logger.error(f"Error extracting outputs: {e}", exc_info=True)
+        if DOCUMENT_CHECKPOINT in load_checkpoints(job_id):
+            logger.info(f"Document already extracted for job {job_id}")
+            return
+        store = get_blob_store()
+        if not store.exists(payload['blob_key']):
+            raise FileNotFoundError(f"Uploaded document is no longer available: blob {payload['blob_key']}")
         
-        duration = int(time.time() - start_time)
-        logger.info(f"Analysis completed for job {job_id} in {duration}s")
+        with store.local_path(payload['blob_key']) as local_path:
+            document_text = extract_document_text(local_path)
+        save_checkpoint(job_id, DOCUMENT_CHECKPOINT, document_text)
+        logger.info(f"Extracted document for job {job_id}: {len(document_text)} chars")
+    
+    return _run_stage(self, payload, "extract", extract)
+
+
+@celery_app.task(name="verify_document_task", **_stage_options)
+def verify_document_task(self, payload: dict) -> dict:
+    """Stage 2 (LLM): document verifier agent."""
+    return _run_stage(self, payload, "verify", lambda p: _run_agent_stages(p, ['verification']))
+
+
+@celery_app.task(name="analyze_financials_task", **_stage_options)
+def analyze_financials_task(self, payload: dict) -> dict:
+    """Stage 3 (LLM): financial analyst agent."""
+    return _run_stage(self, payload, "analyze", lambda p: _run_agent_stages(p, ['analysis']))
+
+
+@celery_app.task(name="assess_investment_risk_task", **_stage_options)
+def assess_investment_risk_task(self, payload: dict) -> dict:
+    """Stage 4 (LLM): investment advisor and risk assessor agents."""
+    return _run_stage(self, payload, "invest_risk", lambda p: _run_agent_stages(p, ['investment', 'risk']))
+
+
+@celery_app.task(name="synthesize_report_task", **_stage_options)
+def synthesize_report_task(self, payload: dict) -> dict:
+    """Stage 5 (LLM): synthesize the four agent outputs into the final answer."""
+    def synthesize(payload):
+        task_outputs = load_checkpoints(payload['job_id'])
+        if SYNTHESIS_CHECKPOINT in task_outputs:
+            return
         
-        # Generate AI-synthesized final answer
-        final_answer = generate_final_answer(
+        final_answer, usage = generate_final_answer(
             verification=task_outputs.get('verification'),
             financial_analysis=task_outputs.get('analysis'),
             investment_analysis=task_outputs.get('investment'),
             risk_assessment=task_outputs.get('risk'),
         )
+        save_checkpoint(payload['job_id'], SYNTHESIS_CHECKPOINT, final_answer)
+        _save_token_usage(payload['job_id'], SYNTHESIS_CHECKPOINT, usage, SYNTHESIS_MODEL)
         logger.info(f"Generated final answer: {len(final_answer)} chars")
+    
+    return _run_stage(self, payload, "synthesize", synthesize)
+
+
+@celery_app.task(name="persist_results_task", **_stage_options)
+def persist_results_task(self, payload: dict) -> dict:
+    """Stage 6 (DB): write the final result, mark the job completed, clean up."""
+    def persist(payload):
+        job_id = payload['job_id']
+        task_outputs = load_checkpoints(job_id)
+        timed_out_stages = payload.get('timed_out_stages') or []
+        if SYNTHESIS_CHECKPOINT not in task_outputs and "synthesize" in timed_out_stages:
+            # Synthesis ran out of time before it had an answer
+            final_answer = combine_outputs(
+                task_outputs.get('verification'),
+                task_outputs.get('analysis'),
+                task_outputs.get('investment'),
+                task_outputs.get('risk'),
+            )
+        else:
+            final_answer = task_outputs[SYNTHESIS_CHECKPOINT]
+        
+        # The start time travels in the payload, so completing is one UPDATE
+        completed_at = datetime.utcnow()
+        started_at = payload.get('started_at')
+        duration = int((completed_at - datetime.fromisoformat(started_at)).total_seconds()) if started_at else None
         
-        # Update job status to completed
         with get_db_session() as db:
-            job = db.query(AnalysisJob).filter(AnalysisJob.job_id == job_id).first()
-            if job:
-                job.status = JobStatus.COMPLETED
-                job.result = final_answer
-                job.duration_seconds = duration
-                job.completed_at = time.strftime("%Y-%m-%d %H:%M:%S")
-                db.add(job)
-                
-                # Also store in results table with individual agent outputs
-                from database import AnalysisResult
+            completed = db.execute(
+                job_update(
+                    job_id,
+                    status=JobStatus.COMPLETED,
+                    duration_seconds=duration,
+                    completed_at=completed_at,
+                    timed_out_stages=",".join(timed_out_stages) or None,
+                ).where(AnalysisJob.status.in_(JobStatus.ACTIVE))
+            ).rowcount
+            if not completed:
+                raise OperationCancelled("job cancelled")  # nothing is written
+            
+            # The report and agent outputs are stored once, in the results table
+            # (a redelivered task may already have written it)
+            existing = db.query(AnalysisResult).filter(AnalysisResult.job_id == job_id).first()
+            if not existing:
                 db_result = AnalysisResult(
                     job_id=job_id,
-                    query=query,
-                    original_filename=original_filename,
+                    query=payload['query'],
+                    original_filename=payload['original_filename'],
                     verification_report=task_outputs.get('verification'),
                     financial_analysis=task_outputs.get('analysis'),
                     investment_analysis=task_outputs.get('investment'),
                     risk_assessment=task_outputs.get('risk'),
                     analysis=final_answer,
+                    summary=summarize_report(final_answer),
                     duration_seconds=duration,
                 )
                 db.add(db_result)
+            
+            # Checkpoints only matter for resuming; the result row now holds them
+            delete_checkpoints(db, job_id)
         
-        # Clean up temp file
-        import os
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            logger.info(f"Cleaned up temp file: {file_path}")
-        
-        return {"status": "success", "job_id": job_id, "duration": duration}
-        
-    except Exception as e:
-        error_msg = str(e)
-        logger.error(f"Analysis failed for job {job_id}: {error_msg}")
-        
-        # Update job status to failed
-        with get_db_session() as db:
-            job = db.query(AnalysisJob).filter(AnalysisJob.job_id == job_id).first()
-            if job:
-                job.status = JobStatus.FAILED
-                job.error_message = error_msg
-                job.completed_at = time.strftime("%Y-%m-%d %H:%M:%S")
-                db.add(job)
-        
-        # Clean up temp file on failure too
-        import os
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception:
-                pass
+        logger.info(f"Analysis completed for job {job_id} in {duration}s" + (
+            f" (partial: {', '.join(timed_out_stages)} timed out)" if timed_out_stages else ""
+        ))
+        _observe_job_duration(payload, JobStatus.COMPLETED)
+        invalidate_shared_cache(job_id)
+        publish_job_event(
+            job_id, "status", status=JobStatus.COMPLETED, duration_seconds=duration, timed_out_stages=timed_out_stages,
+        )
         
-        raise
+        # Release the uploaded document (deleted once no other job references it)
+        release_blob(payload['blob_key'])
+    
+    payload = _run_stage(self, payload, "persist", persist)
+    return {"status": "success", "job_id": payload['job_id'], "stage_metrics": payload['stage_metrics']}
+
+
+def build_pipeline(job_id: str, query: str, blob_key: str, original_filename: str, profile: bool = False):
+    """Build the extract → verify → analyze → invest/risk → synthesize → persist chain."""
+    payload = {
+        "job_id": job_id,
+        "query": query,
+        "blob_key": blob_key,
+        "file_path": blob_uri(blob_key),
+        "original_filename": original_filename,
+        "enqueued_at": time.time(),
+        "stage_metrics": {},
+        "profile": profile,
+    }
+    return chain(
+        extract_document_task.s(payload),
+        verify_document_task.s(),
+        analyze_financials_task.s(),
+        assess_investment_risk_task.s(),
+        synthesize_report_task.s(),
+        persist_results_task.s(),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Analysis Task (pipeline entry point)
+# ---------------------------------------------------------------------------
+@celery_app.task(bind=True, name="analyze_document_task")
+def analyze_document_task(self, job_id: str, query: str, blob_key: str, original_filename: str, profile: bool = False):
+    """
+    Celery task to run the financial document analysis.
+    
+    Replaces itself with the staged pipeline chain. Each stage runs on the queue
+    suited to its workload and checkpoints its output, so a retry (or a
+    redelivery after the worker died) resumes from the last completed stage.
+    
+    Args:
+        job_id: Unique job identifier
+        query: User's analysis query
+        blob_key: Blob store key of the uploaded PDF
+        original_filename: Original filename from upload
+        profile: Sample each stage's stack (see profiling.py; GET /jobs/{job_id}/profile)
+    """
+    logger.info(f"Starting analysis pipeline for job {job_id}")
+    return self.replace(build_pipeline(job_id, query, blob_key, original_filename, profile))
+
+
+# ---------------------------------------------------------------------------
+# Maintenance (scheduled by Celery beat)
+# ---------------------------------------------------------------------------
+@celery_app.task(name="maintenance_task")
+def maintenance_task() -> dict:
+    """Archive expired jobs, delete orphaned rows and files, vacuum (see retention.py)."""
+    return run_maintenance()
 
 
 # ---------------------------------------------------------------------------
 # Worker Entry Point
 # ---------------------------------------------------------------------------
 if __name__ == "__main__":
-    logger.info("Starting Celery worker...")
-    # Use solo pool on Windows to avoid multiprocessing PermissionError
-    celery_app.worker_main(["worker", "--loglevel=info", "-P", "solo"])
+    # Consume every pipeline queue unless WORKER_QUEUES narrows it, e.g. a
+    # dedicated extraction box runs with WORKER_QUEUES=extraction
+    queues = settings.worker_queues or ",".join(ALL_QUEUES)
+    concurrency = worker_concurrency()
+    logger.info(
+        f"Starting Celery worker on queues: {queues} "
+        f"(pool={settings.worker_pool}, concurrency={concurrency}, llm_slots={settings.llm_max_concurrency})"
+    )
+    # threads/gevent/solo avoid the multiprocessing PermissionError prefork hits on Windows
+    argv = [
+        "worker",
+        "--loglevel=info",
+        "-P", settings.worker_pool,
+        "-c", str(concurrency),
+        "-Q", queues,
+    ]
+    if settings.worker_beat:
+        argv.append("-B")  # embedded beat scheduler for periodic maintenance
+    celery_app.worker_main(argv)